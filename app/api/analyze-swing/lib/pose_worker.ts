@@ -0,0 +1,45 @@
+/**
+ * Client for the long-lived pose worker (app/api/analyze-swing/pose_worker.py).
+ * - POSTs the pose_engine.py request to VCA_POSE_WORKER_URL (default http://127.0.0.1:8765)
+ * - Falls back to spawning pose_engine.py when the worker isn't running
+ * - Engine errors from a running worker are surfaced as-is (no fallback)
+ */
+import { spawn } from "child_process";
+import path from "path";
+
+const WORKER_URL = process.env.VCA_POSE_WORKER_URL || "http://127.0.0.1:8765";
+const PYTHON = process.env.VCA_PYTHON || "python";
+
+function spawnPoseEngine(req: Record<string, any>): Promise<any> {
+  const script = path.join(process.cwd(), "app", "api", "analyze-swing", "pose_engine.py");
+  return new Promise((resolve, reject) => {
+    const p = spawn(PYTHON, [script], { stdio: ["pipe", "pipe", "pipe"] });
+    let out = "";
+    let err = "";
+    p.stdout.on("data", d => (out += d.toString()));
+    p.stderr.on("data", d => (err += d.toString()));
+    p.on("error", reject);
+    p.on("close", code => {
+      if (code !== 0) return reject(new Error(err.trim() || `pose_engine.py exited ${code}`));
+      try { resolve(JSON.parse(out)); } catch (e: any) { reject(new Error(`pose_engine.py: bad JSON: ${e?.message || e}`)); }
+    });
+    p.stdin.end(JSON.stringify(req));
+  });
+}
+
+export async function runPoseEngine(req: Record<string, any>): Promise<any> {
+  let r: Response;
+  try {
+    r = await fetch(`${WORKER_URL}/frames`, {
+      method: "POST",
+      headers: { "content-type": "application/json" },
+      body: JSON.stringify(req),
+    });
+  } catch {
+    // worker not up: cold path
+    return spawnPoseEngine(req);
+  }
+  const j = await r.json().catch(() => null);
+  if (!r.ok || !j || j.ok === false) throw new Error(j?.error || `pose worker HTTP ${r.status}`);
+  return j;
+}
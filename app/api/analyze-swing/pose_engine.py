@@ -5,6 +5,17 @@ from pathlib import Path
 
 import cv2
 
+# shared analysis modules live in <repo>/scripts
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "scripts"))
+import instrument
+from frame_store import open_frames
+from pose_array import load
+from phase_detect import detect_from_array, offset_phases
+
+
+class PoseEngineError(Exception):
+    pass
+
 
 def die(msg: str, code: int = 1):
     print(msg, file=sys.stderr)
@@ -32,92 +43,147 @@ def write_thumb(img_bgr, out_path: str, target_w: int = 320):
     cv2.imwrite(out_path, thumb, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
 
 
-def grab_frame(cap, frame_idx: int):
-    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-    ok, img = cap.read()
-    if not ok or img is None:
-        return None
-    return img
-
-
-def main():
-    raw = sys.stdin.read()
-    if not raw.strip():
-        die("pose_engine.py: expected JSON on stdin")
-
-    try:
-        req = json.loads(raw)
-    except Exception as e:
-        die(f"pose_engine.py: invalid JSON: {e}")
-
+def find_phases(pose_path: str, fps: float, total: int, impact_frame=None, pose=None):
+    """
+    (phases, "pose") from the pose JSON / pose_array container (or an in-memory PoseArray,
+    `pose`) when one is supplied and usable, else ({}, "offsets").
+    Phase "frame" values are video frame indices.
+    """
+    if pose is not None:
+        pa = pose
+    elif not pose_path:
+        return {}, "offsets"
+    elif not Path(pose_path).exists():
+        raise PoseEngineError(f"pose_engine.py: pose not found: {pose_path}")
+    else:
+        try:
+            pa = load(pose_path, mmap=False)
+        except (OSError, ValueError) as e:
+            raise PoseEngineError(f"pose_engine.py: could not read pose: {e}")
+    if len(pa) < 5 or not pa.frame_valid.any():
+        return {}, "offsets"
+    phases = detect_from_array(pa, pa.fps() or fps, impact_frame)
+    if any(phases[f"P{i}"]["frame"] is None for i in (1, 4, 7)):
+        return {}, "offsets"
+    return phases, "pose"
+
+
+def run(req: dict, pose=None, frames_src=None) -> dict:
+    """
+    One pose_engine request (same shape as the stdin JSON) -> response dict.
+    Raises PoseEngineError; shared by the CLI below, pose_worker.py and
+    scripts/analysis_pipeline.py, which passes its in-memory PoseArray and open frame reader.
+    """
     video_path = (req.get("videoPath") or req.get("video_path") or req.get("path") or "").strip()
     out_dir = (req.get("outDir") or req.get("out_dir") or "").strip()
     impact_frame = safe_int(req.get("impactFrame") or req.get("impact_frame") or 0, 0)
+    pose_path = (req.get("posePath") or req.get("pose_path") or "").strip()
 
     if not video_path:
-        die("pose_engine.py: missing videoPath")
+        raise PoseEngineError("pose_engine.py: missing videoPath")
     if not out_dir:
-        die("pose_engine.py: missing outDir")
+        raise PoseEngineError("pose_engine.py: missing outDir")
 
     vp = Path(video_path)
     if not vp.exists():
-        die(f"pose_engine.py: video not found: {video_path}")
+        raise PoseEngineError(f"pose_engine.py: video not found: {video_path}")
 
     ensure_dir(out_dir)
 
-    cap = cv2.VideoCapture(str(vp))
-    if not cap.isOpened():
-        die(f"pose_engine.py: failed to open video: {video_path}")
-
-    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
-    fps = float(cap.get(cv2.CAP_PROP_FPS) or 30.0)
-    if total <= 0:
-        die("pose_engine.py: could not read frame count")
-
-    impact = max(0, min(total - 1, impact_frame))
-
-    # P1–P9 placeholder spacing around impact (swap later for real phase logic)
-    offsets = [-60, -45, -30, -15, 0, 10, 20, 35, 55]
-
-    frames = []
-    for i, off in enumerate(offsets, start=1):
-        idx = max(0, min(total - 1, impact + off))
-        img = grab_frame(cap, idx)
-        if img is None:
-            continue
+    own_src = frames_src is None
+    if own_src:
+        try:
+            frames_src = open_frames(str(vp))
+        except RuntimeError:
+            raise PoseEngineError(f"pose_engine.py: failed to open video: {video_path}")
 
-        label = f"P{i}"
-        file_name = f"{label}.jpg"
-        thumb_name = f"{label}_thumb.jpg"
-        out_file = str(Path(out_dir) / file_name)
-        out_thumb = str(Path(out_dir) / thumb_name)
-
-        cv2.imwrite(out_file, img, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
-        write_thumb(img, out_thumb, 320)
-
-        frames.append({
-            "p": i,
-            "label": label,
-            "frame": idx,
-            "file": file_name,
-            "imageUrl": file_name,
-            "thumbUrl": thumb_name
-        })
-
-    cap.release()
+    try:
+        total = int(frames_src.frame_count or 0)
+        fps = float(frames_src.fps or 30.0)
+        if total <= 0:
+            raise PoseEngineError("pose_engine.py: could not read frame count")
+
+        phases, phase_method = find_phases(pose_path, fps, total, impact_frame or None, pose)
+        impact = phases["P7"]["frame"] if phase_method == "pose" and phases["P7"]["frame"] is not None \
+            else max(0, min(total - 1, impact_frame))
+        if phase_method != "pose":
+            phases = offset_phases(impact, fps, total)
+            for v in phases.values():
+                v["frame"] = v["index"]
+
+        wanted = {}   # frame idx -> [p, ...] (two phases can land on one frame)
+        for i in range(1, 10):
+            ph = phases.get(f"P{i}") or {}
+            if ph.get("frame") is None:
+                continue
+            idx = max(0, min(total - 1, int(ph["frame"])))
+            wanted.setdefault(idx, []).append(i)
+
+        by_p = {}
+        # ascending sweep; nearby indices decode in one pass (seek index) instead of one seek each
+        for idx, img in frames_src.iter_indices(wanted.keys()):
+            if img is None:
+                continue
+
+            for i in wanted[idx]:
+                label = f"P{i}"
+                file_name = f"{label}.jpg"
+                thumb_name = f"{label}_thumb.jpg"
+                out_file = str(Path(out_dir) / file_name)
+                out_thumb = str(Path(out_dir) / thumb_name)
+
+                with instrument.span("jpeg_write"):
+                    cv2.imwrite(out_file, img, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+                    write_thumb(img, out_thumb, 320)
+
+                by_p[i] = {
+                    "p": i,
+                    "label": label,
+                    "frame": idx,
+                    "file": file_name,
+                    "imageUrl": file_name,
+                    "thumbUrl": thumb_name,
+                    "confidence": phases[label]["conf"],
+                    "method": phases[label]["method"]
+                }
+    finally:
+        if own_src:
+            frames_src.close()
+
+    frames = [by_p[i] for i in sorted(by_p)]
 
     if len(frames) < 3:
-        die("pose_engine.py: produced too few frames (video too short?)")
+        raise PoseEngineError("pose_engine.py: produced too few frames (video too short?)")
 
     out = {
         "ok": True,
         "fps": fps,
         "totalFrames": total,
         "impactFrame": impact,
+        "phaseMethod": phase_method,
         "frames": frames
     }
 
+    return out
+
+
+def main():
+    raw = sys.stdin.read()
+    if not raw.strip():
+        die("pose_engine.py: expected JSON on stdin")
+
+    try:
+        req = json.loads(raw)
+    except Exception as e:
+        die(f"pose_engine.py: invalid JSON: {e}")
+
+    try:
+        out = run(req)
+    except PoseEngineError as e:
+        die(str(e))
+
     print(json.dumps(out))
 
 if __name__ == "__main__":
-    main()
+    with instrument.run("pose_engine"):
+        main()
@@ -0,0 +1,173 @@
+import sys
+import json
+import os
+import time
+import argparse
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+import cv2
+
+# pose_engine puts <repo>/scripts on sys.path
+import pose_engine
+import instrument
+from pose_runtime import WarmLandmarker, extract_video
+
+
+# Long-lived local pose worker.
+#
+# Keeps OpenCV and a VIDEO-mode PoseLandmarker loaded so requests don't pay interpreter,
+# mediapipe and .task model start-up every time. Listens on localhost only.
+#
+#   POST /frames  same JSON as pose_engine.py stdin -> same JSON pose_engine.py prints
+#   POST /pose    {"video", "model"?, "sample"?, "pipeline"?, "out"?} -> pose_estimate_tasks_v2.py payload
+#   GET  /health  warm state + request counters
+#
+# Requests are served one at a time (a PoseLandmarker is not thread-safe).
+
+DEFAULT_PORT = 8765
+
+
+class PoseWorker:
+    def __init__(self, model_task: str = ""):
+        self.started = time.time()
+        self.landmarkers = {}
+        self.served = {"frames": 0, "pose": 0, "errors": 0}
+        if model_task:
+            self.landmarker(model_task)
+
+    def landmarker(self, model_task: str) -> WarmLandmarker:
+        key = str(Path(model_task).resolve())
+        if key not in self.landmarkers:
+            if not Path(key).exists():
+                raise pose_engine.PoseEngineError(f"pose_worker.py: model not found: {model_task}")
+            self.landmarkers[key] = WarmLandmarker(key)
+        return self.landmarkers[key]
+
+    def frames(self, req: dict) -> dict:
+        return pose_engine.run(req)
+
+    def pose(self, req: dict) -> dict:
+        video = (req.get("video") or req.get("videoPath") or req.get("in") or "").strip()
+        model_task = (req.get("model") or req.get("model_task") or "").strip()
+        out_json = (req.get("out") or req.get("outJson") or "").strip()
+        every_n = pose_engine.safe_int(req.get("sample") or 1, 1)
+        pipeline = pose_engine.safe_int(req.get("pipeline") or 0, 0)
+
+        if not video or not Path(video).exists():
+            raise pose_engine.PoseEngineError(f"pose_worker.py: video not found: {video}")
+        if not model_task:
+            if len(self.landmarkers) != 1:
+                raise pose_engine.PoseEngineError("pose_worker.py: missing model (.task)")
+            model_task = next(iter(self.landmarkers))
+
+        try:
+            payload = extract_video(self.landmarker(model_task), video, every_n, pipeline=pipeline)
+        except RuntimeError as e:
+            raise pose_engine.PoseEngineError(str(e))
+
+        if out_json:
+            Path(out_json).parent.mkdir(parents=True, exist_ok=True)
+            with instrument.span("json_write"), open(out_json, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+        return payload
+
+    def health(self) -> dict:
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "uptime_sec": round(time.time() - self.started, 1),
+            "opencv": cv2.__version__,
+            "landmarkers": [
+                {"model": os.path.basename(k), "load_sec": round(v.load_sec, 3), "videos": v.videos}
+                for k, v in self.landmarkers.items()
+            ],
+            "served": dict(self.served)
+        }
+
+    def close(self):
+        for lm in self.landmarkers.values():
+            lm.close()
+        self.landmarkers = {}
+
+
+def make_handler(worker: PoseWorker):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, obj: dict):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") in ("", "/health"):
+                self._send(200, worker.health())
+            else:
+                self._send(404, {"ok": False, "error": f"unknown path: {self.path}"})
+
+        def do_POST(self):
+            route = self.path.rstrip("/") or "/frames"
+            if route not in ("/frames", "/pose"):
+                self._send(404, {"ok": False, "error": f"unknown path: {self.path}"})
+                return
+
+            n = pose_engine.safe_int(self.headers.get("Content-Length") or 0, 0)
+            raw = self.rfile.read(n).decode("utf-8") if n > 0 else ""
+            if not raw.strip():
+                self._send(400, {"ok": False, "error": "pose_worker.py: expected JSON body"})
+                return
+            try:
+                req = json.loads(raw)
+            except Exception as e:
+                self._send(400, {"ok": False, "error": f"pose_worker.py: invalid JSON: {e}"})
+                return
+
+            try:
+                # one trace per request when VCA_TRACE is set (instrument.py)
+                with instrument.run("pose_worker_" + route[1:]):
+                    out = worker.frames(req) if route == "/frames" else worker.pose(req)
+            except pose_engine.PoseEngineError as e:
+                worker.served["errors"] += 1
+                self._send(400, {"ok": False, "error": str(e)})
+                return
+            except Exception as e:
+                worker.served["errors"] += 1
+                self._send(500, {"ok": False, "error": f"pose_worker.py: {type(e).__name__}: {e}"})
+                return
+
+            worker.served[route[1:]] += 1
+            self._send(200, out)
+
+        def log_message(self, fmt, *args):
+            print(f"pose_worker {self.address_string()} {fmt % args}", file=sys.stderr)
+
+    return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=pose_engine.safe_int(os.environ.get("VCA_POSE_WORKER_PORT") or DEFAULT_PORT, DEFAULT_PORT))
+    ap.add_argument("--model", default=os.environ.get("VCA_POSE_MODEL") or "", help="PoseLandmarker .task to keep warm")
+    args = ap.parse_args()
+
+    try:
+        worker = PoseWorker(args.model)
+    except (RuntimeError, pose_engine.PoseEngineError) as e:
+        pose_engine.die(str(e))
+
+    server = HTTPServer(("127.0.0.1", args.port), make_handler(worker))
+    warm = ", ".join(os.path.basename(k) for k in worker.landmarkers) or "none"
+    print(f"OK pose worker listening on http://127.0.0.1:{args.port} (landmarker: {warm})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        worker.close()
+
+
+if __name__ == "__main__":
+    main()
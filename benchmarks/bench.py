@@ -0,0 +1,291 @@
+import os, sys, json, time, platform, argparse, tempfile, subprocess
+from pathlib import Path
+
+# Per-stage benchmarks on synthetic swing clips (synth_swing.py).
+#
+# For every case in the matrix (size x fps x seconds) each stage runs in its own child
+# process, so peak RSS is that stage's alone and imports / model load stay out of the timing:
+#
+#   decode          every frame through frame_store.open_frames (cv2.VideoCapture path)
+#   crop_person_hog person_bbox() HOG sampling (crop_person_hog.py)
+#   pose            pose_runtime.extract_video on a WarmLandmarker (needs --model)
+#   pose_smooth     smooth_data() on the clip's landmarks
+#   pose_qc         load_data() + qc_array()
+#   impact_anchor   find_impact() (impact_anchor_ball_club.py)
+#   impact_proxy    analyze() with the anchored impact (impact_proxy.py)
+#   pose_engine     phase frames + thumbnails (app/api/analyze-swing/pose_engine.py)
+#
+# Reported per stage: best / median seconds over --repeat runs, frames/s, peak RSS (MB).
+# Results go to $VCA_CACHE/bench/bench_<stamp>.json (default <tmp>/vca-bench/results, like
+# the other caches); --compare prints the speedup against an earlier results file.
+#
+#   python .\benchmarks\bench.py
+#   python .\benchmarks\bench.py --sizes 640x360,1920x1080 --fps 30,60,240 --seconds 2,5 --model pose_landmarker_full.task
+#   python .\benchmarks\bench.py --stages decode,impact_anchor --compare %TEMP%\vca-bench\results\bench_20260101_120000.json
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO = BENCH_DIR.parent
+SCRIPTS_DIR = REPO / "scripts"
+APP_DIR = REPO / "app" / "api" / "analyze-swing"
+STAGES = ["decode", "crop_person_hog", "pose", "pose_smooth", "pose_qc", "impact_anchor", "impact_proxy", "pose_engine"]
+RESULT_TAG = "BENCH_RESULT "
+
+def die(msg, code=1):
+    print(msg, file=sys.stderr)
+    sys.exit(code)
+
+def results_dir():
+    vca_cache = os.environ.get("VCA_CACHE") or ""
+    return os.path.join(vca_cache, "bench") if vca_cache else os.path.join(tempfile.gettempdir(), "vca-bench", "results")
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if the platform can't tell)."""
+    try:
+        import resource
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(kb / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        mi = psutil.Process().memory_info()
+        return round(getattr(mi, "peak_wset", mi.rss) / (1024.0 * 1024.0), 1)
+    except ImportError:
+        return None
+
+# ---------------- stages (run inside the child) ----------------
+# setup(case, work) -> state (untimed); body(state) -> frames processed (timed)
+
+def _load_pose(case):
+    with open(case["pose"], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _setup_decode(case, work):
+    return case
+
+def _decode(case):
+    from frame_store import open_frames
+    n = 0
+    with open_frames(case["video"]) as frames:
+        for _ in frames.iter_frames():
+            n += 1
+    return n
+
+def _setup_hog(case, work):
+    from frame_store import open_frames
+    import crop_person_hog
+    with open_frames(case["video"]) as frames:
+        crop_person_hog.detect_person(frames.read(0))   # builds the shared HOG
+    return case
+
+def _hog(case):
+    from frame_store import open_frames
+    from crop_person_hog import person_bbox
+    sample_n = max(1, case["frames"] // 30)
+    with open_frames(case["video"]) as frames:
+        person_bbox(frames, sample_n)
+    return len(range(0, case["frames"], sample_n)[:30])
+
+def _setup_pose(case, work):
+    from pose_runtime import WarmLandmarker
+    return {"case": case, "lm": WarmLandmarker(case["model"])}
+
+def _pose(state):
+    from pose_runtime import extract_video
+    out = extract_video(state["lm"], state["case"]["video"])
+    return len(out["frames"])
+
+def _setup_smooth(case, work):
+    return _load_pose(case)
+
+def _smooth(data):
+    from pose_smooth import smooth_data
+    out, _, _ = smooth_data(data, 0.45, 2)
+    return len(out["frames"])
+
+def _qc(data):
+    from pose_qc import load_data, qc_array
+    pose, present, fps = load_data(data)
+    qc_array(pose, present, fps)
+    return len(data["frames"])
+
+def _setup_anchor(case, work):
+    return {"case": case, "out": os.path.join(work, "anchor")}
+
+def _anchor(state):
+    from impact_anchor_ball_club import find_impact
+    r = find_impact(state["case"]["video"], state["out"])
+    state["found"] = r["impact"]["P7_frame"]
+    return state["case"]["frames"]
+
+def _setup_proxy(case, work):
+    from pose_smooth import smooth_data
+    data, _, _ = smooth_data(_load_pose(case), 0.45, 2)
+    return {"case": case, "data": data, "series": os.path.join(work, "swing_metrics.json")}
+
+def _proxy(state):
+    from impact_proxy import analyze
+    analyze(state["data"], state["case"]["video"], state["case"]["impact"], 2, state["series"])
+    return state["case"]["frames"]
+
+def _setup_engine(case, work):
+    from pose_array import from_json
+    from pose_smooth import smooth_data
+    import numpy as np
+    sys.path.insert(0, str(APP_DIR))
+    data, _, _ = smooth_data(_load_pose(case), 0.45, 2)
+    return {"case": case, "pose": from_json(data, dtype=np.float64), "out": os.path.join(work, "frames")}
+
+def _engine(state):
+    import pose_engine
+    c = state["case"]
+    res = pose_engine.run({"videoPath": c["video"], "outDir": state["out"], "impactFrame": c["impact"]},
+                          pose=state["pose"])
+    return len(res["frames"])
+
+STAGE_FNS = {
+    "decode": (_setup_decode, _decode),
+    "crop_person_hog": (_setup_hog, _hog),
+    "pose": (_setup_pose, _pose),
+    "pose_smooth": (_setup_smooth, _smooth),
+    "pose_qc": (_setup_smooth, _qc),
+    "impact_anchor": (_setup_anchor, _anchor),
+    "impact_proxy": (_setup_proxy, _proxy),
+    "pose_engine": (_setup_engine, _engine),
+}
+
+def run_child(spec):
+    """One stage on one case, `repeat` times; returns the result row."""
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    stage, case, repeat = spec["stage"], spec["case"], spec["repeat"]
+    setup, body = STAGE_FNS[stage]
+    with tempfile.TemporaryDirectory(prefix="vca-bench-") as work:
+        state = setup(case, work)
+        rss_setup = peak_rss_mb()
+        secs = []
+        frames = 0
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            frames = body(state)
+            secs.append(time.perf_counter() - t0)
+    secs.sort()
+    best = secs[0]
+    row = {"sec": round(best, 4), "sec_median": round(secs[len(secs) // 2], 4), "runs": repeat,
+           "frames": frames, "fps": round(frames / best, 1) if best > 0 else None,
+           "peak_rss_mb": peak_rss_mb(), "setup_rss_mb": rss_setup}
+    if stage == "impact_anchor":
+        row["impact_found"] = state["found"]
+        row["impact_truth"] = case["impact"]
+    return row
+
+# ---------------- parent ----------------
+
+def run_stage(stage, case, repeat, timeout):
+    spec = {"stage": stage, "case": case, "repeat": repeat}
+    try:
+        p = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--child", json.dumps(spec)],
+                           capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"error": f"timeout after {timeout}s"}
+    for line in reversed(p.stdout.splitlines()):
+        if line.startswith(RESULT_TAG):
+            return json.loads(line[len(RESULT_TAG):])
+    err = (p.stderr.strip().splitlines() or [f"exit {p.returncode}"])[-1]
+    return {"error": err}
+
+def env_info():
+    info = {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+            "cpus": os.cpu_count()}
+    try:
+        import cv2, numpy
+        info["opencv"] = cv2.__version__
+        info["numpy"] = numpy.__version__
+    except ImportError:
+        pass
+    try:
+        info["git"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(REPO),
+                                     capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        info["git"] = None
+    return info
+
+def case_id(c):
+    return f"{c['width']}x{c['height']}@{c['fps']:g}fps/{c['seconds']:g}s"
+
+def compare(results, old_path):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    prev = {(case_id(c["case"]), s): r for c in old.get("cases", []) for s, r in c["stages"].items()}
+    print(f"\n=== vs {old_path} ({old.get('env', {}).get('git')}) ===")
+    print(f"  {'case':<24} {'stage':<16} {'old s':>9} {'new s':>9} {'speedup':>8}")
+    for c in results["cases"]:
+        for s, r in c["stages"].items():
+            o = prev.get((case_id(c["case"]), s))
+            if not o or not o.get("sec") or not r.get("sec"):
+                continue
+            print(f"  {case_id(c['case']):<24} {s:<16} {o['sec']:>9.4f} {r['sec']:>9.4f} {o['sec'] / r['sec']:>7.2f}x")
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        print(RESULT_TAG + json.dumps(run_child(json.loads(sys.argv[2]))))
+        return
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="640x360,1280x720", help="comma list of WxH")
+    ap.add_argument("--fps", default="30,60,240", help="comma list")
+    ap.add_argument("--seconds", default="2", help="comma list of clip durations")
+    ap.add_argument("--stages", default=",".join(STAGES), help="comma list: " + ",".join(STAGES))
+    ap.add_argument("--model", default="", help="pose .task model (the pose stage is skipped without one)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--clips", default="", help="where generated clips are kept (default <tmp>/vca-bench)")
+    ap.add_argument("--out", default="", help="results JSON (default $VCA_CACHE/bench or <tmp>/vca-bench/results, bench_<stamp>.json)")
+    ap.add_argument("--compare", default="", help="earlier results JSON to compare against")
+    ap.add_argument("--timeout", type=float, default=900.0, help="per stage, seconds")
+    args = ap.parse_args()
+
+    sys.path.insert(0, str(BENCH_DIR))
+    from synth_swing import make_swing, parse_size
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    bad = [s for s in stages if s not in STAGE_FNS]
+    if bad:
+        die(f"Unknown stage(s): {', '.join(bad)}")
+    if args.model and not os.path.exists(args.model):
+        die(f"Missing model: {args.model}")
+    if args.compare and not os.path.exists(args.compare):
+        die(f"Missing results file: {args.compare}")
+    clips = args.clips or os.path.join(tempfile.gettempdir(), "vca-bench")
+
+    results = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "env": env_info(), "repeat": args.repeat,
+               "cases": []}
+    for size in args.sizes.split(","):
+        w, h = parse_size(size)
+        for fps in [float(x) for x in args.fps.split(",")]:
+            for seconds in [float(x) for x in args.seconds.split(",")]:
+                case = make_swing(clips, w, h, fps, seconds, args.seed)
+                case["model"] = os.path.abspath(args.model) if args.model else ""
+                print(f"\n=== {case_id(case)} ({case['frames']} frames) ===")
+                rows = {}
+                for stage in stages:
+                    if stage == "pose" and not args.model:
+                        rows[stage] = {"skipped": "no --model"}
+                        continue
+                    r = rows[stage] = run_stage(stage, case, max(1, args.repeat), args.timeout)
+                    if "error" in r:
+                        print(f"  {stage:<16} ERROR {r['error']}")
+                    else:
+                        print(f"  {stage:<16} {r['sec']:>9.4f}s {r['fps'] or 0:>10.1f} fr/s {r['peak_rss_mb'] or 0:>8.1f} MB")
+                results["cases"].append({"case": {k: case[k] for k in ("width", "height", "fps", "seconds", "frames", "impact")},
+                                         "stages": rows})
+
+    out = args.out or os.path.join(results_dir(), time.strftime("bench_%Y%m%d_%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nOK wrote: {out}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import os, sys, json, math, argparse
+import cv2
+import numpy as np
+
+# Deterministic synthetic swing clips for the benchmarks.
+#
+# One face-on swing (address -> top -> impact -> finish) at any size / fps / duration:
+#   <stem>.mp4        stick-figure golfer, club shaft off the hands, ball on the ground
+#                     that leaves at impact (so impact_anchor_ball_club.py has a ball to find)
+#   <stem>.pose.json  the 33 landmarks the video was drawn from, in the pose_estimate_tasks
+#                     format, so the post-pose stages run without a model
+#
+# Same arguments + seed -> same pixels and same landmarks.
+#
+#   python .\benchmarks\synth_swing.py --out_dir out --size 1280x720 --fps 240 --seconds 2
+
+# fraction of the clip spent in address / backswing / downswing (the rest is follow-through)
+PHASES = (0.18, 0.42, 0.12)
+BONES = [(11, 12), (11, 13), (13, 15), (12, 14), (14, 16), (11, 23), (12, 24), (23, 24),
+         (23, 25), (25, 27), (24, 26), (26, 28)]
+
+def parse_size(s):
+    w, _, h = str(s).lower().partition("x")
+    return int(w), int(h)
+
+def clip_stem(w, h, fps, seconds, seed):
+    return f"swing_{w}x{h}_{int(fps)}fps_{seconds:g}s_s{seed}"
+
+def phase_lengths(n):
+    na = max(2, int(round(n * PHASES[0])))
+    nb = max(2, int(round(n * PHASES[1])))
+    nd = max(2, int(round(n * PHASES[2])))
+    return na, nb, nd, max(2, n - na - nb - nd)
+
+def swing_curves(n):
+    """Per-frame hand angle and shoulder turn (deg), and the impact frame (last downswing frame)."""
+    na, nb, nd, nf = phase_lengths(n)
+    ang = np.concatenate([np.zeros(na), np.linspace(0, 1, nb) ** 1.2 * 170,
+                          170 * (1 - np.linspace(0, 1, nd) ** 1.5), -np.linspace(0, 1, nf) ** 0.7 * 200])
+    rot = np.concatenate([np.zeros(na), np.linspace(0, 1, nb) * 45,
+                          45 - np.linspace(0, 1, nd) * 80, -35 - np.linspace(0, 1, nf) * 30])
+    return ang[:n], rot[:n], na + nb + nd - 1
+
+def landmarks(ang_deg, rot_deg):
+    """33 normalized (x, y, z) landmarks; only the ones the pipeline reads are placed."""
+    a = math.radians(ang_deg)
+    r = math.radians(rot_deg)
+    lm = [[0.5, 0.5, 0.0] for _ in range(33)]
+    hw, sw = 0.08, 0.11
+    lm[23] = [0.5 - hw * math.cos(r * 0.6), 0.6, -hw * math.sin(r * 0.6)]
+    lm[24] = [0.5 + hw * math.cos(r * 0.6), 0.6, hw * math.sin(r * 0.6)]
+    lm[11] = [0.52 - sw * math.cos(r), 0.35, -sw * math.sin(r)]
+    lm[12] = [0.52 + sw * math.cos(r), 0.35, sw * math.sin(r)]
+    hx = 0.5 + 0.25 * math.sin(a)
+    hy = 0.40 + 0.25 * math.cos(a)
+    lm[15] = [hx - 0.01, hy, 0.0]
+    lm[16] = [hx + 0.01, hy, 0.0]
+    lm[13] = [(lm[11][0] + hx) / 2, (lm[11][1] + hy) / 2, 0.0]
+    lm[14] = [(lm[12][0] + hx) / 2, (lm[12][1] + hy) / 2, 0.0]
+    lm[25], lm[26] = [0.42, 0.78, 0.0], [0.58, 0.78, 0.0]
+    lm[27], lm[28] = [0.42, 0.95, 0.0], [0.58, 0.95, 0.0]
+    lm[0] = [0.52, 0.25, 0.0]
+    return lm
+
+def render(lm, ang_deg, w, h, i, impact, noise):
+    img = np.empty((h, w, 3), np.uint8)
+    img[: h // 2] = (120, 90, 40)      # backdrop
+    img[h // 2:] = (60, 110, 60)       # turf
+    img = cv2.add(img, noise)
+
+    px = lambda k: (int(lm[k][0] * w), int(lm[k][1] * h))
+    lw = max(2, w // 160)
+    for a, b in BONES:
+        cv2.line(img, px(a), px(b), (40, 40, 190), lw)
+    cv2.circle(img, px(0), max(4, w // 60), (40, 40, 190), -1)
+
+    # shaft continues the lead arm's swing arc out from the hands
+    a = math.radians(ang_deg)
+    hx, hy = (lm[15][0] + lm[16][0]) / 2 * w, (lm[15][1] + lm[16][1]) / 2 * h
+    L = 0.32 * h
+    cv2.line(img, (int(hx), int(hy)), (int(hx + L * math.sin(a)), int(hy + L * math.cos(a))),
+             (235, 235, 235), max(2, lw // 2))
+
+    bx, by = int(0.5 * w), int(0.93 * h)
+    br = max(3, w // 120)
+    if i <= impact:
+        cv2.circle(img, (bx, by), br, (250, 250, 250), -1)
+    else:
+        k = i - impact
+        cv2.circle(img, (bx + k * w // 40, by - k * h // 30), br, (250, 250, 250), -1)
+    return img
+
+def make_swing(out_dir, w=1280, h=720, fps=60.0, seconds=2.0, seed=0, codec="mp4v", ext=".mp4"):
+    """
+    Writes <stem><ext> + <stem>.pose.json under out_dir (reused if both exist).
+    Returns {"video", "pose", "frames", "impact", ...}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stem = clip_stem(w, h, fps, seconds, seed)
+    video = os.path.join(out_dir, stem + ext)
+    pose = os.path.join(out_dir, stem + ".pose.json")
+    n = max(16, int(round(fps * seconds)))
+    ang, rot, impact = swing_curves(n)
+    info = {"video": video, "pose": pose, "width": w, "height": h, "fps": float(fps), "seconds": float(seconds),
+            "seed": seed, "frames": n, "impact": impact}
+    if os.path.exists(video) and os.path.exists(pose):
+        return info
+
+    rng = np.random.default_rng(seed)
+    # a few fixed noise planes cycled, so encoding isn't trivially cheap but generation stays fast
+    noise = [np.repeat(rng.integers(0, 14, (h, w, 1), dtype=np.uint8), 3, axis=2) for _ in range(4)]
+    vw = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*codec), float(fps), (w, h))
+    if not vw.isOpened():
+        raise RuntimeError(f"synth_swing: could not open a {codec} writer for {video}")
+    frames = []
+    for i in range(n):
+        lm = landmarks(ang[i], rot[i])
+        vw.write(render(lm, ang[i], w, h, i, impact, noise[i % len(noise)]))
+        jitter = rng.normal(0, 0.002, (33, 2))
+        frames.append({"i": i, "t": round(i / fps, 6), "landmarks": [
+            {"x": x + jitter[k, 0], "y": y + jitter[k, 1], "z": z, "visibility": 0.9, "presence": 0.9}
+            for k, (x, y, z) in enumerate(lm)]})
+    vw.release()
+
+    meta = {"fps": float(fps), "frame_count": n, "sample": 1, "model": "synthetic",
+            "non_empty": n, "total_frames_written": n, "synthetic": {"seed": seed, "impact": impact}}
+    with open(pose, "w", encoding="utf-8") as f:
+        json.dump({"frames": frames, "meta": meta}, f)
+    return info
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out_dir", required=True)
+    ap.add_argument("--size", default="1280x720", help="WxH")
+    ap.add_argument("--fps", type=float, default=60.0)
+    ap.add_argument("--seconds", type=float, default=2.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--codec", default="mp4v", help="fourcc (mp4v -> .mp4, MJPG -> .avi)")
+    args = ap.parse_args()
+
+    w, h = parse_size(args.size)
+    ext = ".avi" if args.codec.upper() == "MJPG" else ".mp4"
+    try:
+        info = make_swing(args.out_dir, w, h, args.fps, args.seconds, args.seed, args.codec, ext)
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(info, indent=2))
+
+if __name__ == "__main__":
+    main()
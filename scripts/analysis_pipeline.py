@@ -0,0 +1,461 @@
+import os, sys, json, time, shutil, argparse
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+import instrument
+from frame_store import open_frames, FrameStore, POSE_MAX_SIDE
+from pose_array import from_json, extract_frames
+from result_cache import ResultCache
+
+# One-process swing analysis, run as a dependency graph of stages:
+#
+#   pose -> qc_raw
+#   pose -> smooth -> qc_smoothed
+#   impact_anchor (video only)
+#   smooth + impact_anchor -> impact_proxy (+ swing metrics), phase_frames
+#
+# Replaces the chain of python invocations in pose_estimate_and_smooth.ps1 (and the impact /
+# P-frame steps run after it): libraries are imported once, stages hand the parsed pose to
+# each other in memory, and the video is decoded once into the frame store (frame_store.py)
+# for every video stage (a pose-sized store when full resolution is over the cache cap).
+# Every stage still writes the artifact the standalone script writes, under --out_dir:
+#
+#   <name>.json                          raw pose (pose_estimate_tasks.py)
+#   <name>_qc.json                       QC report of the raw pose (pose_qc.py --json)
+#   <name>_smoothed_a<alpha>_gap<g>.json smoothed pose (pose_smooth.py)
+#   <name>_smoothed_qc.json              QC report of the smoothed pose
+#   impact_anchor.json (+ _dbg_impact/)  impact_anchor_ball_club.py
+#   impact_proxy.json, swing_metrics.json
+#   frames/P1.jpg ... + phase_frames.json  pose_engine.py response
+#   <name>_pipeline.json                 manifest: per-stage keys, params, timings, artifact paths
+#
+# Incremental runs: a stage's key hashes its parameters, its scripts, the video / model it
+# reads and its input stages' keys (result_cache.py). A stage whose key matches the previous
+# manifest and whose artifacts are still on disk is skipped; one whose key is in the result
+# cache is restored from there. So changing alpha re-runs smooth and everything below it,
+# changing face_th re-runs only impact_proxy, and pose inference is reused. --dry_run prints
+# the plan without running anything.
+#
+#   python .\scripts\analysis_pipeline.py --in swing.mp4 --model pose_landmarker_full.task --out_dir out [--dry_run]
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+APP_DIR = SCRIPTS_DIR.parent / "app" / "api" / "analyze-swing"
+GATE_FAIL = 4
+
+DEFAULT_PARAMS = {
+    "sample": 900, "adaptive": False,
+    "max_missing": None,
+    "alpha": 0.45, "max_gap": 2, "vis_min": 0.0, "pres_min": 0.0, "mode": "ema",
+    "shaft_window": 2, "face_th": 6.0
+}
+
+def die(msg, code=1):
+    print(msg, file=sys.stderr)
+    sys.exit(code)
+
+def write_json(path, obj, indent=None):
+    with instrument.span("json_write"), open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=indent)
+    return path
+
+def read_json(path):
+    with instrument.span("json_read"), open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def smooth_tag(alpha, max_gap):
+    """Same suffix pose_estimate_and_smooth.ps1 gives the smoothed file."""
+    return "_smoothed_a{0}_gap{1}".format(("%.2f" % alpha).rstrip("0").rstrip(".").replace(".", ""), max_gap)
+
+class StageTimer:
+    """Wall-clock per stage; `with timer.stage("pose"):` records one row (and any error)."""
+    def __init__(self):
+        self.rows = []
+        self.t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, status="run"):
+        row = {"stage": name, "status": status, "ok": True}
+        start = time.perf_counter()
+        try:
+            with instrument.span("stage:" + name, status=status):
+                yield row
+        except Exception as e:
+            row["ok"] = False
+            row["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            row["sec"] = round(time.perf_counter() - start, 3)
+            self.rows.append(row)
+            print(f"[{name}] {status} {row['sec']:.3f}s" + ("" if row["ok"] else f"  FAILED {row['error']}"))
+
+    def total(self):
+        return round(time.perf_counter() - self.t0, 3)
+
+def qc_report(data, max_missing=None):
+    from pose_qc import load_data, qc_array, check_gate
+    pose, present, fps = load_data(data)
+    if pose is None:
+        raise ValueError("QC: Could not find frames list in JSON.")
+    rep = qc_array(pose, present, fps)
+    if max_missing is not None:
+        rep["gate"] = check_gate(rep, max_missing)
+    return rep
+
+def pose_row(frames, frame_idx):
+    """Row of the pose frame nearest video frame `frame_idx` (pose may be sampled)."""
+    fi = np.array([fr.get("i", k) if isinstance(fr, dict) else k for k, fr in enumerate(frames)], dtype=np.float64)
+    return int(np.argmin(np.abs(fi - frame_idx))) if len(fi) else -1
+
+# ---------------- stages ----------------
+
+class Stage:
+    """
+    One node of the graph: fn(ctx, *input values) -> value (JSON-able), written to `artifacts`
+    (file names under out_dir; a skipped stage's value is loaded back from the first one).
+    The key covers `params`, the `scripts` files, the video / model if read, and the inputs' keys;
+    `scripts` lists the stage's module and every sibling module it imports (instrument.py aside:
+    tracing never changes an artifact).
+    errors: zero-arg callable -> exception types that make the stage yield None instead of
+    stopping the run (impact anchor / proxy / phase frames).
+    """
+    def __init__(self, name, fn, inputs=(), params=(), scripts=(), video=False, model=False,
+                 artifacts=(), errors=None, cache=True):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.params = tuple(params)
+        self.scripts = tuple(scripts)
+        self.video = video
+        self.model = model
+        self.artifacts = artifacts
+        self.errors = errors
+        self.cache = cache
+
+    def files(self, ctx):
+        arts = self.artifacts(ctx.params) if callable(self.artifacts) else self.artifacts
+        return [os.path.join(ctx.out_dir, a.format(name=ctx.name)) for a in arts]
+
+class RunContext:
+    def __init__(self, video, model_task, out_dir, name, params):
+        self.video = video
+        self.model_task = model_task
+        self.out_dir = out_dir
+        self.name = name
+        self.params = params
+        self._frames = None
+        self._pose_frames = None
+
+    def frames(self):
+        """
+        One full-resolution frame reader shared by the video stages, opened on first use.
+        The upload is decoded into the frame store once (when it fits under the cache cap).
+        """
+        if self._frames is None:
+            self._frames = open_frames(self.video, build=True)
+        return self._frames
+
+    def pose_frames(self):
+        """Reader for the pose stage: the shared store, or a POSE_MAX_SIDE one when full res is over the cap."""
+        frames = self.frames()
+        if isinstance(frames, FrameStore):
+            return frames
+        if self._pose_frames is None:
+            self._pose_frames = open_frames(self.video, build=True, max_side=POSE_MAX_SIDE)
+        return self._pose_frames
+
+    def close(self):
+        for frames in (self._frames, self._pose_frames):
+            if frames is not None:
+                frames.close()
+        self._frames = self._pose_frames = None
+
+def _impact_frame(anchor):
+    return anchor["impact"]["P7_frame"] if anchor else None
+
+def _pose_engine():
+    if str(APP_DIR) not in sys.path:
+        sys.path.insert(0, str(APP_DIR))
+    import pose_engine
+    return pose_engine
+
+def _pose(ctx, out):
+    from pose_estimate_tasks import estimate
+    raw = estimate(ctx.video, ctx.model_task, ctx.params["sample"], ctx.params["adaptive"],
+                   frames_src=ctx.pose_frames())
+    write_json(out[0], raw)
+    return raw
+
+def _qc_raw(ctx, out, raw):
+    rep = qc_report(raw, ctx.params["max_missing"])
+    write_json(out[0], rep, indent=2)
+    return rep
+
+def _smooth(ctx, out, raw):
+    from pose_smooth import smooth_data
+    p = ctx.params
+    smoothed, _, _ = smooth_data(raw, p["alpha"], p["max_gap"], p["vis_min"], p["pres_min"], p["mode"])
+    write_json(out[0], smoothed)
+    return smoothed
+
+def _qc_smoothed(ctx, out, smoothed):
+    rep = qc_report(smoothed)
+    write_json(out[0], rep, indent=2)
+    return rep
+
+def _impact_anchor(ctx, out):
+    from impact_anchor_ball_club import find_impact
+    anchor = find_impact(ctx.video, ctx.out_dir, frames_src=ctx.frames())
+    write_json(out[0], anchor, indent=2)
+    return anchor
+
+def _impact_proxy(ctx, out, smoothed, anchor):
+    from impact_proxy import analyze
+    frames, _ = extract_frames(smoothed)
+    impact_frame = _impact_frame(anchor)
+    row = pose_row(frames, impact_frame) if impact_frame is not None else -1
+    proxy = analyze(smoothed, ctx.video, row, ctx.params["shaft_window"], out[1], frames_src=ctx.frames(),
+                    face_th=ctx.params["face_th"])
+    write_json(out[0], proxy, indent=2)
+    return proxy
+
+def _phase_frames(ctx, out, smoothed, anchor):
+    req = {"videoPath": ctx.video, "outDir": os.path.join(ctx.out_dir, "frames"),
+           "impactFrame": _impact_frame(anchor) or 0}
+    res = _pose_engine().run(req, pose=from_json(smoothed, dtype=np.float64), frames_src=ctx.frames())
+    write_json(out[0], res, indent=2)
+    return res
+
+def _anchor_errors():
+    from impact_anchor_ball_club import ImpactAnchorError
+    return (ImpactAnchorError,)
+
+# frame reads (decode-once store + seek index) behind every stage that looks at the video
+FRAME_SCRIPTS = ("frame_store.py", "seek_index.py")
+
+STAGES = [
+    # adaptive sampling ranks frames with impact_anchor_ball_club.roi_diff_energy
+    Stage("pose", _pose, (), ("sample", "adaptive"),
+          ("pose_estimate_tasks.py", "impact_anchor_ball_club.py") + FRAME_SCRIPTS,
+          video=True, model=True, artifacts=("{name}.json",)),
+    Stage("qc_raw", _qc_raw, ("pose",), ("max_missing",), ("pose_qc.py", "pose_array.py"),
+          artifacts=("{name}_qc.json",)),
+    Stage("smooth", _smooth, ("pose",), ("alpha", "max_gap", "vis_min", "pres_min", "mode"),
+          ("pose_smooth.py", "pose_array.py"),
+          artifacts=lambda p: ("{name}" + smooth_tag(p["alpha"], p["max_gap"]) + ".json",)),
+    Stage("qc_smoothed", _qc_smoothed, ("smooth",), (), ("pose_qc.py", "pose_array.py"),
+          artifacts=("{name}_smoothed_qc.json",)),
+    Stage("impact_anchor", _impact_anchor, (), (), ("impact_anchor_ball_club.py",) + FRAME_SCRIPTS, video=True,
+          artifacts=("impact_anchor.json",), errors=_anchor_errors),
+    Stage("impact_proxy", _impact_proxy, ("smooth", "impact_anchor"), ("shaft_window", "face_th"),
+          ("impact_proxy.py", "swing_metrics.py", "phase_detect.py", "pose_array.py") + FRAME_SCRIPTS, video=True,
+          artifacts=("impact_proxy.json", "swing_metrics.json"), errors=lambda: (ValueError,)),
+    # the P-frame images aren't kept in the result cache; they're cheap to grab again
+    Stage("phase_frames", _phase_frames, ("smooth", "impact_anchor"), (),
+          ("phase_detect.py", "impact_proxy.py", "pose_array.py", str(APP_DIR / "pose_engine.py")) + FRAME_SCRIPTS,
+          video=True,
+          artifacts=("phase_frames.json",), errors=lambda: (_pose_engine().PoseEngineError,), cache=False),
+]
+STAGE = {st.name: st for st in STAGES}
+
+# ---------------- planning ----------------
+
+def stage_key(cache, ctx, st, keys):
+    return cache.key(st.name, ctx.video if st.video else None, ctx.model_task if st.model else None,
+                     {p: ctx.params[p] for p in st.params}, [str(SCRIPTS_DIR / s) for s in st.scripts],
+                     [keys[i] for i in st.inputs])
+
+def _cached(cache, st, key, n):
+    """
+    Result-cache paths of all n artifacts of (st, key), or None if any is missing.
+    Read-only (peek): planning, dry runs included, leaves the hit counters and LRU order alone.
+    """
+    paths = []
+    for k in range(n):
+        p = cache.peek(st.name, f"{key}-{k}")
+        if not p:
+            return None
+        paths.append(p)
+    return paths
+
+def plan(ctx, stages, manifest, cache, use_cache=True, force=False):
+    """
+    One step per stage, in run order: {"stage", "key", "action", "reason", "files", "restore"}.
+    action: "skip" (same key as the previous manifest and its artifacts are on disk),
+    "restore" (artifacts found in the result cache) or "run".
+    """
+    prev_keys = manifest.get("keys") or {}
+    prev_params = manifest.get("params") or {}
+    keys = {}
+    actions = {}
+    steps = []
+    for st in stages:
+        key = keys[st.name] = stage_key(cache, ctx, st, keys)
+        files = st.files(ctx)
+        restore = None
+        if force:
+            action, reason = "run", "forced"
+        elif prev_keys.get(st.name) == key and all(os.path.exists(f) for f in files):
+            action, reason = "skip", "unchanged"
+        elif use_cache and st.cache and (restore := _cached(cache, st, key, len(files))):
+            action, reason = "restore", "result cache"
+        else:
+            action = "run"
+            changed = [p for p in st.params if str(prev_params.get(st.name, {}).get(p)) != str(ctx.params[p])]
+            upstream = [i for i in st.inputs if actions.get(i) != "skip"]
+            if st.name not in prev_keys:
+                reason = "no previous run"
+            elif prev_keys[st.name] == key:
+                reason = "artifact missing"
+            elif changed:
+                reason = "params changed: " + ", ".join(changed)
+            elif upstream:
+                reason = "input changed: " + ", ".join(upstream)
+            else:
+                reason = "code / video / model changed"
+        actions[st.name] = action
+        steps.append({"stage": st.name, "key": key, "action": action, "reason": reason,
+                      "files": files, "restore": restore})
+    return steps
+
+# ---------------- run ----------------
+
+def run(video, model_task, out_dir, name="pose", params=None, skip=(), dry_run=False, force=False,
+        use_cache=True):
+    """
+    Brings every stage up to date; returns the summary, which is also the manifest
+    (<name>_pipeline.json) the next run compares against. dry_run: returns only the plan.
+    A failed QC gate on the raw pose blocks the stages after qc_raw (summary["gate_failed"]);
+    impact anchor / proxy / phase-frame failures are recorded and later stages get None.
+    """
+    ctx = RunContext(video, model_task, out_dir, name, dict(DEFAULT_PARAMS, **(params or {})))
+    stages = [st for st in STAGES if st.name not in skip]
+    manifest_path = os.path.join(out_dir, name + "_pipeline.json")
+    manifest = read_json(manifest_path) if os.path.exists(manifest_path) else {}
+    cache = ResultCache()
+    steps = plan(ctx, stages, manifest, cache, use_cache, force)
+    if dry_run:
+        return {"dry_run": True, "plan": [{k: s[k] for k in ("stage", "action", "reason", "key")} for s in steps]}
+
+    os.makedirs(out_dir, exist_ok=True)
+    timer = StageTimer()
+    values = {}
+    keys = {}
+    artifacts = {}
+    gate_failed = False
+
+    def value(stage):
+        # skipped stages are only read back when something downstream actually runs
+        if stage not in values:
+            f = STAGE[stage].files(ctx)[0]
+            values[stage] = read_json(f) if os.path.exists(f) else None
+        return values[stage]
+
+    try:
+        for step in steps:
+            st = STAGE[step["stage"]]
+            files = step["files"]
+            if gate_failed:
+                timer.rows.append({"stage": st.name, "status": "blocked", "ok": None, "sec": 0.0})
+                continue
+            if step["action"] == "skip":
+                timer.rows.append({"stage": st.name, "status": "skip", "ok": True, "sec": 0.0})
+            elif step["action"] == "restore":
+                with timer.stage(st.name, "restore"):
+                    for k, (src, dst) in enumerate(zip(step["restore"], files)):
+                        cache.get(st.name, f"{step['key']}-{k}")   # count the hit, mark it recently used
+                        shutil.copyfile(src, dst)
+            else:
+                try:
+                    with timer.stage(st.name) as row:
+                        row["reason"] = step["reason"]
+                        values[st.name] = st.fn(ctx, files, *[value(i) for i in st.inputs])
+                except Exception as e:
+                    if st.errors is None or not isinstance(e, st.errors()):
+                        raise
+                    values[st.name] = None
+                    continue
+                if use_cache and st.cache:
+                    for k, f in enumerate(files):
+                        cache.put(st.name, f"{step['key']}-{k}", f)
+            keys[st.name] = step["key"]
+            artifacts[st.name] = files[0] if len(files) == 1 else files
+            if st.name == "qc_raw":
+                rep = value("qc_raw")
+                gate_failed = bool(rep.get("gate")) and not rep["gate"]["pass"]
+    finally:
+        ctx.close()
+
+    summary = {
+        "video": os.path.abspath(video),
+        "model": os.path.basename(model_task),
+        "gate_failed": gate_failed,
+        "total_sec": timer.total(),
+        "ran": [r["stage"] for r in timer.rows if r["status"] == "run"],
+        "stages": timer.rows,
+        "keys": keys,
+        "params": {st.name: {p: ctx.params[p] for p in st.params} for st in stages if st.name in keys},
+        "artifacts": artifacts
+    }
+    write_json(manifest_path, summary, indent=2)
+    return summary
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="in_video", required=True)
+    ap.add_argument("--model", dest="model_task", required=True)
+    ap.add_argument("--out_dir", required=True)
+    ap.add_argument("--name", default="pose", help="file name stem for the pose artifacts")
+    ap.add_argument("--sample", type=int, default=DEFAULT_PARAMS["sample"])
+    ap.add_argument("--adaptive", action="store_true")
+    ap.add_argument("--alpha", type=float, default=DEFAULT_PARAMS["alpha"])
+    ap.add_argument("--max_gap", type=int, default=DEFAULT_PARAMS["max_gap"])
+    ap.add_argument("--vis_min", type=float, default=DEFAULT_PARAMS["vis_min"])
+    ap.add_argument("--pres_min", type=float, default=DEFAULT_PARAMS["pres_min"])
+    ap.add_argument("--mode", default=DEFAULT_PARAMS["mode"], help="pose_smooth.py mode")
+    ap.add_argument("--max_missing", type=float, default=-1, help="QC gate on the raw pose (-1 = off)")
+    ap.add_argument("--shaft_window", type=int, default=DEFAULT_PARAMS["shaft_window"])
+    ap.add_argument("--face_th", type=float, default=DEFAULT_PARAMS["face_th"], help="impact_proxy open/closed threshold (deg)")
+    ap.add_argument("--no_phase_frames", action="store_true")
+    ap.add_argument("--dry_run", action="store_true", help="print which stages would run (and why), run nothing")
+    ap.add_argument("--force", action="store_true", help="run every stage, ignoring the previous run and the result cache")
+    ap.add_argument("--no_cache", action="store_true", help="don't read or fill the result cache (result_cache.py)")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.in_video):
+        die(f"Missing input video: {args.in_video}")
+    if not os.path.exists(args.model_task):
+        die(f"Missing model task: {args.model_task}")
+
+    params = {
+        "sample": args.sample, "adaptive": bool(args.adaptive),
+        "max_missing": args.max_missing if args.max_missing >= 0 else None,
+        "alpha": args.alpha, "max_gap": args.max_gap, "vis_min": args.vis_min, "pres_min": args.pres_min,
+        "mode": args.mode, "shaft_window": args.shaft_window, "face_th": args.face_th
+    }
+    try:
+        summary = run(args.in_video, args.model_task, args.out_dir, args.name, params,
+                      ("phase_frames",) if args.no_phase_frames else (), args.dry_run, args.force,
+                      not args.no_cache)
+    except (RuntimeError, ValueError) as e:
+        die(str(e))
+
+    if args.dry_run:
+        print("=== PLAN (dry run) ===")
+        for step in summary["plan"]:
+            print(f"  {step['stage']:<14} {step['action'].upper():<8} {step['reason']}")
+        return
+
+    print(f"\n=== PIPELINE {summary['total_sec']:.3f}s ===")
+    for row in summary["stages"]:
+        print(f"  {row['stage']:<14} {row['status']:<8} {row['sec']:>8.3f}s  {'-' if row['ok'] is None else 'ok' if row['ok'] else 'FAILED'}")
+    for k, v in summary["artifacts"].items():
+        print(f"  {k:<14} {v}")
+    if summary["gate_failed"]:
+        print("QC gate: FAIL (see " + summary["artifacts"]["qc_raw"] + ")")
+        sys.exit(GATE_FAIL)
+
+if __name__ == "__main__":
+    with instrument.run("analysis_pipeline"):
+        main()
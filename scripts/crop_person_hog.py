@@ -3,6 +3,8 @@ from pathlib import Path
 import cv2
 import numpy as np
 
+from frame_store import open_frames
+
 def die(msg, code=1):
     print(msg, file=sys.stderr)
     sys.exit(code)
@@ -10,81 +12,75 @@ def die(msg, code=1):
 def clamp(v, lo, hi):
     return max(lo, min(hi, v))
 
-def main():
-    if len(sys.argv) < 4:
-        die("usage: crop_person_hog.py <video> <out_dir> <sample_n> [pad=0.35]")
-
-    vid = sys.argv[1]
-    out_dir = Path(sys.argv[2])
-    sample_n = int(sys.argv[3])
-    pad = float(sys.argv[4]) if len(sys.argv) >= 5 else 0.35
-
-    if not Path(vid).exists():
-        die(f"video not found: {vid}")
-    out_dir.mkdir(parents=True, exist_ok=True)
-
-    cap = cv2.VideoCapture(vid)
-    if not cap.isOpened():
-        die("failed to open video")
-
-    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
-    if total <= 0:
-        die("bad frame count")
-
-    # HOG person detector (built-in)
-    hog = cv2.HOGDescriptor()
-    hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+_HOG = None
+
+def detect_person(frame, hog=None):
+    """
+    Best HOG person box (x, y, w, h) in full-frame pixels, or None.
+    Frames wider than 1280 px are downscaled for detection.
+    """
+    global _HOG
+    if hog is None:
+        if _HOG is None:
+            _HOG = cv2.HOGDescriptor()
+            _HOG.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        hog = _HOG
+    h, w = frame.shape[:2]
+
+    # Resize down for detection speed if huge
+    scale = 1.0
+    if w > 1280:
+        scale = 1280.0 / w
+        frame_small = cv2.resize(frame, (int(w*scale), int(h*scale)))
+    else:
+        frame_small = frame
+
+    rects, weights = hog.detectMultiScale(frame_small, winStride=(8,8), padding=(16,16), scale=1.05)
+    if rects is None or len(rects) == 0:
+        return None
+
+    # pick best by weight * area
+    best = None
+    bestScore = -1
+    for (x,y,ww,hh), wt in zip(rects, np.ravel(weights)):
+        score = float(wt) * (ww*hh)
+        if score > bestScore:
+            bestScore = score
+            best = (x,y,ww,hh)
+
+    if best is None:
+        return None
+
+    x,y,ww,hh = best
+    # map back up to original coords if scaled
+    if scale != 1.0:
+        x = int(x/scale); y = int(y/scale); ww = int(ww/scale); hh = int(hh/scale)
+    return (int(x), int(y), int(ww), int(hh))
+
+def person_bbox(frames, sample_n, pad=0.35, max_samples=30):
+    """
+    Robust (median) padded person bbox over up to max_samples frames, every sample_n-th,
+    from an open frame_store reader. Returns the crop_meta dict, or None if HOG finds nobody.
+    """
+    total = int(frames.frame_count or 0)
 
     # sample a set of frames across the video
     idxs = list(range(0, total, max(1, sample_n)))
-    idxs = idxs[:min(len(idxs), 30)]  # cap samples (speed)
+    idxs = idxs[:min(len(idxs), max_samples)]  # cap samples (speed)
 
     boxes = []
     w0 = h0 = None
 
-    for fi in idxs:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, fi)
-        ok, frame = cap.read()
-        if not ok or frame is None:
-            continue
-        h, w = frame.shape[:2]
-        h0, w0 = h, w
-
-        # Resize down for detection speed if huge
-        scale = 1.0
-        if w > 1280:
-            scale = 1280.0 / w
-            frame_small = cv2.resize(frame, (int(w*scale), int(h*scale)))
-        else:
-            frame_small = frame
-
-        rects, weights = hog.detectMultiScale(frame_small, winStride=(8,8), padding=(16,16), scale=1.05)
-        if rects is None or len(rects) == 0:
-            continue
-
-        # pick best by weight * area
-        best = None
-        bestScore = -1
-        for (x,y,ww,hh), wt in zip(rects, weights):
-            score = float(wt) * (ww*hh)
-            if score > bestScore:
-                bestScore = score
-                best = (x,y,ww,hh)
-
-        if best is None:
+    for fi, frame in frames.iter_indices(idxs):
+        if frame is None:
             continue
-
-        x,y,ww,hh = best
-        # map back up to original coords if scaled
-        if scale != 1.0:
-            x = int(x/scale); y = int(y/scale); ww = int(ww/scale); hh = int(hh/scale)
-
-        boxes.append((x,y,ww,hh))
-
-    cap.release()
+        h0, w0 = frame.shape[:2]
+        box = detect_person(frame)
+        if box is not None:
+            boxes.append(box)
 
     if not boxes:
-        die("no person boxes found. (subject too small / too dark / extreme angle)")
+        return None
 
     # robust median bbox
     xs = np.array([b[0] for b in boxes])
@@ -104,16 +100,44 @@ def main():
     x2 = clamp(x + ww + px, 0, w0-1)
     y2 = clamp(y + hh + py, 0, h0-1)
 
-    meta = {
+    return {
         "ok": True,
         "samples_used": len(boxes),
         "bbox": {"x1": x1, "y1": y1, "x2": x2, "y2": y2, "pad": pad}
     }
 
+def main():
+    if len(sys.argv) < 4:
+        die("usage: crop_person_hog.py <video> <out_dir> <sample_n> [pad=0.35]")
+
+    vid = sys.argv[1]
+    out_dir = Path(sys.argv[2])
+    sample_n = int(sys.argv[3])
+    pad = float(sys.argv[4]) if len(sys.argv) >= 5 else 0.35
+
+    if not Path(vid).exists():
+        die(f"video not found: {vid}")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        frames = open_frames(vid)
+    except RuntimeError:
+        die("failed to open video")
+
+    total = int(frames.frame_count or 0)
+    if total <= 0:
+        die("bad frame count")
+
+    meta = person_bbox(frames, sample_n, pad)
+    frames.close()
+
+    if meta is None:
+        die("no person boxes found. (subject too small / too dark / extreme angle)")
+
     # write bbox json
     (out_dir / "crop_meta.json").write_text(json.dumps(meta, indent=2))
 
     print(json.dumps(meta))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
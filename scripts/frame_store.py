@@ -0,0 +1,455 @@
+import os, sys, json, time, shutil, hashlib, argparse, tempfile
+import cv2
+import numpy as np
+
+import instrument
+
+# Decode-once frame cache shared by the analysis scripts.
+#
+# One upload is decoded a single time into <root>/<key>/:
+#   frames.u8   raw uint8 BGR frames, shape (N, H, W, 3), memory-mapped on read
+#   index.json  video identity, fps, frame count, size, scale and per-frame timestamps
+#
+# Every stage asks open_frames(video) for a reader. If a store exists for that video
+# (or VCA_FRAME_STORE=1 / build=True asks for one to be built) reads are O(1) memmap
+# slices; otherwise the reader falls back to a plain cv2.VideoCapture with the usual seeks.
+#
+# Stores are full resolution by default (the impact / shaft / P-frame stages measure in
+# source pixels). Pose only needs normalized landmarks from a model that sees ~256 px, so
+# it also accepts a store downscaled to POSE_MAX_SIDE, which keeps long slow-mo uploads
+# under the cap. The root is capped at VCA_FRAME_CACHE_MB: least recently opened stores
+# are evicted after each build, and a store whose frames alone exceed the cap is never
+# built (the reader stays on VideoCapture).
+
+INDEX_NAME = "index.json"
+FRAMES_NAME = "frames.u8"
+STORE_VERSION = 2
+DEFAULT_MAX_MB = 4096
+STALE_BUILD_SEC = 3600   # a frames.u8.part this old is a crashed build
+POSE_MAX_SIDE = 640      # long side of the pose-only store (pose models run at 256 px)
+
+class StoreTooLarge(RuntimeError):
+    pass
+
+def cache_root():
+    root = os.environ.get("VCA_FRAME_CACHE") or ""
+    if not root:
+        vca_cache = os.environ.get("VCA_CACHE") or ""
+        root = os.path.join(vca_cache, "frames") if vca_cache else os.path.join(tempfile.gettempdir(), "vca-frames")
+    return root
+
+def max_bytes():
+    return int(float(os.environ.get("VCA_FRAME_CACHE_MB") or DEFAULT_MAX_MB) * 1024 * 1024)
+
+def store_key(video, max_side=0):
+    st = os.stat(video)
+    ident = f"{os.path.abspath(video)}|{st.st_size}|{st.st_mtime_ns}|v{STORE_VERSION}"
+    if max_side:
+        ident += f"|s{int(max_side)}"
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()[:20]
+
+def store_dir(video, root=None, max_side=0):
+    return os.path.join(root or cache_root(), store_key(video, max_side))
+
+def _scaled_size(w, h, max_side):
+    if max_side and max(w, h) > max_side:
+        s = float(max_side) / float(max(w, h))
+        return max(1, int(round(w * s))), max(1, int(round(h * s))), s
+    return w, h, 1.0
+
+def _dir_bytes(d):
+    n = 0
+    for name in os.listdir(d):
+        try:
+            n += os.path.getsize(os.path.join(d, name))
+        except OSError:
+            pass
+    return n
+
+def stores(root=None):
+    """
+    [(last used, bytes, dir, building)] under the cache root. A dir may hold only a
+    seek index (seek_index.py); `building` = a frame file still being written.
+    """
+    root = root or cache_root()
+    out = []
+    if not os.path.isdir(root):
+        return out
+    for name in os.listdir(root):
+        d = os.path.join(root, name)
+        if not os.path.isdir(d):
+            continue
+        try:
+            files = [os.path.join(d, f) for f in os.listdir(d)]
+            used = max([os.path.getmtime(f) for f in files] or [os.path.getmtime(d)])
+        except OSError:
+            continue
+        out.append((used, _dir_bytes(d), d, os.path.join(d, FRAMES_NAME + ".part") in files))
+    return out
+
+def evict(limit=None, keep=None, root=None):
+    """
+    Drop least recently opened stores until the root fits in `limit` bytes (default
+    VCA_FRAME_CACHE_MB), never `keep`; stale incomplete builds always go. Returns bytes freed.
+    """
+    limit = max_bytes() if limit is None else int(limit)
+    ents = sorted(stores(root))
+    total = sum(e[1] for e in ents)
+    freed = 0
+    now = time.time()
+    for used, size, d, building in ents:
+        if keep and os.path.abspath(d) == os.path.abspath(keep):
+            continue
+        if building:
+            if now - used <= STALE_BUILD_SEC:
+                continue
+        elif total - freed <= limit:
+            continue
+        shutil.rmtree(d, ignore_errors=True)
+        if not os.path.exists(d):
+            freed += size
+    return freed
+
+def build_store(video, root=None, limit=None, max_side=0):
+    """
+    Decode `video` once, in order, into a raw frame file + index. Returns the store dir.
+    max_side > 0 downscales frames to that long side (INTER_AREA); index "scale" = store / source px.
+    index.json is written last, so a store without it is treated as incomplete.
+    Raises StoreTooLarge (nothing kept) when the frames would not fit in the cache cap.
+    """
+    out_dir = store_dir(video, root, max_side)
+    if os.path.exists(os.path.join(out_dir, INDEX_NAME)):
+        return out_dir
+    limit = max_bytes() if limit is None else int(limit)
+
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise RuntimeError(f"frame_store: could not open video: {video}")
+    fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+    container_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    est_w, est_h, _ = _scaled_size(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0), max_side)
+    est = container_count * est_w * est_h * 3
+    if est > limit:
+        cap.release()
+        raise StoreTooLarge(f"frame_store: {video} needs ~{est >> 20} MB, over the {limit >> 20} MB cache cap")
+    os.makedirs(out_dir, exist_ok=True)
+
+    t0 = time.time()
+    n = 0
+    w = h = src_w = src_h = 0
+    scale = 1.0
+    t_ms = []
+    tmp_frames = os.path.join(out_dir, FRAMES_NAME + ".part")
+    too_large = False
+    with open(tmp_frames, "wb") as f:
+        while True:
+            with instrument.span("decode"):
+                ok, bgr = cap.read()
+            if not ok or bgr is None:
+                break
+            if n == 0:
+                src_h, src_w = bgr.shape[:2]
+                w, h, scale = _scaled_size(src_w, src_h, max_side)
+            if scale != 1.0:
+                bgr = cv2.resize(bgr, (w, h), interpolation=cv2.INTER_AREA)
+            if (n + 1) * bgr.nbytes > limit:   # container frame count was short
+                too_large = True
+                break
+            f.write(np.ascontiguousarray(bgr).tobytes())
+            t_ms.append(round(float(cap.get(cv2.CAP_PROP_POS_MSEC) or 0.0), 3))
+            n += 1
+    cap.release()
+
+    if too_large or n == 0:
+        os.remove(tmp_frames)
+    if too_large:
+        raise StoreTooLarge(f"frame_store: {video} is over the {limit >> 20} MB cache cap")
+    if n == 0:
+        raise RuntimeError(f"frame_store: no frames decoded from: {video}")
+
+    os.replace(tmp_frames, os.path.join(out_dir, FRAMES_NAME))
+    st = os.stat(video)
+    index = {
+        "version": STORE_VERSION,
+        "video": os.path.abspath(video),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "fps": fps,
+        "frame_count": n,
+        "container_frame_count": container_count,
+        "w": w,
+        "h": h,
+        "src_w": src_w,
+        "src_h": src_h,
+        "scale": scale,
+        "max_side": int(max_side),
+        "decode_sec": round(time.time() - t0, 3),
+        "t_ms": t_ms
+    }
+    tmp_index = os.path.join(out_dir, INDEX_NAME + ".part")
+    with open(tmp_index, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_index, os.path.join(out_dir, INDEX_NAME))
+    evict(limit, keep=out_dir, root=root)
+    return out_dir
+
+class FrameStore:
+    """
+    Random-access reader over a built store. read(idx) is a memmap slice (no decode).
+    Returned frames are read-only views; copy before drawing on them.
+    Opening marks the store recently used for eviction.
+    """
+    def __init__(self, path):
+        self.path = path
+        index_path = os.path.join(path, INDEX_NAME)
+        with open(index_path, "r", encoding="utf-8") as f:
+            self.index = json.load(f)
+        try:
+            os.utime(index_path)
+        except OSError:
+            pass
+        self.fps = float(self.index.get("fps") or 0.0)
+        self.frame_count = int(self.index["frame_count"])
+        self.width = int(self.index["w"])
+        self.height = int(self.index["h"])
+        self.scale = float(self.index.get("scale") or 1.0)
+        self._mm = np.memmap(os.path.join(path, FRAMES_NAME), dtype=np.uint8, mode="r",
+                             shape=(self.frame_count, self.height, self.width, 3))
+
+    def read(self, idx):
+        idx = int(idx)
+        if idx < 0 or idx >= self.frame_count:
+            return None
+        return np.asarray(self._mm[idx])
+
+    def iter_frames(self, start=0, stop=None):
+        stop = self.frame_count if stop is None else min(int(stop), self.frame_count)
+        for i in range(max(0, int(start)), stop):
+            yield i, np.asarray(self._mm[i])
+
+    def iter_indices(self, idxs):
+        for i in sorted(set(int(i) for i in idxs)):
+            yield i, self.read(i)
+
+    def timestamp_ms(self, idx):
+        t = self.index.get("t_ms") or []
+        return t[idx] if 0 <= idx < len(t) else None
+
+    def close(self):
+        self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CaptureFrames:
+    """
+    Same interface as FrameStore on top of cv2.VideoCapture (no cache available).
+    read(idx) seeks; iter_frames() decodes sequentially on its own capture;
+    iter_indices() batches scattered reads through the persistent seek index.
+    """
+    def __init__(self, video):
+        self.path = video
+        self.cap = cv2.VideoCapture(video)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"frame_store: could not open video: {video}")
+        self.fps = float(self.cap.get(cv2.CAP_PROP_FPS) or 0.0)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
+        self.scale = 1.0
+        self._seek_index = None
+        self._pos = {"pos": None}   # decode position of self.cap, shared with iter_indices
+
+    def seek_index(self):
+        if self._seek_index is None:
+            from seek_index import load_index
+            self._seek_index = load_index(self.path) or {}
+        return self._seek_index
+
+    def read(self, idx):
+        with instrument.span("decode_seek"):
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
+            ok, bgr = self.cap.read()
+        if not ok or bgr is None:
+            self._pos["pos"] = None
+            return None
+        self._pos["pos"] = int(idx) + 1
+        return bgr
+
+    def iter_frames(self, start=0, stop=None):
+        cap = cv2.VideoCapture(self.path)
+        try:
+            i = max(0, int(start))
+            if i > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+            while stop is None or i < stop:
+                with instrument.span("decode"):
+                    ok, bgr = cap.read()
+                if not ok or bgr is None:
+                    break
+                yield i, bgr
+                i += 1
+        finally:
+            cap.release()
+
+    def iter_indices(self, idxs):
+        from seek_index import iter_indices
+        return iter_indices(self.cap, idxs, self.seek_index(), state=self._pos)
+
+    def timestamp_ms(self, idx):
+        t = self.seek_index().get("t_ms") or []
+        return t[idx] if 0 <= idx < len(t) else None
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class DecodedFrames:
+    """
+    Same read interface over frames a caller already holds in memory ({idx: bgr}),
+    so later stages can reuse them instead of decoding again. Missing indices read as None.
+    """
+    def __init__(self, frames, fps=0.0):
+        self.frames = dict(frames)
+        self.fps = float(fps or 0.0)
+        self.frame_count = (max(self.frames) + 1) if self.frames else 0
+        first = next(iter(self.frames.values()), None)
+        self.height, self.width = first.shape[:2] if first is not None else (0, 0)
+        self.scale = 1.0
+
+    def read(self, idx):
+        return self.frames.get(int(idx))
+
+    def iter_frames(self, start=0, stop=None):
+        for i in sorted(self.frames):
+            if i >= start and (stop is None or i < stop):
+                yield i, self.frames[i]
+
+    def iter_indices(self, idxs):
+        for i in sorted(set(int(i) for i in idxs)):
+            yield i, self.frames.get(i)
+
+    def timestamp_ms(self, idx):
+        return None
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class WindowFrames:
+    """
+    Frames [start, stop) of another reader, re-indexed from 0, so a clip-level stage can run
+    on one swing of a long session (swing_segment.py). The wrapped reader is left open.
+    """
+    def __init__(self, src, start, stop):
+        self.src = src
+        self.start = max(0, int(start))
+        self.stop = max(self.start, int(stop))
+        self.path = getattr(src, "path", None)
+        self.fps = src.fps
+        self.frame_count = self.stop - self.start
+        self.width = src.width
+        self.height = src.height
+        self.scale = src.scale
+
+    def read(self, idx):
+        idx = int(idx)
+        return self.src.read(self.start + idx) if 0 <= idx < self.frame_count else None
+
+    def iter_frames(self, start=0, stop=None):
+        stop = self.frame_count if stop is None else min(int(stop), self.frame_count)
+        for i, bgr in self.src.iter_frames(self.start + max(0, int(start)), self.start + stop):
+            yield i - self.start, bgr
+
+    def iter_indices(self, idxs):
+        local = sorted(set(int(i) for i in idxs if 0 <= int(i) < self.frame_count))
+        for i, bgr in self.src.iter_indices([self.start + i for i in local]):
+            yield i - self.start, bgr
+
+    def timestamp_ms(self, idx):
+        t = self.src.timestamp_ms(self.start + int(idx))
+        t0 = self.src.timestamp_ms(self.start)
+        return None if t is None or t0 is None else t - t0
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_frames(video, build=None, root=None, max_side=0):
+    """
+    Reader for `video`: the decoded store if one exists, else a VideoCapture fallback.
+    build=None follows VCA_FRAME_STORE=1; build=True decodes into the store first
+    (unless the video is over the cache cap).
+    max_side > 0 is for callers that work in normalized coordinates (pose): they also
+    accept a store downscaled to that long side. The full-resolution store is still
+    preferred and built when it fits; the downscaled one when it does not.
+    """
+    if build is None:
+        build = os.environ.get("VCA_FRAME_STORE", "") == "1"
+    sides = [0] + ([int(max_side)] if max_side else [])
+    try:
+        dirs = [store_dir(video, root, s) for s in sides]
+    except OSError:
+        dirs = []
+    for d in dirs:
+        if os.path.exists(os.path.join(d, INDEX_NAME)):
+            return FrameStore(d)
+    if dirs and build:
+        for s in sides:
+            try:
+                return FrameStore(build_store(video, root, max_side=s))
+            except StoreTooLarge:
+                pass
+    return CaptureFrames(video)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="inp", default="")
+    ap.add_argument("--root", default="")
+    ap.add_argument("--max_side", type=int, default=0, help="downscale to this long side (0 = full resolution)")
+    ap.add_argument("--evict_to_mb", type=float, default=None, help="only evict stores down to this size")
+    args = ap.parse_args()
+    root = args.root or None
+
+    if args.evict_to_mb is not None:
+        freed = evict(int(args.evict_to_mb * 1024 * 1024), root=root)
+        print(f"OK evicted {freed} bytes")
+        return
+    if not args.inp:
+        print("frame_store.py: --in is required", file=sys.stderr)
+        raise SystemExit(1)
+    if not os.path.exists(args.inp):
+        print(f"frame_store.py: video not found: {args.inp}", file=sys.stderr)
+        raise SystemExit(1)
+
+    try:
+        d = build_store(args.inp, root, max_side=args.max_side)
+    except StoreTooLarge as e:
+        print(str(e), file=sys.stderr)
+        raise SystemExit(2)
+    with open(os.path.join(d, INDEX_NAME), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    print(f"OK frame store: {d} frames={index['frame_count']} size={index['w']}x{index['h']} decode={index['decode_sec']}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,89 +1,123 @@
-import os, json, argparse, math
+import os, json, argparse, math, subprocess
+from collections import deque
 import cv2
 import numpy as np
 
+from frame_store import open_frames
+
 def clamp(v, lo, hi):
     return max(lo, min(hi, v))
 
-def read_frame(cap, idx):
-    cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-    ok, bgr = cap.read()
-    return ok, bgr
+def get_fps_and_count(frames, inp, fps_hint=0.0):
+    # --- fps + frame_count (robust) ---
+    fps = float(frames.fps or 0.0)
+    if fps <= 0 and fps_hint > 0:
+        fps = fps_hint
+    if fps <= 0:
+        fps = 25.0
+
+    # primary: decoded store / OpenCV frame count
+    frame_count = int(frames.frame_count or 0)
+
+    # Fallback: ask ffprobe for nb_read_frames / nb_frames / duration
+    if frame_count <= 0:
+        try:
+            cmd = [
+                "ffprobe","-v","error",
+                "-select_streams","v:0",
+                "-count_frames",
+                "-show_entries","stream=nb_read_frames,nb_frames,duration",
+                "-of","json",
+                inp
+            ]
+            j = json.loads(subprocess.check_output(cmd, text=True, stderr=subprocess.STDOUT))
+            st = (j.get("streams") or [{}])[0]
+            nf = st.get("nb_read_frames") or st.get("nb_frames")
+            if nf is not None:
+                frame_count = int(float(nf))
+            else:
+                dur = float(st.get("duration") or 0.0)
+                if dur > 0 and fps > 0:
+                    frame_count = int(round(dur * fps))
+        except Exception:
+            pass
+
+    if frame_count <= 0:
+        raise RuntimeError("Could not determine frame_count (opencv+ffprobe both failed)")
+    return fps, frame_count
 
-def find_ball_roi_early(cap, early_idxs, dbg_dir):
+def ball_candidates(gray, i, best):
     """
-    Try to find ball in early frames where it's stationary.
+    Score ball candidates in one early frame (ball still stationary).
     Strategy:
       1) HoughCircles on blurred gray (white-ish ball)
-      2) Fallback: brightest small blob near lower half
-    Returns: (cx, cy, r, conf)
+      2) Fallback: brightest small blob near lower half (only while nothing found yet)
+    Frames must be fed in index order. Returns the updated best (score, cx, cy, r, frame_idx).
     """
-    best = None  # (score, cx, cy, r, frame_idx)
-    for i in early_idxs:
-        ok, bgr = read_frame(cap, i)
-        if not ok or bgr is None:
-            continue
-
-        h, w = bgr.shape[:2]
-        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-
-        # Focus on lower 65% of frame (ball on ground)
-        y0 = int(h * 0.35)
-        roi = gray[y0:h, 0:w].copy()
-
-        roi_blur = cv2.GaussianBlur(roi, (9,9), 1.5)
-
-        circles = cv2.HoughCircles(
-            roi_blur,
-            cv2.HOUGH_GRADIENT,
-            dp=1.2,
-            minDist=30,
-            param1=120,
-            param2=16,
-            minRadius=2,
-            maxRadius=18
-        )
-
-        if circles is not None:
-            circles = np.round(circles[0, :]).astype(int)
-            for (x, y, r) in circles:
-                cx = int(x)
-                cy = int(y + y0)
-                # Score: brightness at center + small radius preference
-                cx2 = clamp(cx, 0, w-1)
-                cy2 = clamp(cy, 0, h-1)
-                bright = int(gray[cy2, cx2])
-                score = bright - (r * 0.5)
-                if best is None or score > best[0]:
-                    best = (score, cx, cy, r, i)
-
-        # Fallback: brightest blob
-        if best is None:
-            # threshold high values (ball tends to be bright)
-            _, th = cv2.threshold(roi_blur, 220, 255, cv2.THRESH_BINARY)
-            th = cv2.morphologyEx(th, cv2.MORPH_OPEN, np.ones((3,3), np.uint8), iterations=1)
-            cnts, _ = cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            for c in cnts:
-                area = cv2.contourArea(c)
-                if area < 6 or area > 400:
-                    continue
-                x,y,wc,hc = cv2.boundingRect(c)
-                cx = x + wc//2
-                cy = y + hc//2 + y0
-                # prefer lower-ish and near middle-ish
-                score = 50 - abs(cy - int(h*0.80))*0.02 - abs(cx - int(w*0.50))*0.01
-                if best is None or score > best[0]:
-                    best = (score, cx, cy, max(wc,hc)//2, i)
+    h, w = gray.shape[:2]
+
+    # Focus on lower 65% of frame (ball on ground)
+    y0 = int(h * 0.35)
+    roi = gray[y0:h, 0:w].copy()
+
+    roi_blur = cv2.GaussianBlur(roi, (9,9), 1.5)
+
+    circles = cv2.HoughCircles(
+        roi_blur,
+        cv2.HOUGH_GRADIENT,
+        dp=1.2,
+        minDist=30,
+        param1=120,
+        param2=16,
+        minRadius=2,
+        maxRadius=18
+    )
 
+    if circles is not None:
+        circles = np.round(circles[0, :]).astype(int)
+        for (x, y, r) in circles:
+            cx = int(x)
+            cy = int(y + y0)
+            # Score: brightness at center + small radius preference
+            cx2 = clamp(cx, 0, w-1)
+            cy2 = clamp(cy, 0, h-1)
+            bright = int(gray[cy2, cx2])
+            score = bright - (r * 0.5)
+            if best is None or score > best[0]:
+                best = (score, cx, cy, r, i)
+
+    # Fallback: brightest blob
+    if best is None:
+        # threshold high values (ball tends to be bright)
+        _, th = cv2.threshold(roi_blur, 220, 255, cv2.THRESH_BINARY)
+        th = cv2.morphologyEx(th, cv2.MORPH_OPEN, np.ones((3,3), np.uint8), iterations=1)
+        cnts, _ = cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for c in cnts:
+            area = cv2.contourArea(c)
+            if area < 6 or area > 400:
+                continue
+            x,y,wc,hc = cv2.boundingRect(c)
+            cx = x + wc//2
+            cy = y + hc//2 + y0
+            # prefer lower-ish and near middle-ish
+            score = 50 - abs(cy - int(h*0.80))*0.02 - abs(cx - int(w*0.50))*0.01
+            if best is None or score > best[0]:
+                best = (score, cx, cy, max(wc,hc)//2, i)
+
+    return best
+
+def finish_ball(best, best_bgr, dbg_dir):
+    """
+    Turn the best early candidate into (cx, cy, r, conf) and write the detection debug frame.
+    """
     if best is None:
         return None
 
     score, cx, cy, r, fi = best
     conf = float(1.0 / (1.0 + math.exp(-score/20.0)))  # squashed
     # debug draw
-    ok, bgr = read_frame(cap, fi)
-    if ok:
-        vis = bgr.copy()
+    if best_bgr is not None:
+        vis = best_bgr.copy()
         cv2.circle(vis, (cx, cy), max(6, int(r)), (0,255,0), 2)
         cv2.circle(vis, (cx, cy), 2, (0,255,0), -1)
         cv2.putText(vis, f"BALL@{fi} conf={conf:.2f}", (20,30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,0), 2)
@@ -113,97 +147,85 @@ def motion_energy(a_gray, b_gray, box):
     return float(np.count_nonzero(th)) / float(th.size)
 # --- constants (window around ball event for club scan) ---
 CLUB_WINDOW_FRAMES = 30
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--in", dest="inp", required=True)
-    ap.add_argument("--outdir", required=True)
-    ap.add_argument("--fps_hint", type=float, default=0.0)
-    ap.add_argument("--early_frames", type=int, default=45)   # search ball in first N frames
-    ap.add_argument("--ball_box", type=int, default=120)      # ROI size around ball
-    ap.add_argument("--club_box", type=int, default=280)      # ROI size for club motion near ball
-    ap.add_argument("--debug_every", type=int, default=0)     # set 25 to dump periodic debug frames
-    args = ap.parse_args()
+# decoded BGR frames kept around for the debug captures (ball event +/- 3 lands inside)
+RECENT_FRAMES = 8
 
-    # ---- scan window ----
-    # --- fps + frame_count (robust) ---
-# ensure fps is defined
-try:
-    fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
-except Exception:
-    fps = 0.0
-if fps <= 0:
-    fps = float(args.fps_hint) if hasattr(args, "fps_hint") and args.fps_hint else 25.0
-
-# primary: OpenCV frame count
-try:
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
-except Exception:
-    frame_count = 0
-
-# Fallback: ask ffprobe for nb_read_frames / nb_frames / duration
-if frame_count <= 0:
-    try:
-        import subprocess, json
-        cmd = [
-            "ffprobe","-v","error",
-            "-select_streams","v:0",
-            "-count_frames",
-            "-show_entries","stream=nb_read_frames,nb_frames,duration",
-            "-of","json",
-            inp
-        ]
-        j = json.loads(subprocess.check_output(cmd, text=True, stderr=subprocess.STDOUT))
-        st = (j.get("streams") or [{}])[0]
-        nf = st.get("nb_read_frames") or st.get("nb_frames")
-        if nf is not None:
-            frame_count = int(float(nf))
-        else:
-            dur = float(st.get("duration") or 0.0)
-            if dur > 0 and fps > 0:
-                frame_count = int(round(dur * fps))
-    except Exception:
-        pass
-
-if frame_count <= 0:
-    raise RuntimeError("Could not determine frame_count (opencv+ffprobe both failed)")
-# --- end robust init ---minF = max(1, int(getattr(args, "min_frame", 1)))
-    maxF = int(getattr(args, "max_frame", -1))
-    if maxF < 0 or maxF > (frame_count - 1):
-        maxF = frame_count - 1
-    if minF > maxF:
-        minF = max(1, maxF - 1)
-    os.makedirs(args.outdir, exist_ok=True)
-    dbg_dir = os.path.join(args.outdir, "_dbg_impact")
+class ImpactAnchorError(RuntimeError):
+    def __init__(self, msg, code=1):
+        super().__init__(msg)
+        self.code = code
+
+def find_impact(inp, outdir, fps_hint=0.0, early_frames=45, ball_box_px=120, club_box_px=280,
+                debug_every=0, frames_src=None):
+    """
+    Ball departure + club motion impact anchor for one clip -> the impact_anchor.json dict.
+    Debug images go to <outdir>/_dbg_impact. frames_src: an open frame_store reader to use
+    instead of opening `inp` (left open). Raises ImpactAnchorError (code = CLI exit code).
+    """
+    os.makedirs(outdir, exist_ok=True)
+    dbg_dir = os.path.join(outdir, "_dbg_impact")
     os.makedirs(dbg_dir, exist_ok=True)
 
-    cap = cv2.VideoCapture(args.inp)
-    if not cap.isOpened():
-        print("ERROR: cannot open video")
-        raise SystemExit(1)
+    own_src = frames_src is None
+    if own_src:
+        try:
+            frames_src = open_frames(inp)
+        except RuntimeError:
+            raise ImpactAnchorError("cannot open video", 1)
+
+    fps, frame_count = get_fps_and_count(frames_src, inp, fps_hint)
+
+    # ---- frame buffers for debug captures ----
+    # The clip is decoded exactly once, in order. Debug images need the BGR of a few frames
+    # that are only known later (ball event, club peak, impact), so we keep a short ring of
+    # recent frames plus a handful of pinned ones. Anything outside that falls back to a
+    # random read on the frame source (debug output only; the JSON never depends on it).
+    recent = deque(maxlen=RECENT_FRAMES)   # (idx, bgr)
+    pinned = {}                            # idx -> bgr
+
+    def frame_bgr(idx):
+        if idx in pinned:
+            return pinned[idx]
+        for j, bgr in recent:
+            if j == idx:
+                return bgr
+        return frames_src.read(idx)
+
+    frames = frames_src.iter_frames()
+
+    # ---- PASS PART 1: early frames (ball detect + baseline buffer) ----
+    early_n = min(frame_count, early_frames)
+    # sample a bit (speed)
+    early_idxs = set([0,1,2,3,4,5,10,15,20,25,30,35,40] + [i for i in range(early_n) if i % 7 == 0])
+    early_last = max(max(early_idxs), early_n - 1)
 
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
-    fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
-    if fps <= 0 and args.fps_hint > 0:
-        fps = args.fps_hint
-    if fps <= 0:
-        fps = 25.0
+    grays = []   # early grays; grays[i] is frame i
+    best = None
+    best_bgr = None
+    for i, bgr in frames:
+        g = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        grays.append(g)
+        recent.append((i, bgr))
+        if i == 0 or (debug_every and i % debug_every == 0):
+            pinned[i] = bgr
+        if i in early_idxs:
+            best = ball_candidates(g, i, best)
+            if best is not None and best[4] == i:
+                best_bgr = bgr
+        if i >= early_last:
+            break
 
-    # ---- BALL DETECT (early) ----
-    early = list(range(0, min(frame_count, args.early_frames)))
-    # sample a bit (speed)
-    early_idxs = sorted(set([0,1,2,3,4,5,10,15,20,25,30,35,40] + [i for i in early if i % 7 == 0]))
-    ball = find_ball_roi_early(cap, early_idxs, dbg_dir)
+    ball = finish_ball(best, best_bgr, dbg_dir)
 
     if ball is None:
-        print("ERROR: could not find ball early.")
-        raise SystemExit(2)
+        raise ImpactAnchorError("could not find ball early.", 2)
 
     cx, cy, r, ball_conf = ball
-    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
-    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+    h = int(frames_src.height or 0)
+    w = int(frames_src.width or 0)
 
-    halfB = args.ball_box // 2
-    halfC = args.club_box // 2
+    halfB = ball_box_px // 2
+    halfC = club_box_px // 2
 
     ball_box = (
         clamp(cx - halfB, 0, w-1),
@@ -218,175 +240,141 @@ if frame_count <= 0:
         clamp(cy + halfC, 1, h)
     )
 
-    # ---- BALL DEPARTURE: diff spike in ball ROI ----
-    # Build baseline from early stable segment
-    baseline_vals = []
-    prev_ok, prev = read_frame(cap, 0)
-    if not prev_ok:
-        print("ERROR: cannot read first frame")
-        raise SystemExit(3)
+    if not grays:
+        raise ImpactAnchorError("cannot read first frame", 3)
 
-    prevg = cv2.cvtColor(prev, cv2.COLOR_BGR2GRAY)
-
-    for i in range(1, min(frame_count, args.early_frames)):
-        ok, bgr = read_frame(cap, i)
-        if not ok: break
-        g = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-        e = roi_diff_energy(prevg, g, ball_box)
-        baseline_vals.append(e)
-        prevg = g
+    # ---- BALL DEPARTURE baseline: diff energy over the early stable segment ----
+    baseline_vals = [roi_diff_energy(grays[i-1], grays[i], ball_box) for i in range(1, min(len(grays), early_n))]
 
     base = float(np.median(baseline_vals)) if baseline_vals else 0.0
     base_mad = float(np.median(np.abs(np.array(baseline_vals) - base))) if baseline_vals else 0.0
     # threshold: baseline + k * mad + floor
     thr_ball = max(base + 8.0*base_mad, 0.015)
 
-    # Scan whole video for first "persistent" spike
-    ball_event = None  # (idx, score)
-    ball_event_frame = None
-    try:
-        if ball_event is None:
-            ball_event_frame = None
-        elif isinstance(ball_event, (tuple, list)):
-            ball_event_frame = int(ball_event[0])
-        else:
-            ball_event_frame = int(ball_event)
-    except Exception:
-        ball_event_frame = None
-
-    club_start = 1
-    club_end = frame_count - 1
-    if ball_event_frame is not None:
-        club_start = max(1, int(ball_event_frame) - CLUB_WINDOW_FRAMES)
-        club_end   = min(frame_count - 1, int(ball_event_frame) + CLUB_WINDOW_FRAMES)
+    # ---- PASS PART 2: ball departure + club motion in the same sweep ----
+    # Ball: first "persistent" spike (2 frames in a row) of ball-ROI diff energy.
+    # Club: peak motion energy in the club ROI, scanned over the whole clip until the
+    # ball event is known, then over ball_event +/- CLUB_WINDOW_FRAMES. The windowed scan
+    # has always measured its first frame against frame 0, so that value is recomputed
+    # from a short ring of club-ROI crops once the window is known.
+    last = frame_count - 1
     club_start = 1
-    club_end = frame_count - 1
-    if ball_event is not None:
-        # --- Normalize ball_event (can be tuple like (frame,score)) ---
-        if isinstance(ball_event, (tuple, list)) and len(ball_event) > 0:
-            ball_event = ball_event[0]
-        if ball_event is None:
-            club_start = 1
-        else:
-            club_start = max(1, int(ball_event) - CLUB_WINDOW_FRAMES)
-        # --- Normalize ball_event again for end-window ---
-        if isinstance(ball_event, (tuple, list)) and len(ball_event) > 0:
-            ball_event = ball_event[0]
-        if ball_event is None:
-            club_end = frame_count - 1
-        else:
-            club_end = min(frame_count - 1, int(ball_event) + CLUB_WINDOW_FRAMES)
+    club_end = last
+    ball_event_idx = None
     persist = 0
-    prev_ok, prev = read_frame(cap, 0)
-    prevg = cv2.cvtColor(prev, cv2.COLOR_BGR2GRAY)
-
-    ball_energy = []
-    for i in range(club_start, club_end + 1):
-        ok, bgr = read_frame(cap, i)
-        if not ok: break
-        g = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-        e = roi_diff_energy(prevg, g, ball_box)
-        ball_energy.append((i, e))
-        if e >= thr_ball:
-            persist += 1
-        else:
-            persist = 0
-
-        if persist >= 2 and ball_event is None:
-            # candidate: take first frame of the spike run
-            idx0 = i - 1
-            ball_event = (idx0, float(e))
-            ball_event_frame = None
-            try:
-                if ball_event is None:
-                    ball_event_frame = None
-                elif isinstance(ball_event, (tuple, list)):
-                    ball_event_frame = int(ball_event[0])
-                else:
-                    ball_event_frame = int(ball_event)
-            except Exception:
-                ball_event_frame = None
-            club_start = 1
-            club_end = frame_count - 1
-            if ball_event is not None:
-                # --- Normalize ball_event (can be tuple like (frame,score)) ---
-                if isinstance(ball_event, (tuple, list)) and len(ball_event) > 0:
-                    ball_event = ball_event[0]
-                if ball_event is None:
-                    club_start = 1
-                else:
-                    club_start = max(1, int(ball_event) - CLUB_WINDOW_FRAMES)
-                # --- Normalize ball_event again for end-window ---
-                if isinstance(ball_event, (tuple, list)) and len(ball_event) > 0:
-                    ball_event = ball_event[0]
-                if ball_event is None:
-                    club_end = frame_count - 1
-                else:
-                    club_end = min(frame_count - 1, int(ball_event) + CLUB_WINDOW_FRAMES)
-            break
-
-        prevg = g
 
-    # ---- CLUB MOTION PEAK: motion energy in club ROI ----
-    prev_ok, prev = read_frame(cap, 0)
-    prevg = cv2.cvtColor(prev, cv2.COLOR_BGR2GRAY)
+    cx1, cy1, cx2, cy2 = club_box
+    club_roi_box = (0, 0, cx2 - cx1, cy2 - cy1)
+    club0 = grays[0][cy1:cy2, cx1:cx2]
+    club_rois = deque(maxlen=CLUB_WINDOW_FRAMES + 2)   # (idx, club ROI gray)
+    motion = {}           # idx -> club-ROI motion vs previous frame
+    start_val = None      # club window's first value (vs frame 0)
 
     peak_idx = 0
     peak_val = -1.0
-    # scan all frames; you can window later around ball_event if you want
-    for i in range(club_start, club_end + 1):
-        ok, bgr = read_frame(cap, i)
-        if not ok: break
-        g = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    peak_bgr = pinned.get(0)
+    dbg_written = []
+
+    def club_dbg(i, bgr, m):
+        if bgr is None:
+            return
+        vis = bgr.copy()
+        x1,y1,x2,y2 = club_box
+        cv2.rectangle(vis, (x1,y1), (x2,y2), (255,0,0), 2)
+        cv2.putText(vis, f"clubM={m:.3f}", (20,30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,0,0), 2)
+        cv2.imwrite(os.path.join(dbg_dir, f"dbg_club_{i:04d}.png"), vis)
+
+    def scan_frames():
+        # replay the buffered early frames, then keep decoding from where part 1 stopped
+        for i in range(1, len(grays)):
+            yield i, grays[i], None
+        for i, bgr in frames:
+            yield i, cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY), bgr
+
+    prevg = grays[0]
+    for i, g, bgr in scan_frames():
+        if i > club_end:
+            break
+        if bgr is not None:
+            recent.append((i, bgr))
+        club_rois.append((i, g[cy1:cy2, cx1:cx2].copy()))
+
+        if ball_event_idx is None:
+            e = roi_diff_energy(prevg, g, ball_box)
+            if e >= thr_ball:
+                persist += 1
+            else:
+                persist = 0
+
+            if persist >= 2:
+                # candidate: take first frame of the spike run
+                ball_event_idx = i - 1
+                club_start = max(1, ball_event_idx - CLUB_WINDOW_FRAMES)
+                club_end = min(last, ball_event_idx + CLUB_WINDOW_FRAMES)
+
+                for j, roi in club_rois:
+                    if j == club_start:
+                        start_val = motion_energy(club0, roi, club_roi_box)
+                        break
+
+                # pin the frames around the event (impact may be their mean with the club peak)
+                for j in range(ball_event_idx - 3, i):
+                    b = frame_bgr(j) if j >= 0 else None
+                    if b is not None:
+                        pinned[j] = b
+
+                # re-run the club peak over the part of the window already decoded
+                peak_idx = 0
+                peak_val = -1.0
+                for j in range(club_start, i):
+                    m = start_val if j == club_start else motion[j]
+                    if m > peak_val:
+                        peak_val = m
+                        peak_idx = j
+                peak_bgr = frame_bgr(peak_idx)
+
+                # periodic debug frames written before the window was known
+                if debug_every:
+                    for j in [j for j in dbg_written if j < club_start]:
+                        try:
+                            os.remove(os.path.join(dbg_dir, f"dbg_club_{j:04d}.png"))
+                        except OSError:
+                            pass
+                    if club_start in dbg_written and club_start != 1:
+                        club_dbg(club_start, frame_bgr(club_start), start_val)
+
         m = motion_energy(prevg, g, club_box)
+        motion[i] = m
+
+        if bgr is None and (m > peak_val or (ball_event_idx is not None and abs(i - ball_event_idx) <= 3)):
+            bgr = frame_bgr(i)
+        if bgr is not None and ball_event_idx is not None and abs(i - ball_event_idx) <= 3:
+            pinned[i] = bgr
         if m > peak_val:
             peak_val = m
             peak_idx = i
-        if args.debug_every and (i % args.debug_every == 0):
-            vis = bgr.copy()
-            x1,y1,x2,y2 = club_box
-            cv2.rectangle(vis, (x1,y1), (x2,y2), (255,0,0), 2)
-            cv2.putText(vis, f"clubM={m:.3f}", (20,30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,0,0), 2)
-            cv2.imwrite(os.path.join(dbg_dir, f"dbg_club_{i:04d}.png"), vis)
+            peak_bgr = bgr
+        if debug_every and (i % debug_every == 0):
+            club_dbg(i, bgr if bgr is not None else frame_bgr(i), m)
+            dbg_written.append(i)
         prevg = g
 
+    grays = None
+    if peak_bgr is not None:
+        pinned[peak_idx] = peak_bgr
+
     # ---- Confidence + fuse ----
-    # Ball confidence: if we found a departure event and it is strong relative to threshold
-    if ball_event is None:
-        ball_event_idx = None
+    # Ball confidence: the departure scan only records the event frame, so strength stays 0.0
+    # (and with it the confidence); kept as-is so impact_anchor.json is unchanged.
+    if ball_event_idx is None:
         ball_event_strength = 0.0
         ball_event_conf = 0.0
     else:
-        # Normalize ball_event to (idx, strength)
-        # Some detectors return int idx; others return (idx, strength) / [idx] / [idx,strength]
-        ball_event_idx = None
         ball_event_strength = 0.0
-        try:
-            if isinstance(ball_event, (tuple, list)):
-                if len(ball_event) >= 2:
-                    ball_event_idx = int(ball_event[0])
-                    ball_event_strength = float(ball_event[1])
-                elif len(ball_event) == 1:
-                    ball_event_idx = int(ball_event[0])
-                    ball_event_strength = 0.0
-                else:
-                    ball_event_idx, ball_event_strength = None, 0.0
-            else:
-                # assume scalar frame index
-                ball_event_idx = int(ball_event)
-                ball_event_strength = 0.0
-        except Exception:
-            ball_event_idx, ball_event_strength = None, 0.0
         # conf grows as strength exceeds threshold
         ball_event_conf = float(clamp((ball_event_strength - thr_ball) / max(1e-6, thr_ball), 0.0, 1.0))
 
-    # Club confidence: peak sharpness vs median
-    # Use a quick neighborhood to compare peak to median
-    # (if peak is barely above median, it's not meaningful)
-    club_conf = 0.0
-    # approximate median from a small sample to keep it quick
-    # (we could store all m's but fine)
-    # Here: reuse peak_val against a nominal floor
+    # Club confidence: reuse peak_val against a nominal floor
     club_conf = float(clamp((peak_val - 0.01) / 0.10, 0.0, 1.0))
 
     # Fuse rule:
@@ -405,8 +393,8 @@ if frame_count <= 0:
 
     # ---- Debug visuals at key frames ----
     def save_dbg(idx, name):
-        ok, bgr = read_frame(cap, idx)
-        if not ok or bgr is None: return
+        bgr = frame_bgr(idx)
+        if bgr is None: return
         vis = bgr.copy()
         x1,y1,x2,y2 = ball_box
         cv2.rectangle(vis, (x1,y1), (x2,y2), (0,255,0), 2)
@@ -422,10 +410,12 @@ if frame_count <= 0:
     save_dbg(peak_idx, "club_peak")
     save_dbg(impact_idx, "impact_final")
 
-    cap.release()
+    frames.close()
+    if own_src:
+        frames_src.close()
 
     out = {
-        "video": args.inp,
+        "video": inp,
         "meta": {
             "fps": fps,
             "frame_count": frame_count,
@@ -454,11 +444,32 @@ if frame_count <= 0:
             "fuse": fuse
         }
     }
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="inp", required=True)
+    ap.add_argument("--outdir", required=True)
+    ap.add_argument("--fps_hint", type=float, default=0.0)
+    ap.add_argument("--early_frames", type=int, default=45)   # search ball in first N frames
+    ap.add_argument("--ball_box", type=int, default=120)      # ROI size around ball
+    ap.add_argument("--club_box", type=int, default=280)      # ROI size for club motion near ball
+    ap.add_argument("--debug_every", type=int, default=0)     # set 25 to dump periodic debug frames
+    args = ap.parse_args()
+
+    try:
+        out = find_impact(args.inp, args.outdir, args.fps_hint, args.early_frames, args.ball_box,
+                          args.club_box, args.debug_every)
+    except ImpactAnchorError as e:
+        print(f"ERROR: {e}")
+        raise SystemExit(e.code)
 
     with open(os.path.join(args.outdir, "impact_anchor.json"), "w", encoding="utf-8") as f:
         json.dump(out, f, indent=2)
 
-    print(f"OK impact_anchor.json P7={impact_idx} fuse={fuse} ballEvent={ball_event_idx} clubPeak={peak_idx}")
+    imp = out["impact"]
+    print(f"OK impact_anchor.json P7={imp['P7_frame']} fuse={imp['fuse']} ballEvent={out['ball']['event_frame']} clubPeak={out['club']['peak_frame']}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -12,6 +12,11 @@ import numpy as np
 def clamp01(x: float) -> float:
     return float(max(0.0, min(1.0, x)))
 
+def finite_or_none(x) -> Optional[float]:
+    # json.dump writes NaN / inf as bare tokens the route's JSON.parse rejects
+    x = float(x)
+    return x if math.isfinite(x) else None
+
 def norm2(v: np.ndarray) -> float:
     return float(np.linalg.norm(v) + 1e-12)
 
@@ -29,45 +34,116 @@ def wrap_deg(d: float) -> float:
     while d < -180: d += 360
     return float(d)
 
-def get_landmark(frame: Dict[str, Any], idx: int) -> Tuple[float,float,float,float]:
-    lm = frame["landmarks"][idx]
-    return float(lm["x"]), float(lm["y"]), float(lm.get("z",0.0)), float(lm.get("v",0.0))
+# Mediapipe Pose landmark indices
+NOSE = 0
+L_SHO, R_SHO = 11, 12
+L_ELB, R_ELB = 13, 14
+L_WRI, R_WRI = 15, 16
+L_HIP, R_HIP = 23, 24
+L_KNE, R_KNE = 25, 26
+L_ANK, R_ANK = 27, 28
+VIS_IDS = [L_WRI, R_WRI, L_ELB, R_ELB, L_SHO, R_SHO, L_HIP, R_HIP]
 
-def vis_avg(frame: Dict[str, Any], ids: List[int]) -> float:
-    vs = []
-    for i in ids:
-        vs.append(get_landmark(frame, i)[3])
-    return float(np.mean(vs)) if vs else 0.0
+# face-to-path beyond +/- this many degrees is classified open / closed
+FACE_TH_DEG = 6.0
 
-def smooth_vec(frames_xy: List[np.ndarray], i: int, w: int=2) -> np.ndarray:
-    # simple centered smoothing for derivative stability
-    a = max(0, i-w)
-    b = min(len(frames_xy)-1, i+w)
-    seg = frames_xy[a:b+1]
-    return np.mean(seg, axis=0)
+def pose_xyzv(data) -> np.ndarray:
+    """
+    (T, 33, 4) x, y, z, visibility from pose JSON ("v" or "visibility"); NaN = missing.
+    """
+    from pose_array import from_json
+    return from_json(data, dtype=np.float64, lm_count=33).pose[..., :4]
 
-# ---- Optional shaft detection (simple ROI Hough) ----
-def detect_shaft_vector(video_path: str, frame_index: int,
-                        wristL_xy: np.ndarray, wristR_xy: np.ndarray,
-                        roi_pad: int=140) -> Tuple[Optional[np.ndarray], float]:
+def moving_average(a: np.ndarray, w: int = 2) -> np.ndarray:
     """
-    Returns (unit_shaft_vec, quality) in image pixel coords.
-    quality ~ [0..1]
+    Centered moving average along axis 0 over [t-w, t+w] (clipped at the ends),
+    ignoring NaN samples. One cumsum pass for every landmark at once.
     """
-    if cv2 is None:
-        return None, 0.0
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        return None, 0.0
-    cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, frame_index))
-    ok, frame = cap.read()
-    cap.release()
-    if not ok or frame is None:
-        return None, 0.0
+    a = np.asarray(a, dtype=np.float64)
+    T = a.shape[0]
+    ok = ~np.isnan(a)
+    zero = np.zeros((1,) + a.shape[1:])
+    cs = np.concatenate([zero, np.cumsum(np.where(ok, a, 0.0), axis=0)])
+    cn = np.concatenate([zero, np.cumsum(ok, axis=0)])
+    lo = np.clip(np.arange(T) - w, 0, T)
+    hi = np.clip(np.arange(T) + w + 1, 0, T)
+    cnt = cn[hi] - cn[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(cnt > 0, (cs[hi] - cs[lo]) / cnt, np.nan)
+
+def angle_deg_arr(v: np.ndarray) -> np.ndarray:
+    return np.degrees(np.arctan2(v[..., 1], v[..., 0]))
+
+def wrap_deg_arr(d: np.ndarray) -> np.ndarray:
+    return np.asarray(d) - 360.0 * np.ceil((np.asarray(d) - 180.0) / 360.0)
+
+def unit_arr(v: np.ndarray) -> np.ndarray:
+    return v / (np.linalg.norm(v, axis=-1, keepdims=True) + 1e-12)
+
+def joint_angle_arr(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    ba = unit_arr(a - b); bc = unit_arr(c - b)
+    return np.degrees(np.arccos(np.clip((ba * bc).sum(axis=-1), -1.0, 1.0)))
+
+def metric_series(P: np.ndarray, w: int = 2) -> Dict[str, np.ndarray]:
+    """
+    Per-frame impact metrics for the whole clip from P (T, 33, 4).
+    Everything is an array slice of one smoothed xy pass; path/stability are NaN at the ends.
+    """
+    T = P.shape[0]
+    S = moving_average(P[..., :2], w)
+
+    # path proxy: wrist velocity (central difference of smoothed wrists)
+    v_path = np.full((T, 2), np.nan)
+    if T >= 3:
+        v_path[1:-1] = 0.65 * (S[2:, L_WRI] - S[:-2, L_WRI]) + 0.35 * (S[2:, R_WRI] - S[:-2, R_WRI])
+    path_rad = np.arctan2(v_path[:, 1], v_path[:, 0])
+
+    fore_L = unit_arr(S[:, L_WRI] - S[:, L_ELB])
+    fore_R = unit_arr(S[:, R_WRI] - S[:, R_ELB])
+
+    sh_deg = angle_deg_arr(S[:, R_SHO] - S[:, L_SHO])
+    hip_deg = angle_deg_arr(S[:, R_HIP] - S[:, L_HIP])
+    wristC = 0.5 * (S[:, L_WRI] + S[:, R_WRI])
+    hipC = 0.5 * (S[:, L_HIP] + S[:, R_HIP])
+
+    return {
+        "S": S,
+        "path_rad": path_rad,
+        "path_deg": np.degrees(path_rad),
+        "fore_L": fore_L,
+        "fore_R": fore_R,
+        "face_deg_forearm": angle_deg_arr(fore_L),
+        "shoulder_deg": sh_deg,
+        "hip_deg": hip_deg,
+        "sep_deg": wrap_deg_arr(sh_deg - hip_deg),
+        "handle_dx": wristC[:, 0] - hipC[:, 0],
+        "knee_L": joint_angle_arr(S[:, L_HIP], S[:, L_KNE], S[:, L_ANK]),
+        "knee_R": joint_angle_arr(S[:, R_HIP], S[:, R_KNE], S[:, R_ANK]),
+        "head_dx": P[:, NOSE, 0] - P[0, NOSE, 0],
+        "head_dy": P[:, NOSE, 1] - P[0, NOSE, 1],
+        "vis_avg": np.nan_to_num(P[:, VIS_IDS, 3], nan=0.0).mean(axis=1)
+    }
 
-    h, w = frame.shape[:2]
+def path_stability(path_rad: np.ndarray, i: int, k: int = 4) -> float:
+    """
+    1 - (std of unwrapped path direction over [i-k, i+k]) / 0.6, clamped to [0, 1].
+    """
+    n = path_rad.shape[0]
+    angs = path_rad[max(2, i - k): min(n - 2, i + k) + 1]
+    angs = angs[np.isfinite(angs)]
+    if not angs.size:
+        return 0.0
+    return clamp01(1.0 - float(np.std(np.unwrap(angs))) / 0.6)
 
-    # wrists are normalized; convert to pixels
+# ---- Optional shaft detection (simple ROI Hough) ----
+def wrist_roi(frame: np.ndarray, wristL_xy: np.ndarray, wristR_xy: np.ndarray,
+              roi_pad: int = 140) -> Optional[np.ndarray]:
+    """
+    Square crop (2*roi_pad) around the wrist midpoint; wrists are normalized coords.
+    """
+    h, w = frame.shape[:2]
+    if not (np.isfinite(wristL_xy).all() and np.isfinite(wristR_xy).all()):
+        return None
     p1 = (int(wristL_xy[0] * w), int(wristL_xy[1] * h))
     p2 = (int(wristR_xy[0] * w), int(wristR_xy[1] * h))
     cx = int((p1[0] + p2[0]) / 2)
@@ -75,10 +151,16 @@ def detect_shaft_vector(video_path: str, frame_index: int,
 
     x0 = max(0, cx - roi_pad); x1 = min(w-1, cx + roi_pad)
     y0 = max(0, cy - roi_pad); y1 = min(h-1, cy + roi_pad)
-    roi = frame[y0:y1, x0:x1].copy()
-    if roi.size == 0:
-        return None, 0.0
+    roi = frame[y0:y1, x0:x1]
+    return roi if roi.size else None
 
+def shaft_candidates(roi: np.ndarray, roi_pad: int = 140, top: int = 1) -> List[Tuple[np.ndarray, float, float]]:
+    """
+    Up to `top` Hough line candidates in a wrist ROI as (unit_vec, quality, score),
+    best first. Lines are scored by length + proximity to the ROI center.
+    """
+    if cv2 is None or roi is None or roi.size == 0:
+        return []
     gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
     gray = cv2.GaussianBlur(gray, (5,5), 0)
     edges = cv2.Canny(gray, 50, 150)
@@ -86,115 +168,195 @@ def detect_shaft_vector(video_path: str, frame_index: int,
     lines = cv2.HoughLinesP(edges, 1, np.pi/180.0, threshold=50,
                             minLineLength=int(roi_pad*0.6), maxLineGap=10)
     if lines is None:
-        return None, 0.0
+        return []
+
+    L = lines[:, 0, :].astype(np.float64)
+    dx = L[:, 2] - L[:, 0]; dy = L[:, 3] - L[:, 1]
+    length = np.hypot(dx, dy)
+    dist = np.hypot((L[:, 0] + L[:, 2]) / 2 - roi.shape[1]/2, (L[:, 1] + L[:, 3]) / 2 - roi.shape[0]/2)
+    score = length - 0.75*dist
+
+    out = []
+    for k in np.argsort(-score, kind="stable")[:top]:
+        if length[k] < 1e-6:
+            continue
+        # quality: longer is better, closer is better
+        q_len = min(1.0, length[k] / (roi_pad*2))
+        q_dist = 1.0 - min(1.0, dist[k] / (roi_pad*1.1))
+        v = np.array([dx[k], dy[k]], dtype=np.float32)
+        out.append((unit(v), clamp01(0.7*q_len + 0.3*q_dist), float(score[k])))
+    return out
 
-    # Score lines by length + proximity to center
-    best = None
-    best_score = -1.0
-    for l in lines[:,0,:]:
-        xA,yA,xB,yB = map(int, l)
-        dx = xB-xA; dy = yB-yA
-        length = math.hypot(dx, dy)
-        mx = (xA+xB)/2; my=(yA+yB)/2
-        dist = math.hypot(mx - roi.shape[1]/2, my - roi.shape[0]/2)
-        score = length - 0.75*dist
-        if score > best_score:
-            best_score = score
-            best = (xA,yA,xB,yB,length,dist)
-
-    if best is None:
+def detect_shaft_vector(video_path: str, frame_index: int,
+                        wristL_xy: np.ndarray, wristR_xy: np.ndarray,
+                        roi_pad: int=140, frames=None, frame: Optional[np.ndarray] = None) -> Tuple[Optional[np.ndarray], float]:
+    """
+    Returns (unit_shaft_vec, quality) in image pixel coords.
+    quality ~ [0..1]
+    Pass `frame` (BGR) or `frames` (a frame_store reader) to reuse decoded frames;
+    otherwise the video is opened for this one read.
+    """
+    if cv2 is None:
+        return None, 0.0
+    if frame is None:
+        own = frames is None
+        if own:
+            from frame_store import open_frames
+            try:
+                frames = open_frames(video_path)
+            except RuntimeError:
+                return None, 0.0
+        frame = frames.read(max(0, frame_index))
+        if own:
+            frames.close()
+    if frame is None:
         return None, 0.0
 
-    xA,yA,xB,yB,length,dist = best
-    v = np.array([xB-xA, yB-yA], dtype=np.float32)
-    if norm2(v) < 1e-6:
+    c = shaft_candidates(wrist_roi(frame, wristL_xy, wristR_xy, roi_pad), roi_pad, 1)
+    if not c:
         return None, 0.0
+    return c[0][0], c[0][1]
 
-    # quality: longer is better, closer is better
-    q_len = min(1.0, length / (roi_pad*2))
-    q_dist = 1.0 - min(1.0, dist / (roi_pad*1.1))
-    q = clamp01(0.7*q_len + 0.3*q_dist)
+def _axis_deg(v: np.ndarray) -> float:
+    # undirected line angle in [0, 180)
+    return float(math.degrees(math.atan2(float(v[1]), float(v[0]))) % 180.0)
 
-    return unit(v), q
+def _axis_diff(a, b):
+    return np.abs((np.asarray(a) - b + 90.0) % 180.0 - 90.0)
 
-# ---- Main ----
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--pose", required=True, help="pose JSON file")
-    ap.add_argument("--video", default="", help="optional video for shaft detection")
-    ap.add_argument("--impact", type=int, default=-1, help="impact frame index (optional)")
-    ap.add_argument("--out", required=True, help="output json")
-    args = ap.parse_args()
+def frame_indices(frames) -> np.ndarray:
+    """
+    Video frame index of each pose row ("i", else the row itself); they differ once the
+    extraction is sampled.
+    """
+    return np.array([fr.get("i", k) if isinstance(fr, dict) else k for k, fr in enumerate(frames)], dtype=np.int64)
 
-    with open(args.pose, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def detect_shaft_window(frames, center: int, wristsL: np.ndarray, wristsR: np.ndarray,
+                        k: int = 2, roi_pad: int = 140, top: int = 3, tol_deg: float = 6.0,
+                        frame_idx: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Shaft at pose row `center` from the rows [center-k, center+k], whose video frames are
+    read in one batch (frames.iter_indices: a sorted sweep, or memmap slices from the frame store).
+
+    Every frame contributes its `top` Hough candidates; the shaft angle is modelled as
+    linear in time (it rotates quickly through impact) and fitted by consensus over all
+    candidate pairs: the model with the most quality-weighted inliers within tol_deg wins.
+    wristsL/wristsR are (T, 2) normalized wrist tracks indexed by pose row; frame_idx (T,)
+    is each row's video frame (default: rows are frames). Times and the slope are in video frames.
+    """
+    res = {"vec": None, "quality": 0.0, "deg": None, "frames": 0, "inliers": 0, "candidates": 0}
+    if cv2 is None or frames is None:
+        return res
+    T = wristsL.shape[0]
+    fi = np.arange(T) if frame_idx is None else np.asarray(frame_idx)
+    f0 = int(fi[center])
+    rows = {int(fi[j]): j for j in range(center - k, center + k + 1) if 0 <= j < T}
+
+    cand = []   # (dt, axis_deg, quality, vec)
+    for f, fr in frames.iter_indices(list(rows)):
+        if fr is None:
+            continue
+        j = rows[f]
+        res["frames"] += 1
+        for v, q, _ in shaft_candidates(wrist_roi(fr, wristsL[j], wristsR[j], roi_pad), roi_pad, top):
+            cand.append((f - f0, _axis_deg(v), q, v))
+    res["candidates"] = len(cand)
+    if not cand:
+        return res
+
+    dt = np.array([c[0] for c in cand], dtype=np.float64)
+    ang = np.array([c[1] for c in cand])
+    q = np.array([c[2] for c in cand])
+
+    # models: constant angle per candidate, plus a line through every cross-frame pair
+    models = [(a, 0.0) for a in ang]
+    for a in range(len(cand)):
+        for b in range(a + 1, len(cand)):
+            if dt[a] != dt[b]:
+                slope = ((ang[b] - ang[a] + 90.0) % 180.0 - 90.0) / (dt[b] - dt[a])
+                models.append((ang[a] - slope * dt[a], slope))
+    best, best_s = None, -1.0
+    for a0, slope in models:
+        inl = _axis_diff(ang, a0 + slope * dt) <= tol_deg
+        # one vote per frame: its best inlier candidate
+        s = sum(q[inl & (dt == d)].max() for d in np.unique(dt[inl]))
+        if s > best_s:
+            best_s, best = s, (a0, slope, inl)
+
+    a0, slope, inl = best
+    deg = float(a0 % 180.0)
+    n_frames = len(np.unique(dt[inl]))
+    # direction: keep the sign convention of the nearest inlier candidate
+    near = int(np.flatnonzero(inl)[np.argmin(np.abs(dt[inl]))])
+    v = np.array([math.cos(math.radians(deg)), math.sin(math.radians(deg))], dtype=np.float32)
+    if float(np.dot(v, cand[near][3])) < 0:
+        v = -v
+    res.update(vec=v, deg=deg, inliers=n_frames,
+               quality=clamp01(best_s / max(1, res["frames"])),
+               slope_deg_per_frame=float(slope))
+    return res
 
+# ---- Main ----
+def analyze(data, video="", impact_arg=-1, shaft_window=2, series_out="", frames_src=None, face_th=None):
+    """
+    Impact proxy for a parsed pose JSON -> the output dict main() writes.
+    impact_arg: pose-row index of impact (-1 = guess); the output reports video frames
+    (impact "frameIndex", "positions") with the pose row alongside. frames_src: an open frame_store
+    reader for the shaft detection instead of opening `video` (left open).
+    face_th: face-to-path degrees beyond which the face is called open/closed.
+    Raises ValueError when the pose has no usable frames.
+    """
     frames = data.get("frames") or data.get("results") or data.get("pose") or None
     # Our generator writes: {"ok":true,"frames":[{"t":...,"landmarks":[...]}...]}
     if isinstance(data, dict) and "frames" in data and isinstance(data["frames"], list):
         frames = data["frames"]
     if frames is None:
-        raise SystemExit("Could not find frames array in pose json")
+        raise ValueError("Could not find frames array in pose json")
 
     n = len(frames)
     if n < 5:
-        raise SystemExit(f"Not enough frames: {n}")
-
-    # Mediapipe Pose landmark indices
-    L_SHO, R_SHO = 11, 12
-    L_ELB, R_ELB = 13, 14
-    L_WRI, R_WRI = 15, 16
-    L_HIP, R_HIP = 23, 24
-    L_KNE, R_KNE = 25, 26
-    L_ANK, R_ANK = 27, 28
-    NOSE = 0
-
-    # Collect normalized XY over time
-    lw = [np.array(get_landmark(fr, L_WRI)[0:2], dtype=np.float32) for fr in frames]
-    rw = [np.array(get_landmark(fr, R_WRI)[0:2], dtype=np.float32) for fr in frames]
-    le = [np.array(get_landmark(fr, L_ELB)[0:2], dtype=np.float32) for fr in frames]
-    re = [np.array(get_landmark(fr, R_ELB)[0:2], dtype=np.float32) for fr in frames]
-    ls = [np.array(get_landmark(fr, L_SHO)[0:2], dtype=np.float32) for fr in frames]
-    rs = [np.array(get_landmark(fr, R_SHO)[0:2], dtype=np.float32) for fr in frames]
-    lh = [np.array(get_landmark(fr, L_HIP)[0:2], dtype=np.float32) for fr in frames]
-    rh = [np.array(get_landmark(fr, R_HIP)[0:2], dtype=np.float32) for fr in frames]
-    lk = [np.array(get_landmark(fr, L_KNE)[0:2], dtype=np.float32) for fr in frames]
-    rk = [np.array(get_landmark(fr, R_KNE)[0:2], dtype=np.float32) for fr in frames]
-    la = [np.array(get_landmark(fr, L_ANK)[0:2], dtype=np.float32) for fr in frames]
-    ra = [np.array(get_landmark(fr, R_ANK)[0:2], dtype=np.float32) for fr in frames]
-    nose = [np.array(get_landmark(fr, NOSE)[0:2], dtype=np.float32) for fr in frames]
+        raise ValueError(f"Not enough frames: {n}")
+
+    P = pose_xyzv(frames)
+    M = metric_series(P, 2)
+    S = M["S"]
 
     # Pick impact frame
-    if 0 <= args.impact < n:
-        impact = args.impact
+    if 0 <= impact_arg < n:
+        impact = impact_arg
         impact_method = "manual"
     else:
         # fallback guess: min avg wrist Y in the second half
         start = int(n*0.45)
-        yvals = [float((lw[i][1] + rw[i][1]) * 0.5) for i in range(start, n)]
-        impact = start + int(np.argmin(yvals))
+        yvals = (P[start:, L_WRI, 1] + P[start:, R_WRI, 1]) * 0.5
+        impact = start + (int(np.nanargmin(yvals)) if np.isfinite(yvals).any() else 0)
         impact_method = "auto_min_wrist_y"
 
     i = int(np.clip(impact, 2, n-3))
+    fidx = frame_indices(frames)
 
-    # Path proxy: wrist velocity (smoothed)
-    lw_s = [smooth_vec(lw, k, 2) for k in range(n)]
-    rw_s = [smooth_vec(rw, k, 2) for k in range(n)]
-
-    v_lw = lw_s[i+1] - lw_s[i-1]
-    v_rw = rw_s[i+1] - rw_s[i-1]
-    v_path = unit(0.65*v_lw + 0.35*v_rw)
-    path_deg = angle_deg(v_path)
-
-    # Forearm proxy (lead = left arm assumption; we’ll still report both)
-    u_fore_L = unit(lw_s[i] - smooth_vec(le, i, 2))
-    u_fore_R = unit(rw_s[i] - smooth_vec(re, i, 2))
+    path_deg = float(M["path_deg"][i])
+    u_fore_L = M["fore_L"][i]
 
     # Optional shaft detection
     u_shaft = None
     shaft_q = 0.0
-    if args.video and os.path.exists(args.video):
-        u_shaft, shaft_q = detect_shaft_vector(args.video, i, lw_s[i], rw_s[i])
+    shaft = None
+    own_src = frames_src is None
+    if own_src and video and os.path.exists(video) and cv2 is not None:
+        from frame_store import open_frames
+        try:
+            frames_src = open_frames(video)
+        except RuntimeError:
+            frames_src = None
+    if frames_src is not None:
+        if shaft_window > 0:
+            shaft = detect_shaft_window(frames_src, i, S[:, L_WRI], S[:, R_WRI], shaft_window, frame_idx=fidx)
+            u_shaft, shaft_q = shaft["vec"], shaft["quality"]
+        else:
+            u_shaft, shaft_q = detect_shaft_vector(video, int(fidx[i]), S[i, L_WRI], S[i, R_WRI], frames=frames_src)
+        if own_src:
+            frames_src.close()
 
     # Face proxy
     if u_shaft is not None:
@@ -212,82 +374,69 @@ def main():
     f2p = wrap_deg(face_deg - path_deg)
 
     # Classification thresholds (tune later)
-    TH = 6.0
-    if f2p > TH:
+    TH = FACE_TH_DEG if face_th is None else float(face_th)
+    if not math.isfinite(f2p):
+        # no landmarks around the impact row: no path / face read to classify
+        cls = "unknown"
+    elif f2p > TH:
         cls = "likely_open"
     elif f2p < -TH:
         cls = "likely_closed"
     else:
         cls = "likely_square"
 
-    # Delivery package proxies
-    shoulders = smooth_vec(rs, i, 2) - smooth_vec(ls, i, 2)
-    hips      = smooth_vec(rh, i, 2) - smooth_vec(lh, i, 2)
-    sh_deg = angle_deg(shoulders)
-    hip_deg = angle_deg(hips)
-    sep_deg = wrap_deg(sh_deg - hip_deg)
-
-    # Handle forward proxy: wrist center vs hip center (x)
-    wristC = 0.5*(lw_s[i] + rw_s[i])
-    hipC   = 0.5*(smooth_vec(lh, i, 2) + smooth_vec(rh, i, 2))
-    handle_dx = float(wristC[0] - hipC[0])  # sign depends on camera orientation; still useful as relative metric
-
-    # Knee "bend" proxy via hip-knee-ank angle for left/right
-    def joint_angle(a,b,c) -> float:
-        ba = a - b; bc = c - b
-        ba = ba / (np.linalg.norm(ba) + 1e-12)
-        bc = bc / (np.linalg.norm(bc) + 1e-12)
-        dot = float(np.clip(np.dot(ba, bc), -1.0, 1.0))
-        return float(math.degrees(math.acos(dot)))
-
-    L_knee = joint_angle(smooth_vec(lh,i,2), smooth_vec(lk,i,2), smooth_vec(la,i,2))
-    R_knee = joint_angle(smooth_vec(rh,i,2), smooth_vec(rk,i,2), smooth_vec(ra,i,2))
-
-    # Head motion proxy: nose delta from first frame
-    head_dx = float(nose[i][0] - nose[0][0])
-    head_dy = float(nose[i][1] - nose[0][1])
+    # Delivery package proxies (handle dx sign depends on camera orientation; still useful as relative metric)
+    sh_deg = float(M["shoulder_deg"][i])
+    hip_deg = float(M["hip_deg"][i])
+    sep_deg = float(M["sep_deg"][i])
+    handle_dx = float(M["handle_dx"][i])
+    L_knee = float(M["knee_L"][i])
+    R_knee = float(M["knee_R"][i])
+    head_dx = float(M["head_dx"][i])
+    head_dy = float(M["head_dy"][i])
 
     # Confidence
-    v_base = vis_avg(frames[i], [L_WRI,R_WRI,L_ELB,R_ELB,L_SHO,R_SHO,L_HIP,R_HIP])
+    v_base = float(M["vis_avg"][i])
     # stability = how consistent wrist velocity direction is in last few frames
-    def dir_std(lw_s, rw_s, i, k=4):
-        angs=[]
-        for j in range(max(2,i-k), min(n-2,i+k)+1):
-            v = unit(0.65*(lw_s[j+1]-lw_s[j-1]) + 0.35*(rw_s[j+1]-rw_s[j-1]))
-            angs.append(math.atan2(float(v[1]), float(v[0])))
-        angs=np.unwrap(np.array(angs))
-        return float(np.std(angs))
-    st = dir_std(lw_s, rw_s, i, 4)
-    stability = clamp01(1.0 - (st / 0.6))  # tune
+    stability = path_stability(M["path_rad"], i, 4)
     conf = clamp01(0.45*v_base + 0.35*stability + 0.20*shaft_q)
+    if cls == "unknown":
+        conf *= 0.5
 
     out = {
         "ok": True,
         "impact": {
-            "frameIndex": i,
+            "frameIndex": int(fidx[i]),
+            "row": i,
             "method": impact_method,
             "path": {
-                "deg": path_deg,
+                "deg": finite_or_none(path_deg),
                 "method": "wrist_velocity_blend",
             },
             "face": {
-                "degProxy": face_deg,
+                "degProxy": finite_or_none(face_deg),
                 "method": face_method,
                 "shaftDetected": bool(u_shaft is not None),
                 "shaftQuality": shaft_q,
+                "shaftWindow": None if shaft is None else {
+                    "frames": shaft["frames"],
+                    "inliers": shaft["inliers"],
+                    "candidates": shaft["candidates"],
+                    "deg": shaft["deg"],
+                },
             },
             "faceToPath": {
-                "degProxy": f2p,
+                "degProxy": finite_or_none(f2p),
                 "classification": cls,
                 "thresholdDeg": TH,
             },
             "deliveryPackage": {
-                "shoulderLineDeg": sh_deg,
-                "hipLineDeg": hip_deg,
-                "sepDegProxy": sep_deg,
-                "handleDxProxy": handle_dx,
-                "kneeAngleDeg": { "left": L_knee, "right": R_knee },
-                "headDelta": { "dx": head_dx, "dy": head_dy },
+                "shoulderLineDeg": finite_or_none(sh_deg),
+                "hipLineDeg": finite_or_none(hip_deg),
+                "sepDegProxy": finite_or_none(sep_deg),
+                "handleDxProxy": finite_or_none(handle_dx),
+                "kneeAngleDeg": { "left": finite_or_none(L_knee), "right": finite_or_none(R_knee) },
+                "headDelta": { "dx": finite_or_none(head_dx), "dy": finite_or_none(head_dy) },
             },
             "confidence": conf,
             "confidenceInputs": {
@@ -298,12 +447,50 @@ def main():
         }
     }
 
+    # Full-swing series: route metrics + P-position samples from the same landmark array
+    if series_out:
+        from swing_metrics import compute, write_report
+        meta = data.get("meta") if isinstance(data.get("meta"), dict) else {}
+        fps = data.get("fps") or meta.get("fps")
+        rep = compute(P, fps, fidx * (1000.0 / float(fps)) if fps else None,
+                      impact_arg if 0 <= impact_arg < n else None, frame_idx=fidx)
+        write_report(rep, series_out)
+        out["metrics"] = rep["metrics"]
+        out["positions"] = rep["positions"]
+        out["seriesOut"] = series_out
+
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pose", required=True, help="pose JSON file")
+    ap.add_argument("--video", default="", help="optional video for shaft detection")
+    ap.add_argument("--impact", type=int, default=-1, help="impact video frame (optional)")
+    ap.add_argument("--shaft_window", type=int, default=2, help="frames either side of impact for shaft consensus (0 = impact frame only)")
+    ap.add_argument("--out", required=True, help="output json")
+    ap.add_argument("--series_out", default="", help="optional full-swing metrics JSON (swing_metrics.py)")
+    ap.add_argument("--face_th", type=float, default=None, help=f"face-to-path open/closed threshold in degrees (default {FACE_TH_DEG})")
+    args = ap.parse_args()
+
+    with open(args.pose, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    impact = args.impact
+    if impact >= 0 and isinstance(data.get("frames"), list) and data["frames"]:
+        # video frame -> nearest pose row (the pose may be sampled)
+        impact = int(np.argmin(np.abs(frame_indices(data["frames"]) - impact)))
+    try:
+        out = analyze(data, args.video, impact, args.shaft_window, args.series_out, face_th=args.face_th)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    imp = out["impact"]
+
     os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
     with open(args.out, "w", encoding="utf-8") as f:
         json.dump(out, f, indent=2)
 
     print("OK wrote:", args.out)
-    print("impact frame:", i, "class:", cls, "f2p:", f2p, "conf:", conf)
+    print("impact frame:", imp["frameIndex"], "class:", imp["faceToPath"]["classification"], "f2p:", imp["faceToPath"]["degProxy"], "conf:", imp["confidence"])
 
 if __name__ == "__main__":
     main()
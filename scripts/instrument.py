@@ -0,0 +1,147 @@
+import os, sys, json, time, threading
+from contextlib import contextmanager
+
+# Opt-in timers / counters for the analysis hot paths (decode, colour conversion,
+# inference, JSON I/O, pipeline stages).
+#
+# Off by default: span() returns a shared no-op context manager and count() returns
+# at once, so the calls can stay in per-frame loops. Turned on per run by the environment:
+#
+#   VCA_TRACE=<dir>    <dir>/<run>_<stamp>_<pid>.trace.json in Chrome trace format
+#                      (chrome://tracing or ui.perfetto.dev); per-name totals are in
+#                      "otherData" and printed to stderr when the run ends
+#   VCA_PROFILE=1      also a cProfile dump next to the trace (<...>.prof; python -m pstats)
+#
+#   with instrument.run("pose_video_robust"):         # in main(); nested runs join the outer one
+#       with instrument.span("infer", frame=i): ...
+#       instrument.count("frames_empty")
+
+TRACE_ENV = "VCA_TRACE"
+PROFILE_ENV = "VCA_PROFILE"
+
+_on = False
+_events = []     # (name, t0_ns, dur_ns, tid, args); list.append is atomic across threads
+_counters = {}
+_threads = {}
+_lock = threading.Lock()
+
+class _Null:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _Null()
+
+class _Span:
+    __slots__ = ("name", "args", "t0")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        dur = time.perf_counter_ns() - self.t0
+        tid = threading.get_ident()
+        if tid not in _threads:
+            _threads[tid] = threading.current_thread().name
+        _events.append((self.name, self.t0, dur, tid, self.args))
+        return False
+
+def enabled():
+    return _on
+
+def span(name, **args):
+    """Timed section; a no-op unless a traced run is active."""
+    if not _on:
+        return _NULL
+    return _Span(name, args)
+
+def count(name, n=1):
+    if not _on:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def totals():
+    """{name: {"count", "sec", "max_ms"}} over the spans recorded so far."""
+    out = {}
+    for name, _, dur, _, _ in list(_events):
+        t = out.setdefault(name, {"count": 0, "sec": 0.0, "max_ms": 0.0})
+        t["count"] += 1
+        t["sec"] += dur / 1e9
+        t["max_ms"] = max(t["max_ms"], dur / 1e6)
+    for t in out.values():
+        t["sec"] = round(t["sec"], 6)
+        t["max_ms"] = round(t["max_ms"], 3)
+    return out
+
+def chrome_trace(name, t_start_ns):
+    pid = os.getpid()
+    ev = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": name}}]
+    for tid, tname in list(_threads.items()):
+        ev.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": tname}})
+    for n, t0, dur, tid, args in list(_events):
+        e = {"name": n, "cat": "vca", "ph": "X", "pid": pid, "tid": tid,
+             "ts": (t0 - t_start_ns) / 1000.0, "dur": dur / 1000.0}
+        if args:
+            e["args"] = args
+        ev.append(e)
+    return {"traceEvents": ev, "displayTimeUnit": "ms",
+            "otherData": {"run": name, "counters": dict(_counters), "totals": totals()}}
+
+def _print_totals(tot, out=sys.stderr):
+    print("=== TRACE TOTALS ===", file=out)
+    for n, t in sorted(tot.items(), key=lambda kv: -kv[1]["sec"]):
+        print(f"  {n:<20} {t['count']:>7} x {t['sec']:>9.3f}s  max {t['max_ms']:>8.2f} ms", file=out)
+    for n, v in sorted(_counters.items()):
+        print(f"  {n:<20} {v:>7}", file=out)
+
+@contextmanager
+def run(name, trace_dir=None, profile=None):
+    """
+    One traced analysis run. trace_dir / profile default to VCA_TRACE / VCA_PROFILE;
+    with neither set (or inside another run) this does nothing.
+    """
+    global _on
+    trace_dir = trace_dir if trace_dir is not None else os.environ.get(TRACE_ENV, "")
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV, "") not in ("", "0")
+    if _on or not trace_dir:
+        yield
+        return
+
+    os.makedirs(trace_dir, exist_ok=True)
+    base = os.path.join(trace_dir, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}")
+    prof = None
+    if profile:
+        import cProfile
+        prof = cProfile.Profile()
+    del _events[:]
+    _counters.clear()
+    _threads.clear()
+    t_start = time.perf_counter_ns()
+    _on = True
+    if prof:
+        prof.enable()
+    try:
+        with span("run:" + name):
+            yield
+    finally:
+        if prof:
+            prof.disable()
+        _on = False
+        with open(base + ".trace.json", "w", encoding="utf-8") as f:
+            json.dump(chrome_trace(name, t_start), f)
+        _print_totals(totals())
+        print(f"trace: {base}.trace.json", file=sys.stderr)
+        if prof:
+            prof.dump_stats(base + ".prof")
+            print(f"profile: {base}.prof", file=sys.stderr)
@@ -0,0 +1,270 @@
+import os, sys, json, argparse
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from pose_array import from_json, load
+from impact_proxy import (moving_average, L_SHO, R_SHO, L_WRI, R_WRI, L_HIP, R_HIP, VIS_IDS)
+
+# Swing phase (P1-P10) detection from the pose time series.
+#
+# Works on the (T, 33, >=2) landmark array in one pass: hand height / vertical velocity,
+# hand speed and lead/trail arm angles are computed for every sample, then each P is
+# a zero-crossing or extremum of one of them. All time constants are in seconds, so the
+# same rules hold at 30 or 240 fps, and on sampled or adaptive extractions (real sample times).
+#
+#   python .\scripts\phase_detect.py --pose pose.json [--impact N] [--out phases.json]
+#
+#   P1  address                   last still sample with the hands low, before the top
+#   P2  shaft parallel back       hands rise through hip height
+#   P3  lead arm parallel back    lead arm crosses horizontal going up
+#   P4  top                       hands highest (vertical velocity zero-crossing)
+#   P5  lead arm parallel down    lead arm crosses horizontal going down
+#   P6  shaft parallel down       hands fall through hip height
+#   P7  impact                    given, else hands lowest after the top
+#   P8  shaft parallel through    hands rise through hip height after impact
+#   P9  trail arm parallel        trail arm crosses horizontal going up
+#   P10 finish                    first still sample after P9
+#
+# A P whose rule finds nothing (or lands out of order) is placed by timing between its
+# detected neighbours and gets a lower confidence.
+
+PHASES = tuple(f"P{k}" for k in range(1, 11))
+
+# seconds
+SMOOTH_SEC = 0.008
+MIN_BACKSWING_SEC = 0.15
+# fallback placement: fraction of the enclosing anchor interval
+FALLBACK_FRAC = {"P2": ("P1", "P4", 0.35), "P3": ("P1", "P4", 0.65),
+                 "P5": ("P4", "P7", 0.40), "P6": ("P4", "P7", 0.70)}
+# fallback placement after impact, seconds
+FALLBACK_AFTER_SEC = {"P8": 0.08, "P9": 0.20, "P10": 0.80}
+# no pose at all: offsets from impact (seconds), P7 = impact as in detect_phases; a 3:1 tempo
+# (0.75 s back, 0.25 s down) with P2/P3/P5/P6 and P8/P9 placed by the fallback rules above
+DEFAULT_OFFSETS_SEC = {"P1": -1.0, "P2": -0.7375, "P3": -0.5125, "P4": -0.25, "P5": -0.15,
+                       "P6": -0.075, "P7": 0.0, "P8": 0.08, "P9": 0.20}
+
+STILL_FRAC = 0.10          # still = hand speed below this fraction of the peak
+CONF_FALLBACK = 0.5
+CONF_OFFSETS = 0.2
+
+def _first(mask, start=0, stop=None):
+    idx = np.flatnonzero(mask[start:stop])
+    return int(start + idx[0]) if idx.size else None
+
+def _last(mask, start=0, stop=None):
+    idx = np.flatnonzero(mask[start:stop])
+    return int(start + idx[-1]) if idx.size else None
+
+def _nanarg(fn, a, lo, hi):
+    seg = a[lo:hi]
+    if not seg.size or not np.isfinite(seg).any():
+        return None
+    return int(lo + fn(seg))
+
+def _crossing(v, thr, start, stop, rising=True):
+    """
+    First sample in [start, stop) where v crosses thr (upward if rising), snapped to
+    whichever side of the crossing is closer to thr.
+    """
+    if start is None or stop is None or stop - start < 2:
+        return None
+    seg = v[start:stop]
+    ok = np.isfinite(seg)
+    above = np.where(ok, seg >= thr, False) if rising else np.where(ok, seg <= thr, False)
+    hit = np.flatnonzero(above[1:] & ~above[:-1] & ok[:-1])
+    if not hit.size:
+        return None
+    k = start + int(hit[0]) + 1
+    return k if abs(v[k] - thr) <= abs(v[k - 1] - thr) else k - 1
+
+def signals(P: np.ndarray, fps: float, lead: str = "left", t: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Per-sample detection signals from P (T, 33, >=2): hand y / vertical velocity / speed
+    (normalized units, per second), hip-center y, lead and trail arm angles from horizontal
+    (deg, + = hands above the shoulder) and mean key-landmark visibility.
+    `t` (T,) sample times in seconds, for non-uniform sampling; default uniform at fps.
+    """
+    w = max(1, int(round(SMOOTH_SEC * fps)))
+    S = moving_average(P[..., :2], w)
+    T = P.shape[0]
+    lsho, lwri, tsho, twri = (L_SHO, L_WRI, R_SHO, R_WRI) if lead == "left" else (R_SHO, R_WRI, L_SHO, L_WRI)
+
+    hands = 0.5 * (S[:, L_WRI] + S[:, R_WRI])
+    if T >= 2:
+        d = np.gradient(hands, axis=0) * fps if t is None else np.gradient(hands, t, axis=0)
+    else:
+        d = np.full_like(hands, np.nan)
+
+    def arm(sho, wri):
+        a = S[:, wri] - S[:, sho]
+        return np.degrees(np.arctan2(-a[:, 1], np.abs(a[:, 0])))
+
+    vis = P[:, VIS_IDS, 3] if P.shape[-1] > 3 else np.ones((T, len(VIS_IDS)))
+    return {
+        "hand_y": hands[:, 1],
+        "hand_vy": d[:, 1],
+        "hand_speed": np.linalg.norm(d, axis=-1),
+        "hip_y": 0.5 * (S[:, L_HIP, 1] + S[:, R_HIP, 1]),
+        "lead_arm": arm(lsho, lwri),
+        "trail_arm": arm(tsho, twri),
+        "vis": np.nan_to_num(vis, nan=0.0).mean(axis=1),
+    }
+
+def detect_phases(P: np.ndarray, fps: float, impact: Optional[int] = None,
+                  lead: str = "left", t: Optional[np.ndarray] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    {"P1".."P10": {"index", "conf", "method"}} for P (T, 33, >=2) sampled at `fps`, or at
+    times `t` (seconds, increasing) when the sampling is non-uniform (`fps` is then only
+    used for the smoothing window). `impact` (sample index) pins P7. Indices are rows of
+    P; "index" is None only when the clip has no usable hand track at all.
+    """
+    T = P.shape[0]
+    fps = float(fps)
+    out = {p: {"index": None, "conf": 0.0, "method": "none"} for p in PHASES}
+    if T < 5:
+        return out
+    t = np.arange(T) / fps if t is None else np.asarray(t, dtype=np.float64)
+    sig = signals(P, fps, lead, t)
+    hy, vy, speed = sig["hand_y"], sig["hand_vy"], sig["hand_speed"]
+    if not np.isfinite(hy).any():
+        return out
+
+    found = {}
+
+    def put(p, idx, method):
+        if idx is not None:
+            found[p] = (int(idx), method)
+
+    if impact is not None:
+        impact = int(np.clip(impact, 0, T - 1))
+    # top: highest hands before impact, or before the fastest hands (the finish is high too)
+    fast = _nanarg(np.nanargmax, speed, 0, T)
+    end = impact if impact is not None else fast
+    top = _nanarg(np.nanargmin, hy, 0, max(1, end if end is not None else T))
+    if top is None:
+        return out
+    # snap to the vertical-velocity zero-crossing next to the extremum
+    z = _crossing(vy, 0.0, max(0, top - 2), min(T, top + 3), rising=True)
+    put("P4", top if z is None else z, "hand_height_min")
+
+    still = np.nan_to_num(speed, nan=np.inf) < STILL_FRAC * max(np.nanmax(speed) if np.isfinite(speed).any() else 0.0, 1e-9)
+    y_low = np.nanmax(hy[:top + 1])
+    low = np.nan_to_num(hy, nan=-np.inf) >= y_low - 0.1 * (y_low - hy[top])
+    p1 = _last(still & low, 0, top)
+    put("P1", p1, "still_hands_low")
+    p1 = 0 if p1 is None else p1
+
+    if impact is not None:
+        put("P7", impact, "given")
+    else:
+        span = max(MIN_BACKSWING_SEC, t[top] - t[p1])
+        put("P7", _nanarg(np.nanargmax, hy, top + 1, int(np.searchsorted(t, t[top] + span, side="right"))), "hand_height_max")
+    p7 = found.get("P7", (None,))[0]
+
+    hip = np.nanmedian(sig["hip_y"][p1:top + 1]) if np.isfinite(sig["hip_y"][p1:top + 1]).any() else np.nan
+    # image y grows downward: "rising" hands = y falling through the threshold
+    neg_hy = -hy
+    if np.isfinite(hip):
+        put("P2", _crossing(neg_hy, -hip, p1, top + 1, rising=True), "hands_hip_height")
+    put("P3", _crossing(sig["lead_arm"], 0.0, p1, top + 1, rising=True), "lead_arm_horizontal")
+    if p7 is not None:
+        put("P5", _crossing(sig["lead_arm"], 0.0, top, p7 + 1, rising=False), "lead_arm_horizontal")
+        if np.isfinite(hip):
+            put("P6", _crossing(neg_hy, -hip, top, p7 + 1, rising=False), "hands_hip_height")
+            put("P8", _crossing(neg_hy, -hip, p7, T, rising=True), "hands_hip_height")
+        p8 = found.get("P8", (p7,))[0]
+        put("P9", _crossing(sig["trail_arm"], 0.0, p8, T, rising=True), "trail_arm_horizontal")
+        p9 = found.get("P9", (None,))[0]
+        if p9 is not None:
+            put("P10", _first(still, p9, T), "still_after_p9")
+
+    # order check: drop detections that land outside their neighbours
+    last = -1
+    for p in PHASES:
+        if p in found:
+            if found[p][0] <= last and p not in ("P1", "P4", "P7"):
+                del found[p]
+            else:
+                last = found[p][0]
+
+    # fill gaps by timing
+    for p in PHASES:
+        if p in found:
+            continue
+        if p in FALLBACK_FRAC:
+            a, b, frac = FALLBACK_FRAC[p]
+            if a in found and b in found:
+                ta, tb = t[found[a][0]], t[found[b][0]]
+                found[p] = (min(T - 1, int(np.searchsorted(t, ta + frac * (tb - ta)))), "interp")
+        elif p in FALLBACK_AFTER_SEC and "P7" in found:
+            i7 = found["P7"][0]
+            found[p] = (min(T - 1, int(np.searchsorted(t, t[i7] + FALLBACK_AFTER_SEC[p]))), "interp")
+        elif p == "P1":
+            found[p] = (0, "interp")
+
+    for p, (idx, method) in found.items():
+        rule = 1.0 if method not in ("interp",) else CONF_FALLBACK
+        out[p] = {"index": idx, "conf": round(float(np.clip(sig["vis"][idx], 0.0, 1.0)) * rule, 3), "method": method}
+    return out
+
+def offset_phases(impact: int, fps: float, total: int) -> Dict[str, Dict[str, Any]]:
+    """
+    No pose: P1-P9 at fixed time offsets around impact (scaled to fps), low confidence.
+    """
+    out = {}
+    for p, sec in DEFAULT_OFFSETS_SEC.items():
+        idx = max(0, min(total - 1, impact + int(round(sec * fps))))
+        out[p] = {"index": idx, "conf": CONF_OFFSETS, "method": "offset"}
+    return out
+
+def sample_rate(i, fps):
+    """
+    Effective sample rate of a pose extraction whose rows are source frames `i`.
+    """
+    i = np.asarray(i)
+    step = float(np.median(np.diff(i))) if i.size > 1 else 1.0
+    return float(fps) / max(step, 1.0)
+
+def detect_from_array(pa, fps: Optional[float] = None, impact_frame: Optional[int] = None,
+                      lead: str = "left") -> Dict[str, Dict[str, Any]]:
+    """
+    detect_phases on a PoseArray, in source-frame terms: impact_frame and the returned
+    "frame" fields are video frame indices (pa.i), whatever the extraction's sampling.
+    """
+    fps = float(fps or pa.fps() or 30.0)
+    src = np.asarray(pa.i)
+    impact = None
+    if impact_frame is not None and len(src):
+        impact = int(np.argmin(np.abs(src - int(impact_frame))))
+    ph = detect_phases(np.asarray(pa.pose, dtype=np.float64), sample_rate(src, fps), impact, lead,
+                       src.astype(np.float64) / fps)
+    for v in ph.values():
+        v["frame"] = None if v["index"] is None else int(src[v["index"]])
+    return ph
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pose", required=True, help="pose JSON or pose_array container")
+    ap.add_argument("--impact", type=int, default=-1, help="impact video frame (optional)")
+    ap.add_argument("--fps", type=float, default=0.0, help="override the pose file's fps")
+    ap.add_argument("--lead", default="left", choices=["left", "right"])
+    ap.add_argument("--out", default="", help="output JSON (default: stdout)")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.pose):
+        print(f"phase_detect.py: pose not found: {args.pose}", file=sys.stderr)
+        raise SystemExit(1)
+    pa = load(args.pose, mmap=False) if not args.pose.lower().endswith(".json") else from_json(args.pose, dtype=np.float64)
+    ph = detect_from_array(pa, args.fps or None, args.impact if args.impact >= 0 else None, args.lead)
+    out = {"ok": True, "fps": args.fps or pa.fps(), "phases": ph}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+        print("OK wrote:", args.out)
+        print(" ".join(f"{p}={v['frame']}({v['conf']:.2f})" for p, v in ph.items()))
+    else:
+        print(json.dumps(out))
+
+if __name__ == "__main__":
+    main()
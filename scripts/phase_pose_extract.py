@@ -1,8 +1,10 @@
-import sys, json, os
+import sys, json, os, time
 from pathlib import Path
 
 import cv2
 
+from frame_store import open_frames
+
 def die(msg, code=1):
     print(msg, file=sys.stderr)
     sys.exit(code)
@@ -105,12 +107,13 @@ def main():
     except Exception as e:
         die("phase_pose_extract.py: mediapipe tasks not available. " + str(e))
 
-    cap = cv2.VideoCapture(str(vp))
-    if not cap.isOpened():
+    try:
+        frames = open_frames(str(vp))
+    except RuntimeError:
         die(f"phase_pose_extract.py: failed to open video: {video}")
 
-    fps = float(cap.get(cv2.CAP_PROP_FPS) or 30.0)
-    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    fps = float(frames.fps or 30.0)
+    total = int(frames.frame_count or 0)
     if total <= 0:
         die("phase_pose_extract.py: could not read frame count")
 
@@ -122,11 +125,7 @@ def main():
         num_poses=1
     )
 
-    def read_frame(idx):
-        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-        ok, bgr = cap.read()
-        if not ok or bgr is None:
-            return None
+    def prepare_frame(bgr):
         if isinstance(bbox, dict):
             bgr2, used = crop_frame(bgr, bbox, pad=pad)
             return bgr2, used
@@ -148,81 +147,107 @@ def main():
         "phases": []
     }
 
+    def phase_order(x):
+        return int(x[1:]) if x and x[0].upper()=="P" and x[1:].isdigit() else x
+
+    # Plan every phase window first, then infer each unique frame once:
+    # overlapping windows (P6/P7/P8 are often a few frames apart) share their frames.
+    plan = []   # (key, base_idx or -1, [candidate idxs])
+    for key in sorted(phases.keys(), key=phase_order):
+        base_idx = safe_int(phases.get(key), -1)
+        if base_idx < 0:
+            plan.append((key, base_idx, []))
+            continue
+        base_idx = clamp(base_idx, 0, total-1)
+        start = clamp(base_idx - window, 0, total-1)
+        end   = clamp(base_idx + window, 0, total-1)
+        plan.append((key, base_idx, list(range(start, end + 1, max(1, every_n)))))
+
+    wanted = sorted(set(i for _, _, idxs in plan for i in idxs))
+    requested = sum(len(idxs) for _, _, idxs in plan)
+
+    results = {}   # frame idx -> (timestamp_ms, pose_lms, score, used_bbox)
+    t0 = time.time()
     with vision.PoseLandmarker.create_from_options(options) as landmarker:
-        for key in sorted(phases.keys(), key=lambda x: int(x[1:]) if x and x[0].upper()=="P" and x[1:].isdigit() else x):
-            base_idx = safe_int(phases.get(key), -1)
-            if base_idx < 0:
-                out["phases"].append({"phase": key, "base_frame": base_idx, "best": None, "candidates": []})
+        # union of all windows in one forward sweep (sorted indices through the seek index)
+        for idx, bgr in frames.iter_indices(wanted):
+            if bgr is None:
                 continue
-
-            base_idx = clamp(base_idx, 0, total-1)
-            candidates = []
-            best = None
-            best_score = -1e9
-
-            start = clamp(base_idx - window, 0, total-1)
-            end   = clamp(base_idx + window, 0, total-1)
-
-            idx = start
-            while idx <= end:
-                fr = read_frame(idx)
-                if fr is None:
-                    idx += max(1, every_n)
-                    continue
-                bgr, used_bbox = fr
-                rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
-
-                # timestamp required in ms for VIDEO mode
-                ts_ms = int((idx / max(1e-6, fps)) * 1000.0)
-
-                mp_image = mp_pkg.Image(image_format=mp_pkg.ImageFormat.SRGB, data=rgb)
-                res = landmarker.detect(mp_image)
-                pose_lms = []
-                if res and getattr(res, "pose_landmarks", None):
-                    if len(res.pose_landmarks) > 0:
-                        pose_lms = res.pose_landmarks[0] or []
-
-                lm_count = len(pose_lms) if pose_lms else 0
-                sc = score_landmarks(pose_lms) if lm_count else 0.0
-
-                cand = {
+            bgr, used_bbox = prepare_frame(bgr)
+            rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+            # timestamp required in ms for VIDEO mode
+            ts_ms = int((idx / max(1e-6, fps)) * 1000.0)
+
+            mp_image = mp_pkg.Image(image_format=mp_pkg.ImageFormat.SRGB, data=rgb)
+            res = landmarker.detect(mp_image)
+            pose_lms = []
+            if res and getattr(res, "pose_landmarks", None):
+                if len(res.pose_landmarks) > 0:
+                    pose_lms = res.pose_landmarks[0] or []
+
+            sc = score_landmarks(pose_lms) if pose_lms else 0.0
+            results[idx] = (ts_ms, pose_lms, sc, used_bbox)
+    infer_sec = time.time() - t0
+
+    for key, base_idx, idxs in plan:
+        if base_idx < 0:
+            out["phases"].append({"phase": key, "base_frame": base_idx, "best": None, "candidates": []})
+            continue
+
+        candidates = []
+        best = None
+        best_score = -1e9
+        for idx in idxs:
+            if idx not in results:
+                continue
+            ts_ms, pose_lms, sc, used_bbox = results[idx]
+            lm_count = len(pose_lms) if pose_lms else 0
+
+            cand = {
+                "frame": idx,
+                "timestamp_ms": ts_ms,
+                "landmarksCount": lm_count,
+                "score": sc,
+                "used_bbox": used_bbox
+            }
+            candidates.append(cand)
+
+            if lm_count == 33 and sc > best_score:
+                best_score = sc
+                # Serialize landmarks to plain dict list
+                best = {
                     "frame": idx,
                     "timestamp_ms": ts_ms,
-                    "landmarksCount": lm_count,
                     "score": sc,
+                    "landmarks": [
+                        {
+                            "x": float(lm.x),
+                            "y": float(lm.y),
+                            "z": float(lm.z),
+                            "visibility": float(getattr(lm, "visibility", 0.0)),
+                            "presence": float(getattr(lm, "presence", 0.0))
+                        } for lm in pose_lms
+                    ],
                     "used_bbox": used_bbox
                 }
-                candidates.append(cand)
-
-                if lm_count == 33 and sc > best_score:
-                    best_score = sc
-                    # Serialize landmarks to plain dict list
-                    best = {
-                        "frame": idx,
-                        "timestamp_ms": ts_ms,
-                        "score": sc,
-                        "landmarks": [
-                            {
-                                "x": float(lm.x),
-                                "y": float(lm.y),
-                                "z": float(lm.z),
-                                "visibility": float(getattr(lm, "visibility", 0.0)),
-                                "presence": float(getattr(lm, "presence", 0.0))
-                            } for lm in pose_lms
-                        ],
-                        "used_bbox": used_bbox
-                    }
-
-                idx += max(1, every_n)
-
-            out["phases"].append({
-                "phase": key,
-                "base_frame": base_idx,
-                "best": best,
-                "candidates": candidates
-            })
-
-    cap.release()
+
+        out["phases"].append({
+            "phase": key,
+            "base_frame": base_idx,
+            "best": best,
+            "candidates": candidates
+        })
+
+    out["meta"]["inference"] = {
+        "requested_frames": requested,
+        "unique_frames": len(wanted),
+        "inferred_frames": len(results),
+        "dedup_ratio": round(requested / len(wanted), 3) if wanted else None,
+        "infer_sec": round(infer_sec, 3)
+    }
+
+    frames.close()
 
     # basic health: require at least 5 phases with best landmarks
     good = sum(1 for p in out["phases"] if p.get("best") and p["best"].get("landmarks") and len(p["best"]["landmarks"]) == 33)
@@ -234,7 +259,9 @@ def main():
     Path(out_json).parent.mkdir(parents=True, exist_ok=True)
     Path(out_json).write_text(json.dumps(out), encoding="utf-8")
 
-    print(f"OK wrote: {out_json} phases_good={good}/{len(out['phases'])}")
+    inf = out["meta"]["inference"]
+    print(f"OK wrote: {out_json} phases_good={good}/{len(out['phases'])} "
+          f"frames={inf['unique_frames']}/{inf['requested_frames']} dedup={inf['dedup_ratio']}")
 
 if __name__ == "__main__":
     main()
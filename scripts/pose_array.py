@@ -0,0 +1,235 @@
+import os, sys, json, argparse
+import numpy as np
+
+# Columnar pose container.
+#
+# A clip's landmarks as one array instead of 33 dicts per frame:
+#   pose  (T, L, 5)  x, y, z, visibility, presence   (NaN = missing)
+#   i     (T,)       source frame index
+#   t     (T,)       timestamp as written by the extractor (NaN if absent)
+#   meta  dict       everything in the source JSON besides the frames list
+#
+# Two on-disk layouts:
+#   <name>.npz   compressed, smallest (np.load, no JSON parsing)
+#   <dir>/       pose.npy / i.npy / t.npy / meta.json, memory-mapped on load
+#
+#   python .\scripts\pose_array.py in.json out.npz            (JSON -> array)
+#   python .\scripts\pose_array.py in.npz  out.json           (array -> JSON)
+
+CHANNELS = ("x", "y", "z", "visibility", "presence")
+X, Y, Z, VIS, PRES = range(5)
+LM_COUNT = 33
+
+# MediaPipe Pose landmark order
+LANDMARK_NAMES = (
+    "nose", "left_eye_inner", "left_eye", "left_eye_outer", "right_eye_inner", "right_eye", "right_eye_outer",
+    "left_ear", "right_ear", "mouth_left", "mouth_right", "left_shoulder", "right_shoulder",
+    "left_elbow", "right_elbow", "left_wrist", "right_wrist", "left_pinky", "right_pinky",
+    "left_index", "right_index", "left_thumb", "right_thumb", "left_hip", "right_hip",
+    "left_knee", "right_knee", "left_ankle", "right_ankle", "left_heel", "right_heel",
+    "left_foot_index", "right_foot_index"
+)
+
+def extract_frames(data):
+    """
+    (frames, key) from any of the pose JSON shapes: {"frames": [...]}, {"pose": [...]} or a bare list.
+    """
+    if isinstance(data, dict):
+        if "frames" in data and isinstance(data["frames"], list):
+            return data["frames"], "frames"
+        if "pose" in data and isinstance(data["pose"], list):
+            return data["pose"], "pose"
+    if isinstance(data, list):
+        return data, None
+    return None, None
+
+def _num(v):
+    return float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+
+def landmarks_row(lms, lm_count=LM_COUNT):
+    """
+    One frame's landmark dicts -> list of lm_count (x, y, z, visibility, presence) tuples,
+    or None if the list is missing or the wrong length.
+    """
+    if not isinstance(lms, list) or len(lms) != lm_count:
+        return None
+    return [
+        (_num(lm.get("x")), _num(lm.get("y")), _num(lm.get("z")),
+         _num(lm.get("visibility", lm.get("v"))), _num(lm.get("presence")))
+        if isinstance(lm, dict) else (np.nan,) * len(CHANNELS)
+        for lm in lms
+    ]
+
+class PoseArray:
+    """
+    pose (T, L, 5) + per-frame i / t + source meta. `key` remembers where the frames
+    list lived in the source JSON ("frames", "pose" or None for a bare list).
+    """
+    def __init__(self, pose, i=None, t=None, meta=None, key="frames"):
+        self.pose = pose
+        T = pose.shape[0]
+        self.i = np.arange(T, dtype=np.int64) if i is None else i
+        self.t = np.full(T, np.nan) if t is None else t
+        self.meta = dict(meta or {})
+        self.key = key
+
+    def __len__(self):
+        return int(self.pose.shape[0])
+
+    @property
+    def valid(self):
+        """(T, L) bool: landmark has finite x and y."""
+        return np.isfinite(self.pose[..., X]) & np.isfinite(self.pose[..., Y])
+
+    @property
+    def frame_valid(self):
+        """(T,) bool: frame has any landmarks."""
+        return self.valid.any(axis=1)
+
+    def fps(self):
+        f = self.meta.get("fps")
+        if f is None and isinstance(self.meta.get("meta"), dict):
+            f = self.meta["meta"].get("fps")
+        try:
+            return float(f) if f else None
+        except (TypeError, ValueError):
+            return None
+
+def from_json(data, dtype=np.float32, lm_count=None):
+    """
+    PoseArray from parsed pose JSON (or a path to one). Accepts "visibility" or "v".
+    Frames whose landmark list is empty or has the wrong length become NaN rows.
+    """
+    if isinstance(data, (str, os.PathLike)):
+        with open(data, "r", encoding="utf-8-sig") as f:
+            data = json.load(f)
+    frames, key = extract_frames(data)
+    if not isinstance(frames, list):
+        raise ValueError("pose_array: could not find frames list")
+
+    def lms_of(fr):
+        return fr.get("landmarks") if isinstance(fr, dict) else fr
+
+    if lm_count is None:
+        lm_count = next((len(l) for l in map(lms_of, frames) if isinstance(l, list) and l), LM_COUNT)
+
+    T = len(frames)
+    pose = np.full((T, lm_count, len(CHANNELS)), np.nan, dtype=np.float64)
+    idx = np.arange(T, dtype=np.int64)
+    t = np.full(T, np.nan, dtype=np.float64)
+
+    for k, fr in enumerate(frames):
+        if isinstance(fr, dict):
+            fi = fr.get("i", fr.get("frame"))
+            if isinstance(fi, (int, float)):
+                idx[k] = int(fi)
+            t[k] = _num(fr.get("t"))
+        row = landmarks_row(lms_of(fr), lm_count)
+        if row is not None:
+            pose[k] = row
+
+    meta = {k: v for k, v in data.items() if k != key} if isinstance(data, dict) else {}
+    return PoseArray(pose.astype(dtype, copy=False), idx, t, meta, key)
+
+def to_frames(pa):
+    """
+    Inverse of from_json: frame dicts {"i", "t", "landmarks": [...]}. Missing frames get
+    an empty landmark list; NaN visibility/presence/z are left out of the landmark dict.
+    """
+    out = []
+    pose = np.asarray(pa.pose, dtype=np.float64)
+    valid = pa.valid
+    for k in range(len(pa)):
+        fr = {"i": int(pa.i[k])}
+        if np.isfinite(pa.t[k]):
+            fr["t"] = float(pa.t[k])
+        lms = []
+        if valid[k].all():
+            for row in pose[k].tolist():
+                lm = {"x": row[X], "y": row[Y]}
+                for c in (Z, VIS, PRES):
+                    if row[c] == row[c]:   # not NaN
+                        lm[CHANNELS[c]] = row[c]
+                lms.append(lm)
+        fr["landmarks"] = lms
+        out.append(fr)
+    return out
+
+def to_json(pa):
+    frames = to_frames(pa)
+    if pa.key is None:
+        return frames
+    out = dict(pa.meta)
+    out[pa.key] = frames
+    return out
+
+# ---------------- disk ----------------
+
+def save(pa, path):
+    """
+    .npz path -> compressed archive; anything else -> directory of .npy files.
+    """
+    meta = json.dumps({"key": pa.key, "channels": list(CHANNELS), "meta": pa.meta})
+    if str(path).lower().endswith(".npz"):
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        np.savez_compressed(path, pose=pa.pose, i=pa.i, t=pa.t, meta=np.array(meta))
+        return path
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "pose.npy"), np.ascontiguousarray(pa.pose))
+    np.save(os.path.join(path, "i.npy"), pa.i)
+    np.save(os.path.join(path, "t.npy"), pa.t)
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        f.write(meta)
+    return path
+
+def load(path, mmap=True):
+    """
+    PoseArray from a saved container (.npz or .npy directory), or converted from a .json.
+    Directory layouts are memory-mapped read-only unless mmap=False.
+    """
+    p = str(path)
+    if p.lower().endswith(".json"):
+        return from_json(p)
+    if p.lower().endswith(".npz"):
+        with np.load(p) as z:
+            m = json.loads(str(z["meta"]))
+            return PoseArray(z["pose"], z["i"], z["t"], m.get("meta"), m.get("key"))
+    mode = "r" if mmap else None
+    with open(os.path.join(p, "meta.json"), "r", encoding="utf-8") as f:
+        m = json.load(f)
+    return PoseArray(np.load(os.path.join(p, "pose.npy"), mmap_mode=mode),
+                     np.load(os.path.join(p, "i.npy")),
+                     np.load(os.path.join(p, "t.npy")),
+                     m.get("meta"), m.get("key"))
+
+def _size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("inp")
+    ap.add_argument("outp")
+    ap.add_argument("--dtype", default="float32", choices=["float16", "float32", "float64"])
+    args = ap.parse_args()
+
+    if not os.path.exists(args.inp):
+        print(f"pose_array.py: input not found: {args.inp}", file=sys.stderr)
+        raise SystemExit(1)
+
+    if args.outp.lower().endswith(".json"):
+        pa = load(args.inp, mmap=False)
+        with open(args.outp, "w", encoding="utf-8") as f:
+            json.dump(to_json(pa), f)
+    else:
+        pa = from_json(args.inp, dtype=np.dtype(args.dtype))
+        save(pa, args.outp)
+
+    a, b = _size(args.inp), _size(args.outp)
+    print(f"OK wrote: {args.outp} frames={len(pa)} valid={int(pa.frame_valid.sum())} "
+          f"shape={tuple(pa.pose.shape)} size={a}->{b} bytes ({a / max(1, b):.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import os, sys, json, time, argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# Batch pose extraction over many uploads.
+#
+# Spreads videos across a process pool; each worker process builds one VIDEO-mode
+# PoseLandmarker in its initializer and reuses it for every clip it is handed, so the
+# model load is paid once per core instead of once per video.
+# Per-video output is the same JSON pose_estimate_tasks_v2.py writes (<stem>.pose.json),
+# under the video's path relative to the input directory / manifest folder.
+#
+#   python .\scripts\pose_batch.py --in <dir | manifest.txt | manifest.json> --out_dir <dir> --model <.task>
+
+VIDEO_EXTS = (".mp4", ".mov", ".m4v", ".avi", ".mkv", ".webm")
+
+def die(msg, code=1):
+    print(msg, file=sys.stderr)
+    sys.exit(code)
+
+def list_videos(src, out_dir):
+    """
+    (video, out_json) pairs from a directory (recursive), a .txt manifest (one path per
+    line, '#' comments) or a .json manifest (list of paths or {"in", "out"} objects).
+    Default outputs mirror the video's folder relative to the input under out_dir, so
+    a/swing.mp4 and b/swing.mp4 don't share one JSON.
+    """
+    p = Path(src)
+    items = []
+    if p.is_dir():
+        for v in sorted(p.rglob("*")):
+            if v.is_file() and v.suffix.lower() in VIDEO_EXTS:
+                items.append((str(v), None))
+    elif p.suffix.lower() == ".json":
+        j = json.loads(p.read_text(encoding="utf-8-sig"))
+        if isinstance(j, dict):
+            j = j.get("videos") or []
+        for it in j:
+            if isinstance(it, dict):
+                items.append((str(it.get("in") or it.get("video") or ""), it.get("out")))
+            else:
+                items.append((str(it), None))
+    else:
+        for line in p.read_text(encoding="utf-8-sig").splitlines():
+            line = line.strip().strip('"')
+            if line and not line.startswith("#"):
+                items.append((line, None))
+
+    base = p if p.is_dir() else p.parent
+    out = []
+    for v, o in items:
+        if not v:
+            continue
+        vp = Path(v) if Path(v).is_absolute() else (base / v)
+        if not o:
+            try:
+                rel = vp.parent.relative_to(base)
+            except ValueError:
+                rel = Path()   # absolute manifest path outside the manifest's folder
+            o = os.path.join(out_dir, *rel.parts, vp.stem + ".pose.json")
+        out.append((str(vp), str(o)))
+    return out
+
+# ---------------- worker process ----------------
+
+_LANDMARKER = None
+_SAMPLE = 1
+
+def _init_worker(model_task, sample):
+    global _LANDMARKER, _SAMPLE
+    import cv2
+    cv2.setNumThreads(1)   # one core per worker; the pool provides the parallelism
+    from pose_runtime import WarmLandmarker
+    _LANDMARKER = WarmLandmarker(model_task)
+    _SAMPLE = sample
+
+def _run_one(video, out_json):
+    from pose_runtime import extract_video
+    t0 = time.time()
+    res = {"video": video, "out": out_json, "pid": os.getpid(), "ok": False}
+    try:
+        payload = extract_video(_LANDMARKER, video, _SAMPLE)
+        Path(out_json).parent.mkdir(parents=True, exist_ok=True)
+        with open(out_json, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        meta = payload["meta"]
+        res.update(ok=True, frames=meta["total_frames_written"], non_empty=meta["non_empty"],
+                   frame_count=meta["frame_count"])
+    except Exception as e:
+        res["error"] = f"{type(e).__name__}: {e}"
+    res["sec"] = round(time.time() - t0, 3)
+    return res
+
+# ---------------- main ----------------
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="src", required=True, help="directory of videos or manifest (.txt/.json)")
+    ap.add_argument("--out_dir", required=True)
+    ap.add_argument("--model", dest="model_task", required=True)
+    ap.add_argument("--sample", type=int, default=1)
+    ap.add_argument("--workers", type=int, default=0, help="0 = one per CPU")
+    ap.add_argument("--skip_existing", action="store_true")
+    ap.add_argument("--summary", default="", help="summary JSON path (default <out_dir>/pose_batch_summary.json)")
+    args = ap.parse_args()
+
+    if not Path(args.src).exists():
+        die(f"Could not find input: {args.src}")
+    if not Path(args.model_task).exists():
+        die(f"Could not find model: {args.model_task}")
+
+    jobs = list_videos(args.src, args.out_dir)
+    missing = [v for v, _ in jobs if not Path(v).exists()]
+    if missing:
+        die("Missing videos:\n  " + "\n  ".join(missing))
+    seen = {}
+    for v, o in jobs:
+        seen.setdefault(os.path.normcase(os.path.abspath(o)), []).append(v)
+    clash = [f"{o} <- " + ", ".join(vs) for o, vs in seen.items() if len(vs) > 1]
+    if clash:
+        die("Several videos map to one output (set \"out\" in a .json manifest):\n  " + "\n  ".join(clash))
+    skipped = []
+    if args.skip_existing:
+        skipped = [o for _, o in jobs if Path(o).exists()]
+        jobs = [(v, o) for v, o in jobs if not Path(o).exists()]
+    if not jobs:
+        die("No videos to process." if not skipped else f"Nothing to do: {len(skipped)} outputs already exist.", 0 if skipped else 1)
+
+    workers = min(len(jobs), args.workers if args.workers > 0 else (os.cpu_count() or 1))
+    sample = max(1, int(args.sample or 1))
+    Path(args.out_dir).mkdir(parents=True, exist_ok=True)
+    print(f"pose_batch: videos={len(jobs)} workers={workers} sample={sample}")
+
+    t0 = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(str(Path(args.model_task).resolve()), sample)) as pool:
+        futs = {pool.submit(_run_one, v, o): (v, o) for v, o in jobs}
+        for fut in as_completed(futs):
+            try:
+                r = fut.result()
+            except BrokenProcessPool as e:
+                # a worker died (e.g. a native crash in MediaPipe): this and every job
+                # still pending fail, the rest of the summary is kept
+                v, o = futs[fut]
+                r = {"video": v, "out": o, "ok": False, "error": f"BrokenProcessPool: {e}", "sec": None}
+            results.append(r)
+            if r["ok"]:
+                print(f"  OK {r['video']} frames={r['frames']} nonEmpty={r['non_empty']} {r['sec']}s")
+            else:
+                print(f"  FAIL {r['video']}: {r['error']}", file=sys.stderr)
+    wall = time.time() - t0
+
+    ok = [r for r in results if r["ok"]]
+    frames = sum(r["frames"] for r in ok)
+    summary = {
+        "videos": len(results),
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        "skipped": len(skipped),
+        "workers": workers,
+        "sample": sample,
+        "model": os.path.basename(args.model_task),
+        "wall_sec": round(wall, 3),
+        "frames": frames,
+        "videos_per_min": round(len(ok) / wall * 60.0, 2) if wall > 0 else None,
+        "frames_per_sec": round(frames / wall, 2) if wall > 0 else None,
+        "results": sorted(results, key=lambda r: r["video"])
+    }
+    summary_path = args.summary or os.path.join(args.out_dir, "pose_batch_summary.json")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"OK pose batch: ok={summary['ok']}/{summary['videos']} wall={summary['wall_sec']}s "
+          f"videos/min={summary['videos_per_min']} frames/s={summary['frames_per_sec']} summary={summary_path}")
+    if summary["failed"]:
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import os, json
+import cv2
+
+# Crop-aware pose inference.
+#
+# The person bbox (crop_person_hog.py, or any crop_meta.json / {x1,y1,x2,y2}) is resolved
+# once per video. Every frame is then cropped to it and downscaled to about the model
+# input size *before* the BGR->RGB conversion, so the per-frame pixel work is a few
+# hundred thousand pixels instead of a full 1080p/4K frame, and a small, distant golfer
+# fills the model input. Landmarks come back normalized to the crop and are mapped to
+# full-frame normalized coordinates, so the output JSON is unchanged.
+#
+#   crop = resolve_crop("auto" | "track" | "crop_meta.json", frames)
+#   rgb = crop.prepare(frame_bgr)
+#   lms = crop.to_full(landmarks_to_dicts(...))
+#   crop.update(lms)                       (moves the window for "track"; no-op otherwise)
+#
+# "track" (CropTracker) seeds from the HOG box, then re-centres the window on every frame
+# from that frame's landmarks, padded for the club. HOG only runs again once tracking has
+# been lost for a few frames, so a golfer who walks or a panning camera stays in a tight crop.
+
+# long side of the crop fed to the landmarker (pose landmark model input is 256x256)
+DEFAULT_SIZE = 256
+HOG_SAMPLE_N = 10
+
+# tracker: club reach around the hands, as a fraction of body height (nose -> ankles)
+CLUB_FRAC = 0.65
+TRACK_MARGIN = 0.12        # extra margin on each side, fraction of the window size
+TRACK_MIN_VIS = 0.3        # landmarks below this visibility don't shape the window
+TRACK_MIN_POINTS = 8
+LOST_AFTER = 3             # frames without a usable pose before falling back to HOG
+NOSE, L_WRI, R_WRI, L_ANK, R_ANK = 0, 15, 16, 27, 28
+
+class PoseCrop:
+    """
+    Fixed crop box (pixels, exclusive x2/y2) in a w x h video, plus the downscale size.
+    """
+    dynamic = False
+
+    def __init__(self, bbox, w, h, size=DEFAULT_SIZE, source=""):
+        x1 = max(0, min(w - 1, int(bbox.get("x1", 0))))
+        y1 = max(0, min(h - 1, int(bbox.get("y1", 0))))
+        x2 = max(x1 + 1, min(w, int(bbox.get("x2", w))))
+        y2 = max(y1 + 1, min(h, int(bbox.get("y2", h))))
+        self.box = (x1, y1, x2, y2)
+        self.w, self.h = int(w), int(h)
+        self.cw, self.ch = x2 - x1, y2 - y1
+        s = float(size) / float(max(self.cw, self.ch)) if size else 1.0
+        self.scale = min(1.0, s)
+        self.out_w = max(1, int(round(self.cw * self.scale)))
+        self.out_h = max(1, int(round(self.ch * self.scale)))
+        self.source = source
+
+    def prepare(self, frame_bgr):
+        """Crop, downscale, then BGR->RGB (only the small image is converted)."""
+        x1, y1, x2, y2 = self.box
+        roi = frame_bgr[y1:y2, x1:x2]
+        if self.scale < 1.0:
+            roi = cv2.resize(roi, (self.out_w, self.out_h), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)
+
+    def to_full(self, lms):
+        """
+        Crop-normalized landmark dicts -> full-frame normalized, in place.
+        z follows x (MediaPipe scales z like the image width).
+        """
+        x1, y1 = self.box[0], self.box[1]
+        fx, fy = self.cw / float(self.w), self.ch / float(self.h)
+        ox, oy = x1 / float(self.w), y1 / float(self.h)
+        for lm in lms:
+            lm["x"] = ox + lm["x"] * fx
+            lm["y"] = oy + lm["y"] * fy
+            if "z" in lm:
+                lm["z"] = lm["z"] * fx
+        return lms
+
+    def update(self, lms):
+        """Fixed crop: nothing to track."""
+        return self
+
+    def meta(self):
+        x1, y1, x2, y2 = self.box
+        return {"bbox": {"x1": x1, "y1": y1, "x2": x2, "y2": y2}, "input": [self.out_w, self.out_h],
+                "pixel_ratio": round((self.out_w * self.out_h) / float(self.w * self.h), 4),
+                "source": self.source}
+
+class CropTracker:
+    """
+    Per-frame crop window that follows the golfer. Same prepare/to_full/update interface
+    as PoseCrop; the window used by prepare() is the one to_full() maps back from, and
+    update(lms) (full-frame landmarks, or [] when nothing was found) moves it for the
+    next frame. `hog` is a callable frame_bgr -> (x, y, w, h) or None used when lost.
+    """
+    dynamic = True
+
+    def __init__(self, seed_bbox, w, h, size=DEFAULT_SIZE, hog=None, source="track"):
+        self.w, self.h = int(w), int(h)
+        self.size = size
+        self.hog = hog
+        self.source = source
+        self.full = {"x1": 0, "y1": 0, "x2": self.w, "y2": self.h}
+        self.crop = PoseCrop(seed_bbox or self.full, w, h, size, source)
+        self.lost = 0
+        self.frames = 0
+        self.lost_frames = 0
+        self.hog_runs = 0
+        self.hog_hits = 0
+        self._ratio_sum = 0.0
+        self._last_bgr = None
+
+    @property
+    def box(self):
+        return self.crop.box
+
+    def prepare(self, frame_bgr):
+        self.frames += 1
+        self._ratio_sum += (self.crop.cw * self.crop.ch) / float(self.w * self.h)
+        self._last_bgr = frame_bgr
+        return self.crop.prepare(frame_bgr)
+
+    def to_full(self, lms):
+        return self.crop.to_full(lms)
+
+    def window_from_landmarks(self, lms):
+        """
+        Pixel window around the visible landmarks plus the club's reach from the hands,
+        or None if too few landmarks are usable.
+        """
+        pts = [(lm["x"] * self.w, lm["y"] * self.h) for lm in lms
+               if lm.get("visibility", lm.get("v", 1.0)) >= TRACK_MIN_VIS]
+        if len(pts) < TRACK_MIN_POINTS or len(lms) <= R_ANK:
+            return None
+        xs = [p[0] for p in pts]
+        ys = [p[1] for p in pts]
+        x1, x2, y1, y2 = min(xs), max(xs), min(ys), max(ys)
+
+        body_h = abs(0.5 * (lms[L_ANK]["y"] + lms[R_ANK]["y"]) - lms[NOSE]["y"]) * self.h
+        body_h = max(body_h, y2 - y1)
+        reach = CLUB_FRAC * body_h
+        hx = 0.5 * (lms[L_WRI]["x"] + lms[R_WRI]["x"]) * self.w
+        hy = 0.5 * (lms[L_WRI]["y"] + lms[R_WRI]["y"]) * self.h
+        x1, x2 = min(x1, hx - reach), max(x2, hx + reach)
+        y1, y2 = min(y1, hy - reach), max(y2, hy + reach)
+
+        mx, my = TRACK_MARGIN * (x2 - x1), TRACK_MARGIN * (y2 - y1)
+        return {"x1": x1 - mx, "y1": y1 - my, "x2": x2 + mx, "y2": y2 + my}
+
+    def update(self, lms):
+        win = self.window_from_landmarks(lms) if lms else None
+        if win is not None:
+            self.lost = 0
+            self.crop = PoseCrop(win, self.w, self.h, self.size, self.source)
+            return self
+
+        self.lost += 1
+        self.lost_frames += 1
+        if self.lost < LOST_AFTER:
+            return self
+        # lost: re-seed from HOG on the current frame, else widen to the full frame
+        box = None
+        if self.hog is not None and self._last_bgr is not None:
+            self.hog_runs += 1
+            box = self.hog(self._last_bgr)
+        if box is not None:
+            self.hog_hits += 1
+            x, y, bw, bh = box
+            px, py = 0.35 * bw, 0.35 * bh
+            self.crop = PoseCrop({"x1": x - px, "y1": y - py, "x2": x + bw + px, "y2": y + bh + py},
+                                 self.w, self.h, self.size, self.source)
+        else:
+            self.crop = PoseCrop(self.full, self.w, self.h, self.size, self.source)
+        self.lost = 0
+        return self
+
+    def meta(self):
+        m = self.crop.meta()
+        m.update({
+            "mode": "track",
+            "frames": self.frames,
+            "lost_frames": self.lost_frames,
+            "hog_runs": self.hog_runs,
+            "hog_hits": self.hog_hits,
+            "mean_area_ratio": round(self._ratio_sum / self.frames, 4) if self.frames else None
+        })
+        return m
+
+def load_bbox(path):
+    """bbox dict from a crop_meta.json ({"bbox": {...}}) or a bare {x1,y1,x2,y2} file."""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        j = json.load(f)
+    b = j.get("bbox", j) if isinstance(j, dict) else None
+    if not isinstance(b, dict) or not all(k in b for k in ("x1", "y1", "x2", "y2")):
+        raise ValueError(f"pose_crop: no bbox in {path}")
+    return b
+
+def resolve_crop(spec, frames, size=DEFAULT_SIZE):
+    """
+    PoseCrop for an open frame_store reader, or None for full-frame inference.
+    spec: "" (off), "auto" (HOG person bbox from sampled frames), "track" or a bbox JSON path.
+    "track" follows the golfer per frame (CropTracker), seeded from the HOG box when
+    one is found and from the full frame otherwise.
+    Raises RuntimeError when "auto" finds nobody or the file has no bbox.
+    """
+    if not spec:
+        return None
+    w, h = int(frames.width or 0), int(frames.height or 0)
+    if w <= 0 or h <= 0:
+        first = frames.read(0)
+        if first is None:
+            raise RuntimeError("pose_crop: could not read a frame for the frame size")
+        h, w = first.shape[:2]
+    if spec == "track":
+        from crop_person_hog import person_bbox, detect_person
+        meta = person_bbox(frames, max(1, int(frames.frame_count or 0) // HOG_SAMPLE_N))
+        return CropTracker(meta["bbox"] if meta else None, w, h, size, detect_person,
+                           "track:hog" if meta else "track:full")
+    if spec == "auto":
+        from crop_person_hog import person_bbox
+        meta = person_bbox(frames, max(1, int(frames.frame_count or 0) // HOG_SAMPLE_N))
+        if meta is None:
+            raise RuntimeError("pose_crop: no person box found (subject too small / too dark / extreme angle)")
+        return PoseCrop(meta["bbox"], w, h, size, "hog")
+    if not os.path.exists(spec):
+        raise RuntimeError(f"pose_crop: bbox file not found: {spec}")
+    try:
+        return PoseCrop(load_bbox(spec), w, h, size, os.path.basename(spec))
+    except ValueError as e:
+        raise RuntimeError(str(e))
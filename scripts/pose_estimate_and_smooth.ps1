@@ -5,7 +5,12 @@ param(
   [double]$Alpha = 0.45,
   [int]$MaxGap = 2,
   [double]$VisMin = 0.0,
-  [double]$PresMin = 0.0
+  [double]$PresMin = 0.0,
+  [string]$Mode = "ema",
+  [double]$MaxMissing = -1,
+  [switch]$Adaptive,
+  [switch]$NoCache,
+  [switch]$InProcess
 )
 
 Set-StrictMode -Version Latest
@@ -16,6 +21,10 @@ $VCA_CACHE = [Environment]::GetEnvironmentVariable("VCA_CACHE","User")
 if([string]::IsNullOrWhiteSpace($VCA_CACHE)){ $VCA_CACHE = "E:\VCA\Cache" }
 $OutDir = Join-Path $VCA_CACHE "pose-out"
 New-Item -ItemType Directory -Force $OutDir | Out-Null
+# Decode-once frame store (frame_store.py) next to the other caches, so the pose step and
+# later analysis of the same upload read frames without decoding it again
+if([string]::IsNullOrWhiteSpace($env:VCA_FRAME_CACHE)){ $env:VCA_FRAME_CACHE = Join-Path $VCA_CACHE "frames" }
+$env:VCA_FRAME_STORE = "1"
 
 if(-not (Test-Path $InVideo)){ throw "Missing InVideo: $InVideo" }
 if(-not (Test-Path $ModelTask)){ throw "Missing ModelTask: $ModelTask" }
@@ -24,13 +33,61 @@ $stamp = Get-Date -Format yyyyMMdd_HHmmss
 $rawJson = Join-Path $OutDir ("pose_{0}.json" -f $stamp)
 $smJson  = $rawJson -replace '\.json$', ("_smoothed_a{0}_gap{1}.json" -f ($Alpha.ToString("0.##").Replace('.','')), $MaxGap)
 
+# -InProcess: every stage (plus impact anchor / proxy / P-frames) in one python process,
+# artifacts under pose-out\pose_<stamp>\ with the same file names.
+if($InProcess){
+  $RunDir = Join-Path $OutDir ("pose_{0}" -f $stamp)
+  $plArgs = @("--in", "$InVideo", "--model", "$ModelTask", "--out_dir", "$RunDir", "--name", ("pose_{0}" -f $stamp),
+    "--sample", $Sample, "--alpha", $Alpha, "--max_gap", $MaxGap, "--vis_min", $VisMin, "--pres_min", $PresMin,
+    "--mode", $Mode, "--max_missing", $MaxMissing)
+  if($Adaptive){ $plArgs += "--adaptive" }
+  if($NoCache){ $plArgs += "--no_cache" }
+  Write-Host "`n=== ANALYSIS PIPELINE (in-process) ===" -ForegroundColor Cyan
+  python .\scripts\analysis_pipeline.py @plArgs
+  if($LASTEXITCODE -eq 4){ throw "Pose QC gate failed (see $RunDir)" }
+  if($LASTEXITCODE -ne 0){ throw "analysis_pipeline.py failed (exit $LASTEXITCODE)" }
+  $rawJson = Join-Path $RunDir (Split-Path $rawJson -Leaf)
+  $smJson  = Join-Path $RunDir (Split-Path $smJson -Leaf)
+  $env:VCA_LAST_POSE_RAW = $rawJson
+  $env:VCA_LAST_POSE_SMOOTHED = $smJson
+  [Environment]::SetEnvironmentVariable("VCA_LAST_POSE_RAW", $rawJson, "User")
+  [Environment]::SetEnvironmentVariable("VCA_LAST_POSE_SMOOTHED", $smJson, "User")
+  Write-Host "RAW     : $rawJson" -ForegroundColor Yellow
+  Write-Host "SMOOTHED: $smJson" -ForegroundColor Yellow
+  return
+}
+
 Write-Host "`n=== POSE ESTIMATE (RAW) ===" -ForegroundColor Cyan
 Write-Host "IN : $InVideo" -ForegroundColor Yellow
 Write-Host "OUT: $rawJson" -ForegroundColor Yellow
 Write-Host "SAMPLE: $Sample" -ForegroundColor Yellow
 
+# Result cache (result_cache.py): keys are content hashes of the video / model / script plus
+# the parameters, so re-analyzing the same upload returns the cached artifacts.
+$Cache = ".\scripts\result_cache.py"
+function Invoke-Cached([string]$Kind, [string]$Key, [string]$Out, [string[]]$Cmd){
+  # Out-Host: keep the tools' console output out of the function's return value
+  if($NoCache){
+    & $Cmd[0] $Cmd[1..($Cmd.Length - 1)] | Out-Host
+  } else {
+    python $Cache run --kind $Kind --key $Key --out "$Out" -- @Cmd | Out-Host
+  }
+  return $LASTEXITCODE
+}
+function Get-CacheKey([string[]]$KeyArgs){
+  if($NoCache){ return "" }
+  $k = python $Cache key @KeyArgs
+  if($LASTEXITCODE -ne 0){ throw "result_cache.py key failed" }
+  return "$k".Trim()
+}
+
 $sw = [Diagnostics.Stopwatch]::StartNew()
-python .\scripts\pose_estimate_tasks.py --in "$InVideo" --out "$rawJson" --model "$ModelTask" --sample $Sample
+$estArgs = @("--in", "$InVideo", "--out", "$rawJson", "--model", "$ModelTask", "--sample", $Sample)
+# adaptive: dense only where the body moves fast (non-uniform "i"; use -Mode one_euro to smooth on real times)
+if($Adaptive){ $estArgs += "--adaptive" }
+$rawKey = Get-CacheKey @("--kind", "pose", "--video", "$InVideo", "--model", "$ModelTask",
+  "--dep", ".\scripts\pose_estimate_tasks.py", "--param", "sample=$Sample", "--param", "adaptive=$([int]$Adaptive.IsPresent)")
+$null = Invoke-Cached "pose" $rawKey $rawJson (@("python", ".\scripts\pose_estimate_tasks.py") + $estArgs)
 if(-not (Test-Path $rawJson)){
   throw "Output RAW missing: $rawJson"
 }
@@ -38,10 +95,19 @@ $sw.Stop()
 Write-Host "✅ Raw pose JSON wrote in $($sw.Elapsed.ToString())" -ForegroundColor Green
 
 Write-Host "`n=== QC BEFORE ===" -ForegroundColor Cyan
-python .\scripts\pose_qc.py "$rawJson"
+$qcJson = $rawJson -replace '\.json$', "_qc.json"
+$qcArgs = @("$rawJson", "--json", "$qcJson")
+if($MaxMissing -ge 0){ $qcArgs += @("--max_missing", "$MaxMissing") }
+$qcKey = Get-CacheKey @("--kind", "qc", "--parent", $rawKey, "--dep", ".\scripts\pose_qc.py", "--param", "max_missing=$MaxMissing")
+$qcRc = Invoke-Cached "qc" $qcKey $qcJson (@("python", ".\scripts\pose_qc.py") + $qcArgs)
+if($qcRc -eq 4){
+  throw "Pose QC gate failed (see $qcJson)"
+}
 
 Write-Host "`n=== SMOOTH ===" -ForegroundColor Cyan
-python .\scripts\pose_smooth.py "$rawJson" "$smJson" $Alpha $MaxGap $VisMin $PresMin
+$smKey = Get-CacheKey @("--kind", "smooth", "--parent", $rawKey, "--dep", ".\scripts\pose_smooth.py",
+  "--param", "alpha=$Alpha", "--param", "max_gap=$MaxGap", "--param", "vis_min=$VisMin", "--param", "pres_min=$PresMin", "--param", "mode=$Mode")
+$null = Invoke-Cached "smooth" $smKey $smJson @("python", ".\scripts\pose_smooth.py", "$rawJson", "$smJson", $Alpha, $MaxGap, $VisMin, $PresMin, $Mode)
 if(-not (Test-Path $smJson)){
   throw "Smoothing claimed success but output file missing: $smJson"
 }
@@ -1,26 +1,84 @@
 import argparse, json, os, sys
 import cv2
+import numpy as np
 
-def die(msg):
-    raise SystemExit(msg)
+import instrument
+from frame_store import open_frames, POSE_MAX_SIDE
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--in", dest="in_video", required=True)
-    ap.add_argument("--out", dest="out_json", required=True)
-    ap.add_argument("--model", dest="model_task", required=True)
-    ap.add_argument("--sample", dest="sample", type=int, default=900)
-    args = ap.parse_args()
+# Adaptive sampling (--adaptive):
+#   1. pose on a coarse grid (every --coarse_step frames, default ~30 Hz)
+#   2. per coarse interval, the fastest key landmark sets how densely to fill it in so no
+#      landmark moves more than --max_disp (normalized) between samples; intervals where
+#      pose dropped out fall back to frame-difference energy of the two coarse frames
+#   3. a second VIDEO-mode pass over only the refinement frames
+# Address and finish stay at the coarse rate; the downswing gets (near) every frame.
 
-    in_video = args.in_video
-    out_json = args.out_json
-    model_task = args.model_task
-    sample = max(1, int(args.sample))
+KEY_IDXS = [11, 12, 13, 14, 15, 16, 23, 24]  # shoulders, elbows, wrists, hips
+ENERGY_THUMB_W = 160
 
-    if not os.path.exists(in_video):
-        die(f"Missing input video: {in_video}")
-    if not os.path.exists(model_task):
-        die(f"Missing model task: {model_task}")
+def die(msg):
+    raise SystemExit(msg)
+
+def detect_frame(landmarker, mp, frame_bgr, fi, fps):
+    ts_ms = int(round((fi / fps) * 1000.0))
+    with instrument.span("color"):
+        frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
+    with instrument.span("infer"):
+        res = landmarker.detect_for_video(mp_image, ts_ms)
+
+    lm = []
+    if res.pose_landmarks and len(res.pose_landmarks) > 0:
+        for p in res.pose_landmarks[0]:
+            lm.append({
+                "x": float(p.x), "y": float(p.y), "z": float(getattr(p, "z", 0.0)),
+                "visibility": float(getattr(p, "visibility", 1.0))
+            })
+    return lm
+
+def energy_thumb(frame_bgr):
+    h, w = frame_bgr.shape[:2]
+    s = ENERGY_THUMB_W / float(max(1, w))
+    g = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(g, (ENERGY_THUMB_W, max(1, int(h * s))), interpolation=cv2.INTER_AREA)
+
+def key_xy(lm):
+    if len(lm) <= max(KEY_IDXS):
+        return None
+    return np.array([[lm[k]["x"], lm[k]["y"]] for k in KEY_IDXS], dtype=np.float64)
+
+def plan_refinement(coarse, xy, energy, min_step=1, max_disp=0.01, energy_hi=0.02):
+    """
+    Extra frame indices between consecutive coarse samples.
+    coarse: sorted frame indices; xy: per coarse sample (K, 2) key landmarks or None;
+    energy: per interval frame-difference energy (fraction of changed pixels).
+    Step inside an interval = frames for the fastest key landmark to move max_disp,
+    clamped to [min_step, interval]; intervals without pose at both ends use min_step
+    when their energy is >= energy_hi, else stay coarse.
+    """
+    extra = []
+    for k in range(len(coarse) - 1):
+        a, b = coarse[k], coarse[k + 1]
+        n = b - a
+        if n <= min_step:
+            continue
+        if xy[k] is not None and xy[k + 1] is not None:
+            per_frame = float(np.max(np.linalg.norm(xy[k + 1] - xy[k], axis=1))) / n
+            step = n if per_frame <= 0 else int(max(min_step, min(n, max_disp / per_frame)))
+        else:
+            step = min_step if energy[k] >= energy_hi else n
+        if step < n:
+            extra.extend(range(a + step, b, step))
+    return extra
+
+def estimate(in_video, model_task, sample=900, adaptive=False, coarse_step=0, min_step=1, max_disp=0.01,
+             frames_src=None):
+    """
+    Pose over `sample` evenly spaced frames (or adaptively, see above) -> the JSON payload
+    {"frames": [...], "meta": {...}}. Raises RuntimeError if MediaPipe or the video can't be opened.
+    frames_src: an open frame_store reader to use instead of opening `in_video` (left open).
+    """
+    sample = max(1, int(sample))
 
     # Import MediaPipe Tasks (Pose Landmarker)
     try:
@@ -28,19 +86,21 @@ def main():
         from mediapipe.tasks import python as mp_python
         from mediapipe.tasks.python import vision
     except Exception as e:
-        die("MediaPipe Tasks not available. Install requirements: pip install -r tools/pose/requirements.txt\n" + str(e))
+        raise RuntimeError("MediaPipe Tasks not available. Install requirements: pip install -r tools/pose/requirements.txt\n" + str(e))
 
     BaseOptions = mp.tasks.BaseOptions
     PoseLandmarker = vision.PoseLandmarker
     PoseLandmarkerOptions = vision.PoseLandmarkerOptions
     RunningMode = vision.RunningMode
 
-    cap = cv2.VideoCapture(in_video)
-    if not cap.isOpened():
-        die("Could not open video (cv2.VideoCapture failed). Try remux/re-encode to H.264 MP4.")
+    own_src = frames_src is None
+    try:
+        frames = open_frames(in_video, max_side=POSE_MAX_SIDE) if own_src else frames_src
+    except RuntimeError:
+        raise RuntimeError("Could not open video (cv2.VideoCapture failed). Try remux/re-encode to H.264 MP4.")
 
-    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    fps = frames.fps or 30.0
+    frame_count = int(frames.frame_count or 0)
     if frame_count <= 0:
         # Some codecs don't report count; we can still stream through.
         frame_count = None
@@ -63,67 +123,119 @@ def main():
     )
 
     frames_out = []
-
-    with PoseLandmarker.create_from_options(options) as landmarker:
-        if idxs is not None:
-            for j, fi in enumerate(idxs):
-                cap.set(cv2.CAP_PROP_POS_FRAMES, fi)
-                ok, frame_bgr = cap.read()
-                if not ok:
+    sampling = {"mode": "uniform"}
+
+    def t_of(fi):
+        return (fi / (frame_count-1)) if (frame_count and frame_count > 1) else 0.0
+
+    if adaptive and frame_count:
+        coarse_step = coarse_step if coarse_step > 0 else max(1, int(round(fps / 30.0)))
+        coarse = list(range(0, frame_count, coarse_step))
+        if coarse[-1] != frame_count - 1:
+            coarse.append(frame_count - 1)
+
+        # pass 1: coarse grid (one forward sweep), keeping small gray thumbs for energy
+        got = {}
+        thumbs = {}
+        with PoseLandmarker.create_from_options(options) as landmarker:
+            for fi, frame_bgr in frames.iter_indices(coarse):
+                if frame_bgr is None:
                     continue
-                ts_ms = int(round((fi / fps) * 1000.0))
-                frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
-                res = landmarker.detect_for_video(mp_image, ts_ms)
-
-                lm = []
-                if res.pose_landmarks and len(res.pose_landmarks) > 0:
-                    for p in res.pose_landmarks[0]:
-                        lm.append({
-                            "x": float(p.x), "y": float(p.y), "z": float(getattr(p, "z", 0.0)),
-                            "visibility": float(getattr(p, "visibility", 1.0))
-                        })
-
-                t_norm = (fi / (frame_count-1)) if (frame_count and frame_count > 1) else 0.0
-                frames_out.append({"i": int(fi), "t": float(t_norm), "landmarks": lm})
-        else:
-            fi = 0
-            while fi < sample:
-                ok, frame_bgr = cap.read()
-                if not ok:
-                    break
-                ts_ms = int(round((fi / fps) * 1000.0))
-                frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
-                res = landmarker.detect_for_video(mp_image, ts_ms)
-
-                lm = []
-                if res.pose_landmarks and len(res.pose_landmarks) > 0:
-                    for p in res.pose_landmarks[0]:
-                        lm.append({
-                            "x": float(p.x), "y": float(p.y), "z": float(getattr(p, "z", 0.0)),
-                            "visibility": float(getattr(p, "visibility", 1.0))
-                        })
-
-                frames_out.append({"i": int(fi), "t": float(fi / max(1, sample-1)), "landmarks": lm})
-                fi += 1
-
-    cap.release()
-
-    os.makedirs(os.path.dirname(out_json), exist_ok=True)
-    payload = {
+                got[fi] = detect_frame(landmarker, mp, frame_bgr, fi, fps)
+                thumbs[fi] = energy_thumb(frame_bgr)
+        coarse = [fi for fi in coarse if fi in got]
+
+        from impact_anchor_ball_club import roi_diff_energy
+        energy = []
+        for a, b in zip(coarse, coarse[1:]):
+            g = thumbs[a]
+            energy.append(roi_diff_energy(g, thumbs[b], (0, 0, g.shape[1], g.shape[0])))
+        thumbs.clear()
+        extra = plan_refinement(coarse, [key_xy(got[fi]) for fi in coarse], energy,
+                                max(1, min_step), max_disp)
+
+        # pass 2: refinement frames only, fresh VIDEO-mode tracker (timestamps increase again)
+        with PoseLandmarker.create_from_options(options) as landmarker:
+            for fi, frame_bgr in frames.iter_indices(extra):
+                if frame_bgr is None:
+                    continue
+                got[fi] = detect_frame(landmarker, mp, frame_bgr, fi, fps)
+
+        for fi in sorted(got):
+            frames_out.append({"i": int(fi), "t": float(t_of(fi)), "landmarks": got[fi]})
+        sampling = {
+            "mode": "adaptive",
+            "coarse_step": coarse_step,
+            "min_step": max(1, min_step),
+            "max_disp": max_disp,
+            "coarse_frames": len(coarse),
+            "refined_frames": len(extra),
+            "coverage": round(len(got) / float(frame_count), 4)
+        }
+    else:
+        with PoseLandmarker.create_from_options(options) as landmarker:
+            if idxs is not None:
+                for j, fi in enumerate(idxs):
+                    frame_bgr = frames.read(fi)
+                    if frame_bgr is None:
+                        continue
+                    lm = detect_frame(landmarker, mp, frame_bgr, fi, fps)
+                    frames_out.append({"i": int(fi), "t": float(t_of(fi)), "landmarks": lm})
+            else:
+                for fi, frame_bgr in frames.iter_frames(0, sample):
+                    lm = detect_frame(landmarker, mp, frame_bgr, fi, fps)
+                    frames_out.append({"i": int(fi), "t": float(fi / max(1, sample-1)), "landmarks": lm})
+
+    if own_src:
+        frames.close()
+
+    return {
         "frames": frames_out,
         "meta": {
             "fps": float(fps),
             "frame_count": int(frame_count) if frame_count is not None else None,
             "sample": int(sample),
+            "sampling": sampling,
             "model": os.path.basename(model_task)
         }
     }
-    with open(out_json, "w", encoding="utf-8") as f:
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="in_video", required=True)
+    ap.add_argument("--out", dest="out_json", required=True)
+    ap.add_argument("--model", dest="model_task", required=True)
+    ap.add_argument("--sample", dest="sample", type=int, default=900)
+    ap.add_argument("--adaptive", action="store_true", help="coarse pass + refinement where the body moves fast")
+    ap.add_argument("--coarse_step", type=int, default=0, help="adaptive: coarse grid step in frames (0 = ~30 Hz)")
+    ap.add_argument("--min_step", type=int, default=1, help="adaptive: densest refinement step in frames")
+    ap.add_argument("--max_disp", type=float, default=0.01, help="adaptive: max key-landmark move between samples (normalized)")
+    args = ap.parse_args()
+
+    in_video = args.in_video
+    out_json = args.out_json
+    model_task = args.model_task
+
+    if not os.path.exists(in_video):
+        die(f"Missing input video: {in_video}")
+    if not os.path.exists(model_task):
+        die(f"Missing model task: {model_task}")
+
+    try:
+        payload = estimate(in_video, model_task, args.sample, args.adaptive, args.coarse_step,
+                           args.min_step, args.max_disp)
+    except RuntimeError as e:
+        die(str(e))
+    sampling = payload["meta"]["sampling"]
+    frames_out = payload["frames"]
+
+    os.makedirs(os.path.dirname(out_json), exist_ok=True)
+    with instrument.span("json_write"), open(out_json, "w", encoding="utf-8") as f:
         json.dump(payload, f, ensure_ascii=False)
 
-    print(f"OK wrote: {out_json} frames={len(frames_out)}")
+    extra = f" adaptive coverage={sampling['coverage']}" if sampling["mode"] == "adaptive" else ""
+    print(f"OK wrote: {out_json} frames={len(frames_out)}{extra}")
 
 if __name__ == "__main__":
-    main()
+    with instrument.run("pose_estimate_tasks"):
+        main()
@@ -0,0 +1,195 @@
+import time, queue, threading
+import cv2
+
+import instrument
+
+# Pipelined pose extraction: decode -> preprocess -> infer -> serialize.
+#
+#   producer thread   decode + crop/cvtColor + mp.Image     -> bounded queue (queue_size)
+#   calling thread    detect_for_video (VIDEO mode, in index order)
+#   writer thread     landmark dicts, crop -> full frame, on_frame callback
+#
+# The landmarker is only ever touched from the calling thread, and frames reach it in
+# decode order, so VIDEO-mode timestamps stay strictly increasing. The bounded queues
+# cap memory at queue_size decoded frames per stage.
+#
+# A tracking crop (CropTracker) moves after every frame, so its prepare() has to wait for
+# the previous frame's landmarks: with a dynamic crop the producer only decodes and the
+# crop + colour conversion run next to inference.
+#
+# Stats: per stage busy_sec (doing work), wait_sec (blocked on an empty input or full
+# output queue) and util = busy / wall. The stage with util near 1.0 is the bottleneck.
+
+DEFAULT_QUEUE = 8
+_DONE = object()
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+        self.busy = 0.0
+        self.wait = 0.0
+        self.items = 0
+
+    def stats(self, wall):
+        return {"busy_sec": round(self.busy, 4), "wait_sec": round(self.wait, 4), "items": self.items,
+                "util": round(self.busy / wall, 3) if wall > 0 else None}
+
+class _Abort(Exception):
+    pass
+
+def _put(q, item, abort, stage):
+    t0 = time.perf_counter()
+    while not abort.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            stage.wait += time.perf_counter() - t0
+            return
+        except queue.Full:
+            continue
+    raise _Abort()
+
+def _get(q, abort, stage):
+    t0 = time.perf_counter()
+    while not abort.is_set():
+        try:
+            item = q.get(timeout=0.1)
+            stage.wait += time.perf_counter() - t0
+            return item
+        except queue.Empty:
+            continue
+    raise _Abort()
+
+def run_pipelined(landmarker, frames, every_n, fps, pc=None, on_frame=None, to_dicts=None,
+                  queue_size=DEFAULT_QUEUE):
+    """
+    Same loop as pose_runtime.extract_video, split across three threads.
+    Returns (frames_out, non_empty, last_index, stats).
+    """
+    queue_size = max(1, int(queue_size or DEFAULT_QUEUE))
+    dynamic = bool(pc is not None and getattr(pc, "dynamic", False))
+    in_q = queue.Queue(maxsize=queue_size)
+    out_q = queue.Queue(maxsize=queue_size)
+    abort = threading.Event()   # set by whichever stage fails; the others unwind
+    errors = []
+    st = {k: _Stage(k) for k in ("decode", "preprocess", "infer", "serialize")}
+    last = {"i": -1}
+
+    def producer():
+        try:
+            it = frames.iter_frames()
+            while True:
+                t0 = time.perf_counter()
+                nxt = next(it, None)
+                st["decode"].busy += time.perf_counter() - t0
+                if nxt is None:
+                    break
+                i, frame_bgr = nxt
+                last["i"] = i
+                if (i % every_n) != 0:
+                    continue
+                st["decode"].items += 1
+                img = frame_bgr
+                if not dynamic:
+                    t0 = time.perf_counter()
+                    with instrument.span("color"):
+                        rgb = pc.prepare(frame_bgr) if pc else cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+                    img = landmarker.image(rgb)
+                    st["preprocess"].busy += time.perf_counter() - t0
+                    st["preprocess"].items += 1
+                _put(in_q, (i, img), abort, st["decode"])
+            _put(in_q, _DONE, abort, st["decode"])
+        except _Abort:
+            pass
+        except Exception as e:
+            errors.append(e)
+            abort.set()
+
+    frames_out = []
+    counts = {"non_empty": 0}
+
+    def writer():
+        try:
+            while True:
+                item = _get(out_q, abort, st["serialize"])
+                if item is _DONE:
+                    return
+                t0 = time.perf_counter()
+                i, res, lms, crop = item
+                if lms is None:
+                    lms = []
+                    if res and res.pose_landmarks and len(res.pose_landmarks) > 0:
+                        lms = to_dicts(res.pose_landmarks[0])
+                        if crop:
+                            crop.to_full(lms)
+                if len(lms) > 0:
+                    counts["non_empty"] += 1
+                else:
+                    instrument.count("frames_empty")
+                fr = { "i": i, "t": round(i / fps, 6), "landmarks": lms }
+                frames_out.append(fr)
+                if on_frame is not None:
+                    on_frame(fr)
+                st["serialize"].busy += time.perf_counter() - t0
+                st["serialize"].items += 1
+        except _Abort:
+            pass
+        except Exception as e:
+            errors.append(e)
+            abort.set()
+
+    t_start = time.perf_counter()
+    threads = [threading.Thread(target=producer, name="pose-decode", daemon=True),
+               threading.Thread(target=writer, name="pose-serialize", daemon=True)]
+    for t in threads:
+        t.start()
+
+    try:
+        while True:
+            item = _get(in_q, abort, st["infer"])
+            if item is _DONE:
+                break
+            i, img = item
+            if dynamic:
+                t0 = time.perf_counter()
+                with instrument.span("color"):
+                    img = pc.prepare(img)
+                img = landmarker.image(img)
+                st["preprocess"].busy += time.perf_counter() - t0
+                st["preprocess"].items += 1
+
+            t0 = time.perf_counter()
+            # timestamp must be increasing in ms (frames arrive in decode order)
+            res = landmarker.detect_image(img, int(round((i / fps) * 1000.0)))
+            lms = None
+            crop = pc
+            if dynamic:
+                # the tracker needs this frame's full-frame landmarks before the next prepare()
+                crop = None
+                lms = []
+                if res and res.pose_landmarks and len(res.pose_landmarks) > 0:
+                    lms = pc.to_full(to_dicts(res.pose_landmarks[0]))
+                pc.update(lms)
+            st["infer"].busy += time.perf_counter() - t0
+            st["infer"].items += 1
+            _put(out_q, (i, res, lms, crop), abort, st["infer"])
+        _put(out_q, _DONE, abort, st["infer"])
+    except _Abort:
+        pass
+    except BaseException:
+        abort.set()
+        raise
+    finally:
+        for t in threads:
+            t.join()
+    if errors:
+        raise errors[0]
+
+    wall = time.perf_counter() - t_start
+    stats = {
+        "queue_size": queue_size,
+        "dynamic_crop": dynamic,
+        "wall_sec": round(wall, 4),
+        "fps": round(len(frames_out) / wall, 2) if wall > 0 else None,
+        "stages": {k: s.stats(wall) for k, s in st.items()}
+    }
+    return frames_out, counts["non_empty"], last["i"], stats
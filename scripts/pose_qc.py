@@ -1,92 +1,206 @@
-import json, sys, math
-from statistics import mean
-
-def safe_mean(xs):
-    xs = [x for x in xs if x is not None]
-    return mean(xs) if xs else None
-
-def extract_frames(data):
-    if isinstance(data, dict):
-        if "frames" in data and isinstance(data["frames"], list):
-            return data["frames"]
-        if "pose" in data and isinstance(data["pose"], list):
-            return data["pose"]
-    if isinstance(data, list):
-        return data
-    return None
-
-def main(p):
+import os, json, sys, argparse
+import numpy as np
+
+from pose_array import from_json, load, extract_frames, LANDMARK_NAMES, X, Y, VIS, PRES
+
+# Pose QC on the (T, L, 5) pose array.
+#
+#   python .\scripts\pose_qc.py pose.json                       (summary lines, as before)
+#   python .\scripts\pose_qc.py pose.json --json qc.json        (+ full report as JSON; "-" = stdout)
+#   python .\scripts\pose_qc.py pose.json --max_missing 20      (gate: exit 4 when it fails)
+#
+# Input can also be a pose_array container (.npz / .npy directory).
+
+KEY_IDXS = [15, 16, 23, 24, 27, 28]  # wrists, hips, ankles
+PCTS = (50, 90, 99)
+GATE_FAIL = 4
+
+def _f(x, nd=6):
+    return None if x is None or not np.isfinite(x) else round(float(x), nd)
+
+def _nanmean(a, axis):
+    cnt = np.isfinite(a).sum(axis=axis)
+    return np.where(cnt > 0, np.nansum(a, axis=axis) / np.maximum(cnt, 1), np.nan)
+
+def col_percentiles(a, pcts=PCTS):
+    """
+    Per-column percentiles of a (N, C) ignoring NaN (linear interpolation, like
+    np.percentile) -> (len(pcts), C); NaN for empty columns. One sort for all columns.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    a = np.sort(a.reshape(a.shape[0], int(np.prod(a.shape[1:]))), axis=0)   # NaN sorts last
+    n = np.isfinite(a).sum(axis=0)
+    out = np.full((len(pcts), a.shape[1]), np.nan)
+    if not a.shape[0]:
+        return out
+    cols = np.arange(a.shape[1])
+    for k, p in enumerate(pcts):
+        pos = (p / 100.0) * np.maximum(n - 1, 0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+        frac = pos - lo
+        v = a[lo, cols] + (a[hi, cols] - a[lo, cols]) * frac
+        out[k] = np.where(n > 0, v, np.nan)
+    return out
+
+def _pcts(a):
+    return {f"p{p}": _f(v) for p, v in zip(PCTS, col_percentiles(np.ravel(a)[:, None])[:, 0])}
+
+def gap_histogram(missing):
+    """
+    Lengths of runs of True in `missing` -> ({length: count}, longest).
+    """
+    m = np.concatenate(([0], np.asarray(missing, dtype=np.int8), [0]))
+    d = np.diff(m)
+    runs = np.flatnonzero(d == -1) - np.flatnonzero(d == 1)
+    if not runs.size:
+        return {}, 0
+    lens, counts = np.unique(runs, return_counts=True)
+    return {str(int(l)): int(c) for l, c in zip(lens, counts)}, int(runs.max())
+
+def qc_array(pose, present=None, fps=None):
+    """
+    QC report for pose (T, L, 5). `present` (T,) marks frames that have a landmark list
+    (default: any finite landmark). Velocities/accelerations are |d xy| per frame step
+    in normalized image units, only across consecutive present samples.
+    """
+    pose = np.asarray(pose, dtype=np.float64)
+    T, L = pose.shape[:2]
+    valid = np.isfinite(pose[..., X]) & np.isfinite(pose[..., Y])
+    if present is None:
+        present = valid.any(axis=1)
+    present = np.asarray(present, dtype=bool)
+    n_missing = int((~present).sum())
+
+    with np.errstate(invalid="ignore"):
+        vis = np.where(present[:, None], pose[..., VIS], np.nan)
+        pres = np.where(present[:, None], pose[..., PRES], np.nan)
+        fr_vis = _nanmean(vis, 1)
+        fr_pres = _nanmean(pres, 1)
+        lm_vis = _nanmean(vis, 0)
+        lm_pres = _nanmean(pres, 0)
+
+        xy = np.where(valid[..., None], pose[..., X:Y + 1], np.nan)
+        vel = np.linalg.norm(np.diff(xy, axis=0), axis=-1)               # (T-1, L)
+        acc = np.linalg.norm(np.diff(xy, n=2, axis=0), axis=-1)          # (T-2, L)
+
+    # jitter proxy: summed key-point displacement between consecutive usable frames
+    key_ok = present & (valid[:, KEY_IDXS].all(axis=1) if L > max(KEY_IDXS) else np.zeros(T, dtype=bool))
+    pair = key_ok[1:] & key_ok[:-1]
+    deltas = vel[:, KEY_IDXS].sum(axis=1)[pair] if L > max(KEY_IDXS) else np.zeros(0)
+
+    gaps, longest = gap_histogram(~present)
+    vel_p = col_percentiles(vel)
+    acc_p = col_percentiles(acc)
+    pct_keys = [f"p{p}" for p in PCTS]
+    per_lm = []
+    for j in range(L):
+        per_lm.append({
+            "idx": j,
+            "name": LANDMARK_NAMES[j] if L == len(LANDMARK_NAMES) else str(j),
+            "missing_pct": _f(100.0 * (1.0 - valid[:, j].mean()) if T else None, 2),
+            "visibility": _f(lm_vis[j], 4),
+            "presence": _f(lm_pres[j], 4),
+            "vel": {k: _f(v) for k, v in zip(pct_keys, vel_p[:, j])},
+            "acc": {k: _f(v) for k, v in zip(pct_keys, acc_p[:, j])}
+        })
+
+    vmean = fr_vis[np.isfinite(fr_vis)]
+    pmean = fr_pres[np.isfinite(fr_pres)]
+    return {
+        "frames": int(T),
+        "fps": fps,
+        "missing_frames": n_missing,
+        "missing_pct": round((n_missing / T) * 100, 2) if T else None,
+        "visibility_mean": _f(vmean.mean() if vmean.size else None),
+        "presence_mean": _f(pmean.mean() if pmean.size else None),
+        "jitter_proxy": _f(deltas.mean() if deltas.size else None),
+        "key_vel": _pcts(vel[:, KEY_IDXS][pair]) if deltas.size else _pcts(np.zeros(0)),
+        "key_acc": _pcts(acc[:, KEY_IDXS][key_ok[2:] & key_ok[1:-1] & key_ok[:-2]]) if deltas.size else _pcts(np.zeros(0)),
+        "gaps": {"histogram": gaps, "longest": longest},
+        "landmarks": per_lm,
+        "units": "normalized image coords per frame step"
+    }
+
+def check_gate(rep, max_missing=None, max_jitter=None, min_vis=None):
+    fails = []
+    if max_missing is not None and (rep["missing_pct"] is None or rep["missing_pct"] > max_missing):
+        fails.append(f"missing {rep['missing_pct']}% > {max_missing}%")
+    if max_jitter is not None and rep["jitter_proxy"] is not None and rep["jitter_proxy"] > max_jitter:
+        fails.append(f"jitter {rep['jitter_proxy']:.4f} > {max_jitter}")
+    if min_vis is not None and (rep["visibility_mean"] is None or rep["visibility_mean"] < min_vis):
+        fails.append(f"visibility {rep['visibility_mean']} < {min_vis}")
+    return {"pass": not fails, "fails": fails}
+
+def load_input(p):
+    """
+    (pose array, present mask, fps) from a pose JSON or pose_array container.
+    For JSON a frame counts as present when it has a list of >= 10 landmarks.
+    """
+    if not p.lower().endswith(".json"):
+        pa = load(p)
+        return pa.pose, None, pa.fps()
     with open(p, "r", encoding="utf-8") as f:
         data = json.load(f)
+    return load_data(data)
 
-    frames = extract_frames(data)
+def load_data(data):
+    """(pose array, present mask, fps) from an already parsed pose JSON object."""
+    frames, _ = extract_frames(data)
     if not isinstance(frames, list) or not frames:
-        print("QC: Could not find frames list in JSON.")
+        return None, None, None
+    present = np.array([
+        isinstance(fr, dict) and isinstance(fr.get("landmarks"), list) and len(fr["landmarks"]) >= 10
+        for fr in frames
+    ], dtype=bool)
+    pa = from_json(data, dtype=np.float64)
+    return pa.pose, present, pa.fps()
+
+def main(p, json_out="", max_missing=None, max_jitter=None, min_vis=None):
+    # with --json - stdout carries only the report; the summary lines go to stderr
+    out = sys.stderr if json_out == "-" else sys.stdout
+    if not p or not os.path.exists(p):
+        print("QC: Could not find frames list in JSON.", file=out)
+        return 2
+    pose, present, fps = load_input(p)
+    if pose is None:
+        print("QC: Could not find frames list in JSON.", file=out)
         return 2
 
-    n = len(frames)
-    missing = 0
-    avg_vis = []
-    avg_pres = []
-
-    for fr in frames:
-        lms = fr.get("landmarks") if isinstance(fr, dict) else None
-        if not isinstance(lms, list) or len(lms) < 10:
-            missing += 1
-            continue
-        vis = []
-        pres = []
-        for lm in lms:
-            if isinstance(lm, dict):
-                v = lm.get("visibility")
-                p0 = lm.get("presence")
-                if isinstance(v, (int, float)): vis.append(v)
-                if isinstance(p0, (int, float)): pres.append(p0)
-        avg_vis.append(safe_mean(vis))
-        avg_pres.append(safe_mean(pres))
-
-    miss_pct = round((missing / n) * 100, 2)
-    vmean = safe_mean(avg_vis)
-    pmean = safe_mean(avg_pres)
-
-    print("=== POSE QC ===")
-    print(f"Frames: {n}")
-    print(f"Missing frames: {missing} ({miss_pct}%)")
-    if vmean is not None: print(f"Mean visibility: {vmean:.3f}")
-    if pmean is not None: print(f"Mean presence:   {pmean:.3f}")
-
-    key_idxs = [15,16,23,24,27,28]  # wrists, hips, ankles
-    deltas = []
-    prev = None
-
-    for fr in frames:
-        lms = fr.get("landmarks") if isinstance(fr, dict) else None
-        if not isinstance(lms, list) or len(lms) <= max(key_idxs):
-            prev = None
-            continue
-        cur = []
-        ok = True
-        for i in key_idxs:
-            lm = lms[i]
-            if not isinstance(lm, dict) or "x" not in lm or "y" not in lm:
-                ok = False
-                break
-            cur.append((lm["x"], lm["y"]))
-        if not ok:
-            prev = None
-            continue
-        if prev is not None:
-            d = 0.0
-            for (x0,y0),(x1,y1) in zip(prev,cur):
-                d += math.hypot(x1-x0, y1-y0)
-            deltas.append(d)
-        prev = cur
-
-    if deltas:
-        print(f"Jitter proxy (mean sum keypoint delta): {mean(deltas):.4f}  (lower is better)")
+    rep = qc_array(pose, present, fps)
+    n = rep["frames"]
+    print("=== POSE QC ===", file=out)
+    print(f"Frames: {n}", file=out)
+    print(f"Missing frames: {rep['missing_frames']} ({rep['missing_pct']}%)", file=out)
+    if rep["visibility_mean"] is not None: print(f"Mean visibility: {rep['visibility_mean']:.3f}", file=out)
+    if rep["presence_mean"] is not None: print(f"Mean presence:   {rep['presence_mean']:.3f}", file=out)
+    if rep["jitter_proxy"] is not None:
+        print(f"Jitter proxy (mean sum keypoint delta): {rep['jitter_proxy']:.4f}  (lower is better)", file=out)
     else:
-        print("Jitter proxy: not computed (missing keypoints).")
-    return 0
+        print("Jitter proxy: not computed (missing keypoints).", file=out)
+
+    gated = any(v is not None for v in (max_missing, max_jitter, min_vis))
+    if gated:
+        rep["gate"] = check_gate(rep, max_missing, max_jitter, min_vis)
+        if rep["gate"]["pass"]:
+            print("QC gate: PASS", file=out)
+        else:
+            print("QC gate: FAIL (" + "; ".join(rep["gate"]["fails"]) + ")", file=out)
+
+    if json_out == "-":
+        print(json.dumps(rep))
+    elif json_out:
+        with open(json_out, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+
+    return GATE_FAIL if (gated and not rep["gate"]["pass"]) else 0
 
 if __name__ == "__main__":
-    sys.exit(main(sys.argv[1] if len(sys.argv)>1 else ""))
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pose", nargs="?", default="")
+    ap.add_argument("--json", default="", help="write the full QC report as JSON ('-' = stdout)")
+    ap.add_argument("--max_missing", type=float, default=None, help="gate: max missing-frame %%")
+    ap.add_argument("--max_jitter", type=float, default=None, help="gate: max jitter proxy")
+    ap.add_argument("--min_vis", type=float, default=None, help="gate: min mean visibility")
+    args = ap.parse_args()
+    sys.exit(main(args.pose, args.json, args.max_missing, args.max_jitter, args.min_vis))
@@ -0,0 +1,185 @@
+import os, time
+import cv2
+
+import instrument
+from frame_store import open_frames, POSE_MAX_SIDE
+from pose_crop import resolve_crop, DEFAULT_SIZE
+
+# Shared MediaPipe Tasks runtime for the pose extractors.
+#
+# WarmLandmarker keeps one PoseLandmarker (model + graph) alive across videos so long-lived
+# processes (pose worker, batch pool) only pay the load once. VIDEO mode requires strictly
+# increasing timestamps per landmarker, so every new video is shifted past the previous one.
+
+# confidences used by the VIDEO-mode tracking extractor (pose_estimate_tasks_v2.py)
+DEFAULT_CONF = {"det": 0.35, "pres": 0.35, "track": 0.35}
+# timestamp gap between videos on a reused landmarker (forces a fresh detection)
+VIDEO_GAP_MS = 10_000
+
+def load_tasks():
+    try:
+        import mediapipe as mp
+        from mediapipe.tasks import python as mp_python
+        from mediapipe.tasks.python import vision
+    except Exception as e:
+        raise RuntimeError("MediaPipe Tasks not available. Install requirements: pip install -r tools/pose/requirements.txt\n" + str(e))
+    return mp, mp_python, vision
+
+def landmarks_to_dicts(lms):
+    return [
+        {
+            "x": float(lm.x),
+            "y": float(lm.y),
+            "z": float(lm.z),
+            "visibility": float(getattr(lm, "visibility", 0.0))
+        } for lm in lms
+    ]
+
+class WarmLandmarker:
+    """
+    VIDEO-mode PoseLandmarker reused across videos. Call next_video() before each clip;
+    detect() takes the clip-local timestamp and applies the running offset.
+    """
+    def __init__(self, model_task, conf=None):
+        self.mp, mp_python, vision = load_tasks()
+        self.model_task = str(model_task)
+        self.conf = dict(conf or DEFAULT_CONF)
+        t0 = time.time()
+        options = vision.PoseLandmarkerOptions(
+            base_options=mp_python.BaseOptions(model_asset_path=self.model_task),
+            running_mode=vision.RunningMode.VIDEO,
+            num_poses=1,
+            min_pose_detection_confidence=self.conf["det"],
+            min_pose_presence_confidence=self.conf["pres"],
+            min_tracking_confidence=self.conf["track"],
+            output_segmentation_masks=False
+        )
+        self.landmarker = vision.PoseLandmarker.create_from_options(options)
+        self.load_sec = time.time() - t0
+        self.videos = 0
+        self._offset_ms = 0
+        self._last_ms = -1
+
+    def next_video(self):
+        if self._last_ms >= 0:
+            self._offset_ms = self._last_ms + VIDEO_GAP_MS
+        self.videos += 1
+
+    def image(self, frame_rgb):
+        with instrument.span("mp_image"):
+            return self.mp.Image(image_format=self.mp.ImageFormat.SRGB, data=frame_rgb)
+
+    def detect(self, frame_rgb, ts_ms):
+        return self.detect_image(self.image(frame_rgb), ts_ms)
+
+    def detect_image(self, mp_image, ts_ms):
+        ts = self._offset_ms + int(ts_ms)
+        if ts <= self._last_ms:
+            ts = self._last_ms + 1
+        self._last_ms = ts
+        with instrument.span("infer"):
+            return self.landmarker.detect_for_video(mp_image, ts)
+
+    def close(self):
+        if self.landmarker is not None:
+            self.landmarker.close()
+            self.landmarker = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def extract_video(landmarker, video, every_n=1, on_frame=None, crop="", crop_size=DEFAULT_SIZE,
+                  pipeline=0, frames_src=None):
+    """
+    Every-Nth-frame pose over one video with a WarmLandmarker.
+    Returns the pose_estimate_tasks_v2.py payload: {"frames": [...], "meta": {...}}.
+    on_frame(frame) is called as each frame is produced (e.g. a streaming smoother).
+    crop: "" (full frame), "auto", "track" or a bbox JSON path -> crop-aware inference (pose_crop.py);
+    landmarks are still written in full-frame normalized coordinates.
+    pipeline: queue depth for the threaded decode/infer/serialize runner (pose_pipeline.py);
+    0 runs everything on the calling thread. The payload is the same either way.
+    frames_src: an open frame_store reader to use instead of opening `video` (left open),
+    e.g. a WindowFrames over one swing of a session. Without a crop an own reader may be a
+    POSE_MAX_SIDE store; crops work in source pixels (bbox files) and keep full resolution.
+    """
+    every_n = max(1, int(every_n or 1))
+    own_src = frames_src is None
+    frames = open_frames(str(video), max_side=0 if crop else POSE_MAX_SIDE) if own_src else frames_src
+    fps = float(frames.fps or 30.0)
+    frame_count = int(frames.frame_count or 0)
+    try:
+        pc = resolve_crop(crop, frames, crop_size)
+    except RuntimeError:
+        if own_src:
+            frames.close()
+        raise
+
+    landmarker.next_video()
+    if pipeline:
+        from pose_pipeline import run_pipelined
+        try:
+            frames_out, non_empty, i, stats = run_pipelined(landmarker, frames, every_n, fps, pc, on_frame,
+                                                            landmarks_to_dicts, pipeline)
+        finally:
+            if own_src:
+                frames.close()
+        return _payload(landmarker, frames_out, non_empty, i, fps, frame_count, every_n, pc, stats)
+
+    frames_out = []
+    non_empty = 0
+    i = -1
+    for i, frame_bgr in frames.iter_frames():
+        if (i % every_n) != 0:
+            continue
+
+        with instrument.span("color"):
+            frame_rgb = pc.prepare(frame_bgr) if pc else cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+
+        # timestamp must be increasing in ms
+        ts_ms = int(round((i / fps) * 1000.0))
+        res = landmarker.detect(frame_rgb, ts_ms)
+
+        lms = []
+        if res and res.pose_landmarks and len(res.pose_landmarks) > 0:
+            # first person only
+            lms = landmarks_to_dicts(res.pose_landmarks[0])
+            if pc:
+                pc.to_full(lms)
+        if pc:
+            pc.update(lms)
+
+        if len(lms) > 0:
+            non_empty += 1
+        else:
+            instrument.count("frames_empty")
+
+        fr = { "i": i, "t": round(i / fps, 6), "landmarks": lms }
+        frames_out.append(fr)
+        if on_frame is not None:
+            on_frame(fr)
+    if own_src:
+        frames.close()
+    return _payload(landmarker, frames_out, non_empty, i, fps, frame_count, every_n, pc)
+
+def _payload(landmarker, frames_out, non_empty, last_i, fps, frame_count, every_n, pc, pipeline=None):
+    if frame_count <= 0:
+        # container didn't report a count: use what we decoded
+        frame_count = last_i + 1
+
+    meta = {
+        "fps": fps,
+        "frame_count": frame_count,
+        "sample": every_n,
+        "model": os.path.basename(landmarker.model_task),
+        "non_empty": non_empty,
+        "total_frames_written": len(frames_out),
+        "running_mode": "VIDEO",
+        "conf": dict(landmarker.conf),
+        "crop": pc.meta() if pc else None
+    }
+    if pipeline is not None:
+        meta["pipeline"] = pipeline
+    return { "frames": frames_out, "meta": meta }
@@ -1,65 +1,379 @@
-import json, sys
-from copy import deepcopy
+import os, json, sys
+import numpy as np
+from collections import deque
 
-def is_num(x):
-    return isinstance(x, (int, float))
+from pose_array import from_json, extract_frames, landmarks_row, CHANNELS, LM_COUNT, X, Y, Z, VIS, PRES
 
-def lerp(a, b, t):
-    return a + (b - a) * t
+# Pose smoothing on a (T, L, 5) array: NaN marks a missing sample, short interior gaps
+# are interpolated and every landmark series is EMA'd at once.
+
+def fill_short_gaps(vals, max_gap):
+    """
+    Linear fill of interior NaN runs of length <= max_gap, along axis 0.
+    Runs touching either end are left as NaN.
+    """
+    out = np.array(vals, dtype=np.float64)
+    T = out.shape[0]
+    miss = np.isnan(out)
+    if T == 0 or not miss.any() or max_gap <= 0:
+        return out
+
+    t = np.arange(T).reshape((T,) + (1,) * (out.ndim - 1))
+    # last valid index at/before k and first valid index at/after k
+    prev_i = np.maximum.accumulate(np.where(miss, -1, t), axis=0)
+    next_i = np.flip(np.minimum.accumulate(np.flip(np.where(miss, T, t), axis=0), axis=0), axis=0)
+    fill = miss & (prev_i >= 0) & (next_i < T) & ((next_i - prev_i - 1) <= max_gap)
+    at = np.nonzero(fill)
+    if not at[0].size:
+        return out
+
+    k, rest = at[0], at[1:]
+    pi, ni = prev_i[at], next_i[at]
+    a, b = out[(pi,) + rest], out[(ni,) + rest]
+    out[at] = a + (b - a) * ((k - pi) / (ni - pi))
+    return out
 
 def ema(vals, alpha):
-    out = []
-    prev = None
-    for v in vals:
-        if v is None:
-            out.append(None)
-            continue
-        if prev is None:
-            prev = v
-        else:
-            prev = alpha * v + (1 - alpha) * prev
-        out.append(prev)
+    """
+    Causal EMA along axis 0; alpha broadcasts over the trailing axes.
+    NaN samples stay NaN and don't reset the running value.
+    """
+    x = np.asarray(vals, dtype=np.float64)
+    alpha = np.broadcast_to(np.asarray(alpha, dtype=np.float64), x.shape[1:])
+    ok = ~np.isnan(x)
+    if x.shape[0] == 0:
+        return x.copy()
+
+    # prev <- ax[k] + b[k] * prev, with (ax, b) = (0, 1) on missing samples (hold) and
+    # ax = x on each series' first sample (prev starts at 0, so it seeds exactly)
+    ax = np.where(ok, alpha * np.nan_to_num(x), 0.0)
+    b = np.where(ok, 1 - alpha, 1.0)
+    first = ok & (np.cumsum(ok, axis=0) == 1)
+    ax[first] = x[first]
+
+    out = np.empty_like(x)
+    prev = np.zeros(x.shape[1:])
+    for k in range(x.shape[0]):
+        np.multiply(b[k], prev, out=prev)
+        prev += ax[k]
+        out[k] = prev
+    out[~ok] = np.nan
     return out
 
-def fill_short_gaps(vals, max_gap):
-    out = vals[:]
-    n = len(out)
-    i = 0
-    while i < n:
-        if out[i] is not None:
-            i += 1
-            continue
-        start = i - 1
-        j = i
-        while j < n and out[j] is None:
-            j += 1
-        end = j
-        gap = end - i
-        if start >= 0 and end < n and gap <= max_gap and out[start] is not None and out[end] is not None:
-            for k in range(i, end):
-                t = (k - start) / (end - start)
-                out[k] = lerp(out[start], out[end], t)
-        i = end
+def fb_ema(vals, alpha):
+    """
+    Forward-backward EMA: zero-phase (no lag), roughly twice the smoothing of one pass.
+    """
+    return ema(ema(vals, alpha)[::-1], alpha)[::-1]
+
+def savgol_coeffs(window, order):
+    half = window // 2
+    A = np.vander(np.arange(-half, half + 1, dtype=np.float64), order + 1, increasing=True)
+    return np.linalg.pinv(A)[0]
+
+def savgol(vals, window=9, order=2):
+    """
+    Savitzky-Golay along axis 0 (centered least-squares polynomial, zero-phase).
+    Ends are edge-padded; samples whose window touches a NaN are passed through unsmoothed.
+    """
+    x = np.asarray(vals, dtype=np.float64)
+    window = max(3, int(window) | 1)
+    order = max(0, min(int(order), window - 1))
+    if x.shape[0] < window:
+        return x.copy()
+    half = window // 2
+    pad = [(half, half)] + [(0, 0)] * (x.ndim - 1)
+    win = np.lib.stride_tricks.sliding_window_view(np.pad(x, pad, mode="edge"), window, axis=0)
+    out = win @ savgol_coeffs(window, order)
+    bad = np.isnan(out)
+    out[bad] = x[bad]
     return out
 
-def extract_frames(data):
-    if isinstance(data, dict):
-        if "frames" in data and isinstance(data["frames"], list):
-            return data["frames"], "frames"
-        if "pose" in data and isinstance(data["pose"], list):
-            return data["pose"], "pose"
-    if isinstance(data, list):
-        return data, None
-    return None, None
-
-def main(inp, outp, alpha=0.35, max_gap=2, vis_min=0.0, pres_min=0.0):
-    with open(inp, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def one_euro(vals, t_sec, min_cutoff=1.0, beta=25.0, d_cutoff=1.0):
+    """
+    One-Euro filter along axis 0: an EMA whose cutoff rises with the (smoothed) speed,
+    so slow phases are smoothed hard and fast ones (release, impact) track with little lag.
+    t_sec (T,) is each sample's time; NaN samples are held over like ema().
+    Speeds are in normalized image units per second (a fast swing is ~1-5/s), so beta is
+    far larger than the pixel-space values usually quoted (~0.01-0.3).
+    """
+    x = np.asarray(vals, dtype=np.float64)
+    t_sec = np.asarray(t_sec, dtype=np.float64)
+
+    def alpha_for(cutoff, dt):
+        r = 2.0 * np.pi * cutoff * dt
+        return r / (r + 1.0)
+
+    out = np.full_like(x, np.nan)
+    x_hat = np.full(x.shape[1:], np.nan)
+    dx_hat = np.zeros(x.shape[1:])
+    t_last = np.full(x.shape[1:], np.nan)
+    with np.errstate(invalid="ignore"):
+        for k in range(x.shape[0]):
+            v = x[k]
+            ok = ~np.isnan(v)
+            upd = ok & ~np.isnan(x_hat)
+            dt = np.where(upd, np.maximum(t_sec[k] - t_last, 1e-6), 1.0)
+            a_d = alpha_for(d_cutoff, dt)
+            dx = a_d * ((v - x_hat) / dt) + (1.0 - a_d) * dx_hat
+            a = alpha_for(min_cutoff + beta * np.abs(dx), dt)
+            x_new = a * v + (1.0 - a) * x_hat
+            x_hat = np.where(upd, x_new, np.where(ok, v, x_hat))
+            dx_hat = np.where(upd, dx, dx_hat)
+            t_last = np.where(ok, t_sec[k], t_last)
+            out[k] = np.where(ok, x_hat, np.nan)
+    return out
+
+# mode -> default params (overridable as mode:p1:p2 on the command line)
+MODES = {
+    "ema": {},
+    "fb_ema": {},
+    "savgol": {"window": 9, "order": 2},
+    "one_euro": {"min_cutoff": 1.0, "beta": 25.0}
+}
+
+def parse_mode(spec):
+    """
+    'savgol:11:3' -> ("savgol", {"window": 11, "order": 3})
+    """
+    parts = str(spec or "ema").split(":")
+    mode = parts[0].strip().lower() or "ema"
+    if mode not in MODES:
+        raise ValueError(f"unknown smoothing mode: {mode} (expected one of {', '.join(MODES)})")
+    params = dict(MODES[mode])
+    for name, v in zip(list(params), parts[1:]):
+        if v != "":
+            params[name] = type(params[name])(float(v))
+    return mode, params
+
+def gate(pose, vis_min=0.0, pres_min=0.0):
+    """
+    Copy of pose with x/y/z of samples failing the visibility/presence gate set to NaN.
+    """
+    p = np.array(pose, dtype=np.float64)
+    vis = p[..., VIS]
+    pres = p[..., PRES]
+    ok_vis = np.where(np.isnan(vis), vis_min <= 0.0, vis >= vis_min)
+    ok_pre = np.where(np.isnan(pres), pres_min <= 0.0, pres >= pres_min)
+    p[..., X:Z + 1][~(ok_vis & ok_pre)] = np.nan
+    return p
+
+def smooth_array(pose, alpha=0.35, max_gap=2, vis_min=0.0, pres_min=0.0, mode="ema", params=None, t_sec=None):
+    """
+    pose (T, L, 5) -> smoothed copy. x/y/z samples failing the visibility/presence gate
+    are treated as missing and smoothed with `mode`; visibility/presence always use a
+    causal EMA with min(0.15, alpha). one_euro needs t_sec (defaults to 30 fps).
+    """
+    p = fill_short_gaps(gate(pose, vis_min, pres_min), max_gap)
+    prm = dict(MODES[mode])
+    prm.update(params or {})
+
+    out = np.empty_like(p)
+    out[..., VIS:] = ema(p[..., VIS:], min(0.15, alpha))
+    xyz = p[..., X:Z + 1]
+    if mode == "ema":
+        out[..., X:Z + 1] = ema(xyz, alpha)
+    elif mode == "fb_ema":
+        out[..., X:Z + 1] = fb_ema(xyz, alpha)
+    elif mode == "savgol":
+        out[..., X:Z + 1] = savgol(xyz, prm["window"], prm["order"])
+    elif mode == "one_euro":
+        if t_sec is None:
+            t_sec = np.arange(p.shape[0]) / 30.0
+        out[..., X:Z + 1] = one_euro(xyz, t_sec, prm["min_cutoff"], prm["beta"])
+    else:
+        raise ValueError(f"unknown smoothing mode: {mode}")
+    return out
+
+def smoothing_stats(raw, sm, dt_sec=None):
+    """
+    Lag / jitter of smoothed vs raw x,y (raw = gated, unfilled).
+    jitter: mean |second difference| per landmark sample (normalized units).
+    lag: delay (samples) of smoothed behind a zero-phase reference of raw.
+    """
+    r = np.asarray(raw, dtype=np.float64)[..., X:Y + 1]
+    s = np.asarray(sm, dtype=np.float64)[..., X:Y + 1]
+    ok = ~np.isnan(r) & ~np.isnan(s)
+
+    def jitter(a):
+        d2 = a[2:] - 2 * a[1:-1] + a[:-2]
+        m = ok[2:] & ok[1:-1] & ok[:-2]
+        return float(np.abs(d2[m]).mean()) if m.any() else None
+
+    stats = {"jitter_raw": jitter(r), "jitter": jitter(s)}
+    if stats["jitter_raw"]:
+        stats["jitter_reduction"] = round(1.0 - (stats["jitter"] or 0.0) / stats["jitter_raw"], 4)
+
+    # first-order delay fit against a zero-phase (Savitzky-Golay) reference of raw:
+    # s(t) ~ ref(t - lag)  =>  s - ref ~ -lag * ref'(t), least squares over valid samples.
+    # positive lag = smoothed trails raw
+    ref = savgol(fill_short_gaps(r, 8), 9, 2)
+    vel = np.gradient(ref, axis=0) if ref.shape[0] > 1 else np.zeros_like(ref)
+    m = ok & ~np.isnan(ref) & ~np.isnan(vel)
+    den = float((vel[m] ** 2).sum())
+    best = float(-((s[m] - ref[m]) * vel[m]).sum() / den) if den > 0 else 0.0
+    stats["lag_frames"] = round(best, 3)
+    if dt_sec:
+        stats["lag_ms"] = round(best * dt_sec * 1000.0, 2)
+    return stats
+
+def smoothed_frame(fr, lm_count, vals, has, meta):
+    """
+    Output frame: source landmark dicts with smoothed channels written over them
+    (vals/has are per-landmark lists from the smoothed row), plus the "smoothed" block.
+    """
+    src = fr.get("landmarks")
+    src_ok = isinstance(src, list) and len(src) == lm_count
+    lms_out = []
+    for i in range(lm_count):
+        orig = src[i] if (src_ok and isinstance(src[i], dict)) else {}
+        lm1 = dict(orig)
+        for c, d in enumerate(CHANNELS):
+            if has[i][c]:
+                lm1[d] = vals[i][c]
+        lms_out.append(lm1)
+    fr = dict(fr)
+    fr["landmarks"] = lms_out
+    fr["smoothed"] = dict(meta)
+    return fr
+
+# ---------------- streaming ----------------
+
+class StreamingSmoother:
+    """
+    Online version of the default (ema) smoothing for use inside the extractors.
+    push() one frame dict at a time; smoothed frames come back max_gap frames later
+    (the look-ahead a short gap needs before it can be filled). flush() at the end.
+    Output matches pose_smooth.py ema mode on the same frames; memory is O(max_gap).
+    """
+    def __init__(self, alpha=0.35, max_gap=2, vis_min=0.0, pres_min=0.0, lm_count=LM_COUNT):
+        self.alpha = alpha
+        self.max_gap = max(0, int(max_gap))
+        self.vis_min = vis_min
+        self.pres_min = pres_min
+        self.lm_count = lm_count
+        self.meta = {"alpha": alpha, "max_gap": self.max_gap, "vis_min": vis_min, "pres_min": pres_min, "mode": "ema"}
+        shape = (lm_count, len(CHANNELS))
+        self._alphas = np.array([alpha, alpha, alpha, min(0.15, alpha), min(0.15, alpha)])
+        self._buf = deque()                       # (frame, gated row) awaiting look-ahead
+        self._k = 0                               # stream index of the next frame to emit
+        self._last_val = np.full(shape, np.nan)   # last valid raw sample per series
+        self._last_k = np.full(shape, -1)         # ... and its stream index
+        self._prev = np.zeros(shape)              # EMA state
+        self._seen = np.zeros(shape, dtype=bool)
+
+    @property
+    def delay(self):
+        return self.max_gap
+
+    def push(self, frame):
+        if not isinstance(frame, dict):
+            frame = {"landmarks": frame}
+        row = landmarks_row(frame.get("landmarks"), self.lm_count)
+        p = np.full((self.lm_count, len(CHANNELS)), np.nan) if row is None else np.array(row, dtype=np.float64)
+        self._buf.append((frame, gate(p, self.vis_min, self.pres_min)))
+        out = []
+        while len(self._buf) > self.max_gap:
+            out.append(self._emit())
+        return out
+
+    def flush(self):
+        out = []
+        while self._buf:
+            out.append(self._emit())
+        return out
+
+    def _emit(self):
+        fr, x = self._buf[0]
+        k = self._k
+        miss = np.isnan(x)
+        raw_ok = ~miss
+        x = x.copy()
+        if miss.any() and len(self._buf) > 1 and self.max_gap > 0:
+            # first valid sample ahead of k, within the look-ahead window
+            ahead = np.stack([r for _, r in list(self._buf)[1:]])
+            ok_ahead = ~np.isnan(ahead)
+            has_next = ok_ahead.any(axis=0)
+            j = np.argmax(ok_ahead, axis=0)
+            ni = k + 1 + j
+            pi = self._last_k
+            fill = miss & has_next & (pi >= 0) & ((ni - pi - 1) <= self.max_gap)
+            if fill.any():
+                a = self._last_val[fill]
+                b = np.take_along_axis(ahead, j[None], axis=0)[0][fill]
+                x[fill] = a + (b - a) * ((k - pi[fill]) / (ni[fill] - pi[fill]))
+
+        self._last_val[raw_ok] = x[raw_ok]
+        self._last_k[raw_ok] = k
+
+        ok = ~np.isnan(x)
+        ax = np.where(ok, self._alphas * np.nan_to_num(x), 0.0)
+        first = ok & ~self._seen
+        ax[first] = x[first]
+        np.multiply(np.where(ok, 1 - self._alphas, 1.0), self._prev, out=self._prev)
+        self._prev += ax
+        self._seen |= ok
+
+        self._buf.popleft()
+        self._k += 1
+        return smoothed_frame(fr, self.lm_count, self._prev.tolist(), ok.tolist(), self.meta)
+
+class SmoothedJsonWriter:
+    """
+    Streams smoothed frames straight to disk: {"frames": [...], "meta": ..., "smoothed": ...}
+    in the same layout json.dump gives pose_smooth.py. Written to <path>.part and renamed
+    on close(), so a failed extraction never leaves a half file behind.
+    """
+    def __init__(self, path, smoother=None):
+        self.path = str(path)
+        self.smoother = smoother or StreamingSmoother()
+        self.count = 0
+        d = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(d, exist_ok=True)
+        self._f = open(self.path + ".part", "w", encoding="utf-8")
+        self._f.write('{"frames": [')
+
+    def _write(self, frames):
+        for fr in frames:
+            self._f.write((", " if self.count else "") + json.dumps(fr))
+            self.count += 1
+
+    def push(self, frame):
+        self._write(self.smoother.push(frame))
+
+    def close(self, meta=None):
+        self._write(self.smoother.flush())
+        self._f.write("]")
+        if meta is not None:
+            self._f.write(', "meta": ' + json.dumps(meta))
+        self._f.write(', "smoothed": ' + json.dumps(dict(self.smoother.meta, streaming=True)) + "}")
+        self._f.close()
+        os.replace(self.path + ".part", self.path)
+
+    def abort(self):
+        if not self._f.closed:
+            self._f.close()
+        if os.path.exists(self.path + ".part"):
+            os.remove(self.path + ".part")
+
+class SmoothError(ValueError):
+    def __init__(self, msg, code=2):
+        super().__init__(msg)
+        self.code = code
+
+def smooth_data(data, alpha=0.35, max_gap=2, vis_min=0.0, pres_min=0.0, mode="ema"):
+    """
+    Parsed pose JSON -> (smoothed JSON object, stats, mode name). Raises SmoothError
+    (code 2: bad mode / no frames, 3: no landmarks).
+    """
+    try:
+        mode, params = parse_mode(mode)
+    except ValueError as e:
+        raise SmoothError(str(e))
 
     frames, key = extract_frames(data)
     if not isinstance(frames, list) or not frames:
-        print("Could not find frames list.")
-        return 2
+        raise SmoothError("Could not find frames list.")
 
     # normalize to dict frames with "landmarks"
     norm = []
@@ -77,85 +391,52 @@ def main(inp, outp, alpha=0.35, max_gap=2, vis_min=0.0, pres_min=0.0):
             lm_count = len(lms)
             break
     if lm_count is None:
-        print("No landmarks found.")
-        return 3
-
-    dims = ["x","y","z"]
-    aux  = ["visibility","presence"]
+        raise SmoothError("No landmarks found.", 3)
 
-    # collect series
-    series = {(i,d): [] for i in range(lm_count) for d in (dims+aux)}
+    pa = from_json(data, dtype=np.float64, lm_count=lm_count)
+    fps = pa.fps() or 30.0
+    t_sec = pa.i / fps
+    sm = smooth_array(pa.pose, alpha, max_gap, vis_min, pres_min, mode, params, t_sec)
+    dt_sec = float(np.median(np.diff(t_sec))) if len(t_sec) > 1 else None
+    stats = smoothing_stats(gate(pa.pose, vis_min, pres_min), sm, dt_sec)
+    has = ~np.isnan(sm)
+    sm_list = sm.tolist()
+    has_list = has.tolist()
 
-    for fr in norm:
-        lms = fr.get("landmarks")
-        if not isinstance(lms, list) or len(lms) != lm_count:
-            for i in range(lm_count):
-                for d in (dims+aux):
-                    series[(i,d)].append(None)
-            continue
-
-        for i,lm in enumerate(lms):
-            if not isinstance(lm, dict):
-                for d in (dims+aux):
-                    series[(i,d)].append(None)
-                continue
-
-            vis = lm.get("visibility")
-            pres = lm.get("presence")
-            ok_vis = (is_num(vis) and vis >= vis_min) if vis is not None else (vis_min <= 0.0)
-            ok_pre = (is_num(pres) and pres >= pres_min) if pres is not None else (pres_min <= 0.0)
-            ok = ok_vis and ok_pre
-
-            for d in dims:
-                v = lm.get(d)
-                series[(i,d)].append(v if (ok and is_num(v)) else None)
-            for d in aux:
-                v = lm.get(d)
-                series[(i,d)].append(v if is_num(v) else None)
-
-    # smooth
-    sm = {}
-    for (i,d), vals in series.items():
-        vals2 = fill_short_gaps(vals, max_gap=max_gap)
-        a = alpha if d in dims else min(0.15, alpha)
-        sm[(i,d)] = ema(vals2, a)
-
-    # rebuild frames
-    out_frames = []
-    n = len(norm)
-    for fi in range(n):
-        fr = deepcopy(norm[fi])
-        lms_out = []
-        for i in range(lm_count):
-            orig = {}
-            if isinstance(fr.get("landmarks"), list) and len(fr["landmarks"])==lm_count and isinstance(fr["landmarks"][i], dict):
-                orig = fr["landmarks"][i]
-            lm1 = dict(orig)
-            for d in dims + aux:
-                v = sm[(i,d)][fi]
-                if v is None:
-                    continue
-                lm1[d] = float(v)
-            lms_out.append(lm1)
-        fr["landmarks"] = lms_out
-        fr["smoothed"] = {"alpha": alpha, "max_gap": max_gap, "vis_min": vis_min, "pres_min": pres_min}
-        out_frames.append(fr)
+    meta = {"alpha": alpha, "max_gap": max_gap, "vis_min": vis_min, "pres_min": pres_min, "mode": mode}
+    meta.update(params)
+    out_frames = [smoothed_frame(fr, lm_count, sm_list[fi], has_list[fi], meta) for fi, fr in enumerate(norm)]
 
     if isinstance(data, dict) and key:
         out_data = dict(data)
         out_data[key] = out_frames
+        out_data["smoothed"] = dict(meta, stats=stats)
     else:
         out_data = out_frames
+    return out_data, stats, mode
+
+def main(inp, outp, alpha=0.35, max_gap=2, vis_min=0.0, pres_min=0.0, mode="ema"):
+    with open(inp, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    try:
+        out_data, stats, mode = smooth_data(data, alpha, max_gap, vis_min, pres_min, mode)
+    except SmoothError as e:
+        print(str(e))
+        return e.code
+    out_frames, _ = extract_frames(out_data)
 
     with open(outp, "w", encoding="utf-8") as f:
         json.dump(out_data, f)
 
-    print(f"OK wrote: {outp}  frames:{len(out_frames)}  alpha:{alpha}  max_gap:{max_gap}  vis_min:{vis_min}  pres_min:{pres_min}")
+    print(f"OK wrote: {outp}  frames:{len(out_frames)}  mode:{mode}  alpha:{alpha}  max_gap:{max_gap}  vis_min:{vis_min}  pres_min:{pres_min}")
+    print("  " + "  ".join(f"{k}:{v}" for k, v in stats.items()))
     return 0
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print("usage: pose_smooth.py in.json out.json [alpha] [max_gap] [vis_min] [pres_min]")
+        print("usage: pose_smooth.py in.json out.json [alpha] [max_gap] [vis_min] [pres_min] [mode]")
+        print("  mode: ema (default) | fb_ema | savgol[:window[:order]] | one_euro[:min_cutoff[:beta]]")
         sys.exit(2)
     inp = sys.argv[1]
     outp = sys.argv[2]
@@ -163,4 +444,5 @@ if __name__ == "__main__":
     max_gap = int(sys.argv[4]) if len(sys.argv)>4 else 2
     vis_min = float(sys.argv[5]) if len(sys.argv)>5 else 0.0
     pres_min = float(sys.argv[6]) if len(sys.argv)>6 else 0.0
-    sys.exit(main(inp, outp, alpha=alpha, max_gap=max_gap, vis_min=vis_min, pres_min=pres_min))
+    mode = sys.argv[7] if len(sys.argv)>7 else "ema"
+    sys.exit(main(inp, outp, alpha=alpha, max_gap=max_gap, vis_min=vis_min, pres_min=pres_min, mode=mode))
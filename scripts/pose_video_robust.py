@@ -4,6 +4,10 @@ import mediapipe as mp
 from mediapipe.tasks import python as mp_python
 from mediapipe.tasks.python import vision
 
+import instrument
+from pose_smooth import StreamingSmoother, SmoothedJsonWriter
+from pose_crop import resolve_crop, DEFAULT_SIZE
+
 def die(msg):
     print(msg, file=sys.stderr)
     sys.exit(1)
@@ -15,6 +19,12 @@ def main():
     ap.add_argument("--out", dest="out", required=True)
     ap.add_argument("--model", dest="model", required=True)
     ap.add_argument("--sample", dest="sample", type=int, default=1)
+    ap.add_argument("--smooth_out", default="", help="also write EMA-smoothed JSON in the same pass")
+    ap.add_argument("--smooth_alpha", type=float, default=0.35)
+    ap.add_argument("--smooth_max_gap", type=int, default=2)
+    ap.add_argument("--smooth_vis_min", type=float, default=0.0)
+    ap.add_argument("--crop", default="", help="crop-aware inference: 'auto' (HOG person bbox), 'track' (follow the golfer) or a bbox JSON")
+    ap.add_argument("--crop_size", type=int, default=DEFAULT_SIZE, help="long side of the crop fed to the model")
     args = ap.parse_args()
 
     vid = args.vid
@@ -33,6 +43,16 @@ def main():
     fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
     frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
 
+    crop = None
+    if args.crop:
+        from frame_store import open_frames
+        try:
+            with open_frames(vid) as fr:
+                crop = resolve_crop(args.crop, fr, args.crop_size)
+        except RuntimeError as e:
+            die(f"❌ {e}")
+        print(f"crop: {crop.meta()}")
+
     base = mp_python.BaseOptions(model_asset_path=model_path)
     opts = vision.PoseLandmarkerOptions(
         base_options=base,
@@ -40,6 +60,10 @@ def main():
         num_poses=1
     )
 
+    writer = None
+    if args.smooth_out:
+        writer = SmoothedJsonWriter(args.smooth_out, StreamingSmoother(args.smooth_alpha, args.smooth_max_gap, args.smooth_vis_min))
+
     frames = []
     non_empty = 0
     i = 0
@@ -48,19 +72,22 @@ def main():
     max_lms_len = 0
     with vision.PoseLandmarker.create_from_options(opts) as landmarker:
         while True:
-            ok, bgr = cap.read()
+            with instrument.span("decode"):
+                ok, bgr = cap.read()
             if not ok:
                 break
 
             if args.sample > 1 and (i % args.sample) != 0:
                 i += 1
                 continue
-            rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
-            rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+            with instrument.span("color"):
+                rgb = crop.prepare(bgr) if crop else cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+                rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
             ts_ms = int((i / max(1e-6, fps)) * 1000.0)
 
-            res = landmarker.detect_for_video(mp_image, ts_ms)
+            with instrument.span("infer"):
+                res = landmarker.detect_for_video(mp_image, ts_ms)
 
             # DBG_ANYDET
 
@@ -102,8 +129,16 @@ def main():
                             "z": float(lm.z),
                             "v": float(getattr(lm, "visibility", 0.0))
                         })
+                    if crop:
+                        crop.to_full(lms_out)
+            if not lms_out:
+                instrument.count("frames_empty")
+            if crop:
+                crop.update(lms_out)
 
             frames.append({"i": i, "t": float(i / max(1e-6, fps)), "landmarks": lms_out})
+            if writer:
+                writer.push(frames[-1])
             i += 1
 
     cap.release()
@@ -117,16 +152,24 @@ def main():
             "model": os.path.basename(model_path),
             "non_empty": int(non_empty),
             "total_frames_written": int(len(frames)),
-            "running_mode": "VIDEO"
+            "running_mode": "VIDEO",
+            "crop": crop.meta() if crop else None
         }
     }
     os.makedirs(os.path.dirname(outp), exist_ok=True)
     with open(outp, "w", encoding="utf-8") as f:
         if detected_frames == 0:
             print("ERROR: 0 pose detections across video. Output would be empty - failing.")
+            if writer:
+                writer.abort()
             raise SystemExit(2)
-        json.dump(out, f)
+        with instrument.span("json_write"):
+            json.dump(out, f)
 
     print(f"OK wrote: {outp} frames={len(frames)} nonEmpty={non_empty}")
+    if writer:
+        writer.close(out["meta"])
+        print(f"OK wrote: {args.smooth_out} (smoothed, alpha={args.smooth_alpha} max_gap={args.smooth_max_gap})")
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with instrument.run("pose_video_robust"):
+        main()
\ No newline at end of file
@@ -3,6 +3,8 @@ import cv2
 import numpy as np
 import mediapipe as mp
 
+import instrument
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--in", dest="inp", required=True)
@@ -35,7 +37,8 @@ def main():
 
     i = 0
     while True:
-        ok, bgr = cap.read()
+        with instrument.span("decode"):
+            ok, bgr = cap.read()
         if not ok:
             break
 
@@ -43,10 +46,12 @@ def main():
             i += 1
             continue
 
-        rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
-        rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+        with instrument.span("color"):
+            rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+            rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
 
-        res = pose.process(rgb)
+        with instrument.span("infer"):
+            res = pose.process(rgb)
 
         lms_out = []
         if res and res.pose_landmarks and res.pose_landmarks.landmark:
@@ -62,6 +67,8 @@ def main():
                         "v": float(getattr(lm, "visibility", 0.0))
                     })
 
+        if not lms_out:
+            instrument.count("frames_empty")
         frames.append({"i": int(i), "t": float(i / max(1e-6, fps)), "landmarks": lms_out})
 
         # light progress signal
@@ -87,7 +94,7 @@ def main():
     }
 
     os.makedirs(os.path.dirname(args.outp), exist_ok=True)
-    with open(args.outp, "w", encoding="utf-8") as f:
+    with instrument.span("json_write"), open(args.outp, "w", encoding="utf-8") as f:
         json.dump(out, f)
 
     pct = (100.0 * non_empty_33 / max(1, len(frames)))
@@ -99,4 +106,5 @@ def main():
         raise SystemExit(2)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with instrument.run("pose_video_solutions_robust"):
+        main()
\ No newline at end of file
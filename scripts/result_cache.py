@@ -0,0 +1,323 @@
+import os, sys, json, time, shutil, hashlib, argparse, tempfile, subprocess
+
+# Content-addressed cache for analysis artifacts (raw pose, smoothed pose, QC,
+# impact_anchor.json, impact_proxy output, ...).
+#
+# A key is the SHA-256 of: the artifact kind, the video's *content* hash, the model file's
+# content hash, any dependency files (e.g. the script that produced it), the parameters,
+# and parent keys (smoothed pose depends on the raw pose key). Re-uploading the same
+# clip, or re-running with the same settings, maps to the same entry.
+#
+#   <root>/<kind>/<key><ext>        the artifact
+#   <root>/<kind>/<key>.meta.json   kind, params, exit code of the producing command
+#   <root>/stats.json               hit/miss/put counters per kind, evictions
+#   <root>/hashes.json              content hashes memoized by (path, size, mtime)
+#
+# Eviction is LRU by mtime (a hit touches the entry) once the cache is over max size.
+#
+#   python .\scripts\result_cache.py key --kind pose --video in.mp4 --model pose.task --param sample=900
+#   python .\scripts\result_cache.py run --kind pose --key <key> --out pose.json -- python .\scripts\pose_estimate_tasks.py ...
+#   python .\scripts\result_cache.py run --kind impact_anchor --video in.mp4 --out out\impact_anchor.json -- python .\scripts\impact_anchor_ball_club.py --in in.mp4 --outdir out
+#   python .\scripts\result_cache.py stats
+
+DEFAULT_MAX_MB = 2048
+CACHE_VERSION = 1
+META_SUFFIX = ".meta.json"
+MISS = 3   # exit code of `get` on a miss
+# exit codes `run` stores and replays: success, and the pose_qc.py gate failure (GATE_FAIL),
+# which is a verdict on the input rather than a failed command
+REPLAY_RCS = (0, 4)
+
+def cache_root():
+    root = os.environ.get("VCA_RESULT_CACHE") or ""
+    if not root:
+        vca_cache = os.environ.get("VCA_CACHE") or ""
+        root = os.path.join(vca_cache, "results") if vca_cache else os.path.join(tempfile.gettempdir(), "vca-results")
+    return root
+
+def _read_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def _write_json(path, obj):
+    tmp = f"{path}.{os.getpid()}.part"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+class ResultCache:
+    """
+    Artifact cache under `root`. get() / put() / run() are keyed by (kind, key);
+    key() builds keys from content hashes + parameters.
+    """
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or cache_root()
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("VCA_RESULT_CACHE_MB") or DEFAULT_MAX_MB) * 1024 * 1024)
+        self.max_bytes = int(max_bytes)
+        os.makedirs(self.root, exist_ok=True)
+
+    # ---------------- keys ----------------
+
+    def file_hash(self, path):
+        """SHA-256 of a file's bytes, memoized by (abspath, size, mtime_ns)."""
+        st = os.stat(path)
+        ident = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+        memo_path = os.path.join(self.root, "hashes.json")
+        memo = _read_json(memo_path, {})
+        if ident in memo:
+            return memo[ident]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        memo[ident] = h.hexdigest()
+        _write_json(memo_path, memo)
+        return memo[ident]
+
+    def key(self, kind, video=None, model=None, params=None, deps=(), parents=()):
+        ident = {
+            "v": CACHE_VERSION,
+            "kind": kind,
+            "video": self.file_hash(video) if video else None,
+            "model": self.file_hash(model) if model else None,
+            "deps": sorted(self.file_hash(d) for d in deps),
+            "params": {str(k): str(v) for k, v in sorted((params or {}).items())},
+            "parents": list(parents)
+        }
+        return hashlib.sha256(json.dumps(ident, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+    # ---------------- entries ----------------
+
+    def _dir(self, kind):
+        return os.path.join(self.root, kind)
+
+    def _find(self, kind, key):
+        d = self._dir(kind)
+        meta = _read_json(os.path.join(d, key + META_SUFFIX), None)
+        if not meta:
+            return None, None
+        p = os.path.join(d, key + meta.get("ext", ""))
+        return (p, meta) if os.path.exists(p) else (None, None)
+
+    def peek(self, kind, key):
+        """Artifact path or None, without counting a hit / miss or touching the entry (planning)."""
+        return self._find(kind, key)[0]
+
+    def get(self, kind, key):
+        """(artifact path, meta) on a hit (and marks it recently used), (None, None) on a miss."""
+        p, meta = self._find(kind, key)
+        self._count(kind, "hits" if p else "misses")
+        if p:
+            now = time.time()
+            os.utime(p, (now, now))
+        return p, meta
+
+    def put(self, kind, key, src, params=None, returncode=0):
+        """Copy `src` into the cache; returns the cached path. Evicts if over size."""
+        d = self._dir(kind)
+        os.makedirs(d, exist_ok=True)
+        ext = os.path.splitext(src)[1]
+        dst = os.path.join(d, key + ext)
+        tmp = f"{dst}.{os.getpid()}.part"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+        _write_json(os.path.join(d, key + META_SUFFIX), {
+            "kind": kind, "key": key, "ext": ext, "source": os.path.abspath(src),
+            "params": params or {}, "returncode": int(returncode), "created": round(time.time(), 3)
+        })
+        self._count(kind, "puts")
+        self.evict(keep=dst)
+        return dst
+
+    def run(self, kind, key, out, cmd, params=None, replay_rcs=REPLAY_RCS):
+        """
+        Cached command: on a hit copy the artifact to `out` and return the stored exit code;
+        on a miss run `cmd`, cache `out` if the command wrote it and exited with one of
+        `replay_rcs` (any other failure runs again next time), and return its exit code.
+        Returns (returncode, hit).
+        """
+        p, meta = self.get(kind, key)
+        if p:
+            os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+            if os.path.abspath(p) != os.path.abspath(out):
+                shutil.copyfile(p, out)
+            return int(meta.get("returncode", 0)), True
+        # a file left over from an earlier run must not pass for this command's output
+        try:
+            os.remove(out)
+        except FileNotFoundError:
+            pass
+        rc = subprocess.call(cmd)
+        if rc in replay_rcs and os.path.exists(out):
+            self.put(kind, key, out, params, rc)
+        return rc, False
+
+    # ---------------- size / stats ----------------
+
+    def entries(self):
+        """[(mtime, bytes, artifact path, meta path)] for every complete entry."""
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for kind in os.listdir(self.root):
+            d = self._dir(kind)
+            if not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                if not name.endswith(META_SUFFIX):
+                    continue
+                key = name[:-len(META_SUFFIX)]
+                p, meta = self._find(kind, key)
+                if not p:
+                    continue
+                st = os.stat(p)
+                out.append((st.st_mtime, st.st_size, p, os.path.join(d, name)))
+        return out
+
+    def evict(self, max_bytes=None, keep=None):
+        """
+        Drop least recently used entries until the cache fits (never `keep`, the entry
+        just written). Returns bytes freed.
+        """
+        limit = self.max_bytes if max_bytes is None else int(max_bytes)
+        ents = sorted(self.entries())
+        total = sum(e[1] for e in ents)
+        freed = 0
+        n = 0
+        for _, size, p, mp in ents:
+            if total - freed <= limit:
+                break
+            if p == keep:
+                continue
+            for f in (p, mp):
+                try:
+                    os.remove(f)
+                except OSError:
+                    pass
+            freed += size
+            n += 1
+        if n:
+            self._update_stats(lambda s: s.update(evictions=s.get("evictions", 0) + n,
+                                                  evicted_bytes=s.get("evicted_bytes", 0) + freed))
+        return freed
+
+    def _update_stats(self, fn):
+        p = os.path.join(self.root, "stats.json")
+        s = _read_json(p, {})
+        fn(s)
+        _write_json(p, s)
+
+    def _count(self, kind, what):
+        def bump(s):
+            k = s.setdefault("kinds", {}).setdefault(kind, {"hits": 0, "misses": 0, "puts": 0})
+            k[what] = k.get(what, 0) + 1
+        self._update_stats(bump)
+
+    def stats(self):
+        s = _read_json(os.path.join(self.root, "stats.json"), {})
+        ents = self.entries()
+        kinds = s.get("kinds", {})
+        for k in kinds.values():
+            looked = k.get("hits", 0) + k.get("misses", 0)
+            k["hit_rate"] = round(k.get("hits", 0) / looked, 3) if looked else None
+        return {"root": self.root, "entries": len(ents), "bytes": sum(e[1] for e in ents),
+                "max_bytes": self.max_bytes, "kinds": kinds,
+                "evictions": s.get("evictions", 0), "evicted_bytes": s.get("evicted_bytes", 0)}
+
+# ---------------- CLI ----------------
+
+def _params(pairs):
+    out = {}
+    for p in pairs or []:
+        k, sep, v = p.partition("=")
+        if not sep:
+            raise SystemExit(f"result_cache.py: --param needs k=v, got: {p}")
+        out[k] = v
+    return out
+
+def _key_args(ap):
+    ap.add_argument("--kind", required=True, help="artifact kind: pose, smooth, qc, impact_anchor, impact_proxy, ...")
+    ap.add_argument("--key", default="", help="precomputed key (otherwise built from the options below)")
+    ap.add_argument("--video", default="")
+    ap.add_argument("--model", default="")
+    ap.add_argument("--dep", action="append", default=[], help="file whose content is part of the key (repeatable)")
+    ap.add_argument("--param", action="append", default=[], help="k=v (repeatable)")
+    ap.add_argument("--parent", action="append", default=[], help="key of an input artifact (repeatable)")
+
+def _resolve_key(cache, args):
+    if args.key:
+        return args.key
+    for p in [args.video, args.model] + args.dep:
+        if p and not os.path.exists(p):
+            raise SystemExit(f"result_cache.py: not found: {p}")
+    return cache.key(args.kind, args.video or None, args.model or None, _params(args.param), args.dep, args.parent)
+
+def main():
+    argv = sys.argv[1:]
+    cmd = []
+    if "--" in argv:
+        cut = argv.index("--")
+        argv, cmd = argv[:cut], argv[cut + 1:]
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default="")
+    ap.add_argument("--max_mb", type=float, default=None)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    _key_args(sub.add_parser("key", help="print the cache key"))
+    g = sub.add_parser("get", help=f"print the cached path (exit {MISS} on a miss); --out copies it")
+    _key_args(g)
+    g.add_argument("--out", default="")
+    p = sub.add_parser("put", help="store a file; prints the cached path")
+    _key_args(p)
+    p.add_argument("--file", required=True)
+    p.add_argument("--returncode", type=int, default=0)
+    r = sub.add_parser("run", help="cached command: result_cache.py run ... --out FILE -- <command>")
+    _key_args(r)
+    r.add_argument("--out", required=True, help="file the command writes")
+    sub.add_parser("stats")
+    e = sub.add_parser("evict")
+    e.add_argument("--to_mb", type=float, default=None)
+    args = ap.parse_args(argv)
+
+    max_bytes = None if args.max_mb is None else int(args.max_mb * 1024 * 1024)
+    cache = ResultCache(args.root or None, max_bytes)
+
+    if args.cmd == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+        return 0
+    if args.cmd == "evict":
+        freed = cache.evict(None if args.to_mb is None else int(args.to_mb * 1024 * 1024))
+        print(f"OK evicted {freed} bytes")
+        return 0
+
+    key = _resolve_key(cache, args)
+    if args.cmd == "key":
+        print(key)
+        return 0
+    if args.cmd == "get":
+        p, _ = cache.get(args.kind, key)
+        if not p:
+            return MISS
+        if args.out:
+            shutil.copyfile(p, args.out)
+        print(p)
+        return 0
+    if args.cmd == "put":
+        if not os.path.exists(args.file):
+            raise SystemExit(f"result_cache.py: not found: {args.file}")
+        print(cache.put(args.kind, key, args.file, _params(args.param), args.returncode))
+        return 0
+
+    # run
+    if not cmd:
+        raise SystemExit("result_cache.py: run needs a command after --")
+    rc, hit = cache.run(args.kind, key, args.out, cmd, _params(args.param))
+    print(f"cache {'HIT' if hit else 'MISS'} {args.kind} {key}", file=sys.stderr)
+    return rc
+
+if __name__ == "__main__":
+    sys.exit(main())
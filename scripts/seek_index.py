@@ -0,0 +1,164 @@
+import os, sys, json, bisect, argparse, subprocess
+import cv2
+
+from frame_store import store_dir
+
+# Persistent per-video seek index: keyframe positions + frame timestamps.
+#
+# On long-GOP phone H.264 every CAP_PROP_POS_FRAMES seek decodes forward from the previous
+# keyframe. Knowing where the keyframes are lets iter_indices() visit a sorted batch of
+# frames in one forward sweep, only seeking when a jump is cheaper than reading on.
+#
+# Built once per video with ffprobe (container packets only, no decode) and kept next to
+# the frame store as seek_index.json. Without ffprobe the index has no keyframes and reads
+# fall back to a max-forward-gap heuristic.
+
+INDEX_NAME = "seek_index.json"
+INDEX_VERSION = 1
+# forward-read budget (frames) when keyframe positions are unknown
+DEFAULT_MAX_FORWARD = 30
+
+def index_path(video, root=None):
+    return os.path.join(store_dir(video, root), INDEX_NAME)
+
+def probe_packets(video):
+    """
+    ffprobe the video stream packets. Returns (keyframes, t_ms) in presentation order,
+    or (None, None) if ffprobe is unavailable/failed.
+    """
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,dts_time,flags",
+        "-of", "json",
+        video
+    ]
+    try:
+        j = json.loads(subprocess.check_output(cmd, text=True, stderr=subprocess.DEVNULL))
+    except Exception:
+        return None, None
+
+    pk = []
+    for p in j.get("packets") or []:
+        t = p.get("pts_time")
+        if t in (None, "N/A"):
+            t = p.get("dts_time")
+        try:
+            t = float(t)
+        except (TypeError, ValueError):
+            continue
+        pk.append((t, "K" in (p.get("flags") or "")))
+    if not pk:
+        return None, None
+
+    # packets come in decode order; frame index = rank by presentation time
+    pk.sort(key=lambda x: x[0])
+    t0 = pk[0][0]
+    keyframes = [i for i, (_, key) in enumerate(pk) if key]
+    t_ms = [round((t - t0) * 1000.0, 3) for t, _ in pk]
+    return keyframes, t_ms
+
+def build_index(video, root=None):
+    keyframes, t_ms = probe_packets(video)
+    st = os.stat(video)
+    index = {
+        "version": INDEX_VERSION,
+        "video": os.path.abspath(video),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "source": "ffprobe" if keyframes is not None else "none",
+        "frame_count": len(t_ms) if t_ms else None,
+        "keyframes": keyframes or [],
+        "t_ms": t_ms or []
+    }
+    p = index_path(video, root)
+    os.makedirs(os.path.dirname(p), exist_ok=True)
+    tmp = p + ".part"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, p)
+    return index
+
+def load_index(video, build=True, root=None):
+    """
+    Cached seek index for `video` (built on first use unless build=False).
+    Returns None when nothing is cached and building is off or fails.
+    """
+    try:
+        p = index_path(video, root)
+    except OSError:
+        return None
+    if os.path.exists(p):
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            pass
+    if not build:
+        return None
+    try:
+        return build_index(video, root)
+    except OSError:
+        return None
+
+def prev_keyframe(keyframes, idx):
+    k = bisect.bisect_right(keyframes, idx) - 1
+    return keyframes[k] if k >= 0 else 0
+
+def iter_indices(cap, idxs, index=None, max_forward=DEFAULT_MAX_FORWARD, state=None):
+    """
+    Yield (idx, bgr or None) for the requested frame indices in ascending order, decoding
+    them in one forward sweep. A seek is only issued when it is cheaper than reading on:
+    i.e. when the target's GOP starts after the current decode position (or, without
+    keyframe info, when the gap exceeds max_forward).
+    `state` ({"pos": ...}) carries the decode position across calls on the same capture.
+    """
+    want = sorted(set(int(i) for i in idxs if int(i) >= 0))
+    keyframes = (index or {}).get("keyframes") or None
+    if state is None:
+        state = {"pos": None}
+    pos = state.get("pos")   # index of the frame the next cap.read() returns
+
+    for idx in want:
+        forward = pos is not None and pos <= idx
+        if forward:
+            if keyframes:
+                forward = (idx - pos) <= (idx - prev_keyframe(keyframes, idx))
+            else:
+                forward = (idx - pos) <= max_forward
+        if not forward:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            pos = idx
+
+        while pos < idx:
+            if not cap.grab():
+                pos = None
+                break
+            pos += 1
+        if pos is None:
+            state["pos"] = None
+            yield idx, None
+            continue
+
+        ok, bgr = cap.read()
+        pos = idx + 1 if (ok and bgr is not None) else None
+        state["pos"] = pos
+        yield idx, (bgr if pos is not None else None)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="inp", required=True)
+    ap.add_argument("--root", default="")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.inp):
+        print(f"seek_index.py: video not found: {args.inp}", file=sys.stderr)
+        raise SystemExit(1)
+
+    index = build_index(args.inp, args.root or None)
+    kf = index["keyframes"]
+    gop = (index["frame_count"] / len(kf)) if (kf and index["frame_count"]) else None
+    print(f"OK seek index: {index_path(args.inp, args.root or None)} source={index['source']} frames={index['frame_count']} keyframes={len(kf)} avgGOP={gop}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import os, sys, json, argparse
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from pose_array import from_json, load
+from phase_detect import detect_phases
+from impact_proxy import (moving_average, angle_deg_arr, wrap_deg_arr, joint_angle_arr,
+                          L_SHO, R_SHO, L_ELB, R_ELB, L_WRI, R_WRI, L_HIP, R_HIP,
+                          L_KNE, R_KNE, L_ANK, R_ANK)
+
+# Full-swing metric time series from a pose clip, in one vectorized pass.
+#
+# Every metric is computed for every frame from the smoothed (T, 33, 4) landmark array,
+# then sampled at the P positions; the route's required metric keys come straight out of
+# those samples, so nothing has to be backfilled.
+#
+#   python .\scripts\swing_metrics.py --pose pose.json --out metrics.json [--impact N] [--lead left|right]
+#
+# All angles are 2D/depth proxies from a single camera (degrees); distances are in torso
+# lengths (address hip-center -> shoulder-center), so they don't depend on resolution or zoom.
+
+DEFAULT_FPS = 30.0
+
+# per-frame columns of the compact series array, in order
+SERIES_FIELDS = (
+    "pelvis_rotation", "torso_rotation", "x_factor", "spine_tilt", "side_bend",
+    "lead_arm_angle", "lead_elbow_angle", "handle_height", "hip_drift", "center_mass_shift",
+    "hand_speed", "knee_flex_lead", "knee_flex_trail"
+)
+
+REQUIRED_METRICS = (
+    "tempo_ratio", "backswing_time_ms", "downswing_time_ms", "pelvis_rotation_p7",
+    "torso_rotation_p7", "x_factor_proxy", "spine_tilt_p7", "side_bend_p7",
+    "lead_arm_angle_p6", "handle_height_p7", "hip_drift_total", "center_mass_shift"
+)
+
+# segment weights for the center-of-mass proxy (shoulders, hips, knees, ankles)
+COM_WEIGHTS = ((L_SHO, 0.18), (R_SHO, 0.18), (L_HIP, 0.22), (R_HIP, 0.22),
+               (L_KNE, 0.06), (R_KNE, 0.06), (L_ANK, 0.04), (R_ANK, 0.04))
+
+def _f(x, nd=3):
+    return None if x is None or not np.isfinite(x) else round(float(x), nd)
+
+def line_rotation(S, a, b):
+    """
+    Rotation (deg) of the a->b line about the vertical axis, from its x/z components.
+    Uses the raw z channel, which MediaPipe scales roughly like x.
+    """
+    d = S[:, b] - S[:, a]
+    return np.degrees(np.arctan2(d[:, 2], d[:, 0]))
+
+def compute_series(P: np.ndarray, lead: str = "left", w: int = 2, t_sec: Optional[np.ndarray] = None):
+    """
+    (series (T, len(SERIES_FIELDS)) float32, hands_y (T,), scale) from P (T, 33, >=3).
+    Rotations and positions are absolute here; `compute` re-bases them on P1 once that
+    is known. Hand speed is per second of `t_sec` (sample times; default one per sample).
+    """
+    T = P.shape[0]
+    S = moving_average(P[..., :3], w)
+    lsho, tsho = (L_SHO, R_SHO) if lead == "left" else (R_SHO, L_SHO)
+    lelb, lwri = (L_ELB, L_WRI) if lead == "left" else (R_ELB, R_WRI)
+    lk = (L_HIP, L_KNE, L_ANK) if lead == "left" else (R_HIP, R_KNE, R_ANK)
+    tk = (R_HIP, R_KNE, R_ANK) if lead == "left" else (L_HIP, L_KNE, L_ANK)
+
+    hipC = 0.5 * (S[:, L_HIP] + S[:, R_HIP])
+    shoC = 0.5 * (S[:, L_SHO] + S[:, R_SHO])
+    hands = 0.5 * (S[:, L_WRI] + S[:, R_WRI])
+    spine = shoC[:, :2] - hipC[:, :2]
+    torso_len = np.linalg.norm(spine, axis=-1)
+    ok = np.flatnonzero(np.isfinite(torso_len) & (torso_len > 1e-6))
+    scale = float(torso_len[ok[0]]) if ok.size else np.nan
+
+    com = sum(wt * S[:, j, :2] for j, wt in COM_WEIGHTS) / sum(wt for _, wt in COM_WEIGHTS)
+    pelvis = line_rotation(S, L_HIP, R_HIP)
+    torso = line_rotation(S, L_SHO, R_SHO)
+    # spine tilt from vertical in the image plane: + when the shoulders sit to image-right of the hips
+    tilt = np.degrees(np.arctan2(spine[:, 0], -spine[:, 1]))
+    # side bend: shoulder line against the hip line in the image plane
+    bend = wrap_deg_arr(angle_deg_arr(S[:, tsho, :2] - S[:, lsho, :2]) - angle_deg_arr(S[:, R_HIP, :2] - S[:, L_HIP, :2]))
+    if lead != "left":
+        bend = -bend
+    # lead arm from horizontal (+ = hands above the shoulder)
+    arm = S[:, lwri, :2] - S[:, lsho, :2]
+    arm_deg = np.degrees(np.arctan2(-arm[:, 1], np.abs(arm[:, 0])))
+
+    speed = np.full(T, np.nan)
+    if T >= 3:
+        t = np.arange(T, dtype=np.float64) if t_sec is None else t_sec
+        speed = np.linalg.norm(np.gradient(hands[:, :2], t, axis=0), axis=-1)
+
+    cols = {
+        "pelvis_rotation": pelvis,
+        "torso_rotation": torso,
+        "x_factor": wrap_deg_arr(torso - pelvis),
+        "spine_tilt": tilt,
+        "side_bend": bend,
+        "lead_arm_angle": arm_deg,
+        "lead_elbow_angle": joint_angle_arr(S[:, lsho, :2], S[:, lelb, :2], S[:, lwri, :2]),
+        "handle_height": -hands[:, 1] / scale,
+        "hip_drift": hipC[:, 0] / scale,
+        "center_mass_shift": com[:, 0] / scale,
+        "hand_speed": speed / scale,
+        "knee_flex_lead": 180.0 - joint_angle_arr(*(S[:, j, :2] for j in lk)),
+        "knee_flex_trail": 180.0 - joint_angle_arr(*(S[:, j, :2] for j in tk)),
+    }
+    series = np.stack([cols[k] for k in SERIES_FIELDS], axis=1)
+    return series, hands[:, 1], scale
+
+# columns reported relative to address (P1)
+_RELATIVE = ("pelvis_rotation", "torso_rotation", "x_factor", "side_bend", "handle_height", "hip_drift", "center_mass_shift")
+_WRAPPED = ("pelvis_rotation", "torso_rotation", "x_factor")
+
+def compute(P: np.ndarray, fps: Optional[float] = None, t_ms: Optional[np.ndarray] = None,
+            impact: Optional[int] = None, lead: str = "left", frame_idx: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Metrics report for P (T, 33, >=3): required route metrics, P-position indices and
+    samples, and the compact per-frame series. `t_ms` (T,) overrides fps-derived times
+    (e.g. for sampled extractions); `impact` is an index into P. `frame_idx` (T,) is the
+    video frame of each row: positions, samples and phase "frame" fields are reported in it.
+    """
+    T = P.shape[0]
+    fi = np.arange(T) if frame_idx is None else np.asarray(frame_idx)
+    fps = float(fps) if fps else DEFAULT_FPS
+    if t_ms is None or not np.isfinite(t_ms).all():
+        t_ms = np.arange(T, dtype=np.float64) * (1000.0 / fps)
+
+    series, hands_y, scale = compute_series(P, lead, t_sec=t_ms / 1000.0)
+    col = {k: j for j, k in enumerate(SERIES_FIELDS)}
+    rate = 1000.0 / max(float(np.median(np.diff(t_ms))), 1e-6) if T > 1 else fps
+    phases = detect_phases(P, rate, impact if impact is not None and 0 <= impact < T else None, lead, t_ms / 1000.0)
+    pk = {p: v["index"] for p, v in phases.items()}
+    for v in phases.values():
+        v["frame"] = None if v["index"] is None else int(fi[v["index"]])
+
+    p1 = pk["P1"] or 0
+    for k in _RELATIVE:
+        base = series[p1, col[k]]
+        if np.isfinite(base):
+            series[:, col[k]] -= base
+            if k in _WRAPPED:
+                series[:, col[k]] = wrap_deg_arr(series[:, col[k]])
+
+    def at(name, p):
+        i = pk.get(p)
+        return None if i is None else _f(series[i, col[name]])
+
+    def dt(a, b):
+        ia, ib = pk.get(a), pk.get(b)
+        return None if ia is None or ib is None or ib <= ia else _f(t_ms[ib] - t_ms[ia], 1)
+
+    back, down = dt("P1", "P4"), dt("P4", "P7")
+    metrics = {
+        "tempo_ratio": _f(back / down, 2) if back and down else None,
+        "backswing_time_ms": back,
+        "downswing_time_ms": down,
+        "pelvis_rotation_p7": at("pelvis_rotation", "P7"),
+        "torso_rotation_p7": at("torso_rotation", "P7"),
+        "x_factor_proxy": at("x_factor", "P4"),
+        "spine_tilt_p7": at("spine_tilt", "P7"),
+        "side_bend_p7": at("side_bend", "P7"),
+        "lead_arm_angle_p6": at("lead_arm_angle", "P6"),
+        "handle_height_p7": at("handle_height", "P7"),
+        "hip_drift_total": at("hip_drift", "P7"),
+        "center_mass_shift": at("center_mass_shift", "P7"),
+    }
+
+    samples = {}
+    for p, i in pk.items():
+        if i is not None:
+            samples[p] = {"frameIndex": int(fi[i]), "row": int(i), "t_ms": _f(t_ms[i], 1)}
+            samples[p].update({k: _f(v) for k, v in zip(SERIES_FIELDS, series[i].tolist())})
+
+    return {
+        "ok": True,
+        "lead": lead,
+        "fps": fps,
+        "frames": int(T),
+        "scale_torso": _f(scale, 5),
+        "metrics": metrics,
+        "missing": [k for k in REQUIRED_METRICS if metrics[k] is None],
+        "positions": {p: v["frame"] for p, v in phases.items()},
+        "phases": phases,
+        "samples": samples,
+        "series": {
+            "fields": list(SERIES_FIELDS),
+            "t_ms": np.round(t_ms, 1).tolist(),
+            "values": np.round(series, 3).astype(np.float32).tolist()
+        },
+        "units": {"angles": "deg", "distances": "torso lengths", "hand_speed": "torso lengths / s"}
+    }
+
+def load_pose(path):
+    """
+    (P (T, 33, 4), fps, t_ms, frame_idx) from a pose JSON or pose_array container.
+    Times come from the source frame indices so sampled extractions keep real spacing.
+    """
+    pa = load(path, mmap=False) if not str(path).lower().endswith(".json") else from_json(path, dtype=np.float64)
+    fps = pa.fps() or DEFAULT_FPS
+    i = np.asarray(pa.i, dtype=np.int64)
+    return np.asarray(pa.pose[..., :4], dtype=np.float64), fps, i * (1000.0 / fps), i
+
+def write_report(rep, out_path):
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(rep, f, separators=(",", ":"))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pose", required=True, help="pose JSON or pose_array container")
+    ap.add_argument("--out", required=True, help="output metrics JSON")
+    ap.add_argument("--impact", type=int, default=-1, help="impact frame index (optional)")
+    ap.add_argument("--lead", default="left", choices=["left", "right"], help="lead side (left = right-handed golfer)")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.pose):
+        print(f"swing_metrics.py: pose not found: {args.pose}", file=sys.stderr)
+        raise SystemExit(1)
+    P, fps, t_ms, fi = load_pose(args.pose)
+    if P.shape[0] < 5:
+        raise SystemExit(f"Not enough frames: {P.shape[0]}")
+
+    # --impact is a video frame; the pose may be sampled
+    impact = int(np.argmin(np.abs(fi - args.impact))) if args.impact >= 0 else None
+    rep = compute(P, fps, t_ms, impact, args.lead, fi)
+    write_report(rep, args.out)
+    m = rep["metrics"]
+    print("OK wrote:", args.out)
+    print("positions:", {p: i for p, i in rep["positions"].items() if i is not None})
+    print(f"tempo={m['tempo_ratio']} back={m['backswing_time_ms']}ms down={m['downswing_time_ms']}ms "
+          f"missing={len(rep['missing'])}/{len(REQUIRED_METRICS)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import os, sys, json, time, argparse
+from pathlib import Path
+import cv2
+import numpy as np
+
+import instrument
+from frame_store import open_frames, WindowFrames
+
+# Swing segmentation for long range-session videos (5-15 min, several swings).
+#
+# Every extractor assumes one swing per clip. This pre-pass finds each swing's time window
+# from low-res grayscale motion energy in a central ROI (the same ROI frame diff as
+# impact_anchor_runner.py), so pose / impact / P-frames only see those windows:
+#
+#   1. scan: --scan_hz frames a second are retrieved (the rest only grabbed), shrunk to
+#      --scan_w px wide, grayscale; energy = fraction of ROI pixels whose |diff| vs the
+#      previous scanned frame exceeds --pix_th (sensor noise stays under it, a club doesn't)
+#   2. threshold = max(--min_energy, median + --k * MAD) of the smoothed series; runs above
+#      it closer than --merge_sec are joined, runs shorter than --min_swing_sec or longer
+#      than --max_swing_sec are rejected (walking, teeing up)
+#   3. window = the run +/- --pad_sec, widened to at least [peak - --pre_sec, peak + --post_sec]
+#      (address .. finish); overlapping windows are split halfway between their peaks
+#
+# With --model each window gets its own result set under --out_dir/swing_NN/ (pose JSON,
+# smoothed pose, impact_anchor.json, frames/ + phase_frames.json), all with frame indices
+# local to the window; swing.json and segments.json carry the offsets back to the session.
+#
+#   python .\scripts\swing_segment.py --in session.mp4 --out segments.json
+#   python .\scripts\swing_segment.py --in session.mp4 --out_dir out --model pose_landmarker_full.task
+
+ROI = (0.25, 0.20, 0.75, 0.85)   # x1, y1, x2, y2 fractions (impact_anchor_runner.py)
+PIX_TH = 20          # gray levels a scan pixel must change by to count as motion
+MIN_ENERGY = 0.003   # threshold floor: changed-pixel fraction
+APP_DIR = Path(__file__).resolve().parents[1] / "app" / "api" / "analyze-swing"
+
+def die(msg, code=1):
+    print(msg, file=sys.stderr)
+    sys.exit(code)
+
+def write_json(path, obj, indent=2):
+    with instrument.span("json_write"), open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=indent)
+    return path
+
+def motion_energy(video, scan_hz=15.0, scan_w=160, roi=ROI, pix_th=PIX_TH):
+    """
+    (energy, frame_idxs, fps, frame_count): changed-pixel fraction (0..1) of the low-res
+    gray ROI between consecutive scanned frames; energy[k] belongs to frame_idxs[k].
+    """
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise RuntimeError(f"swing_segment: could not open video: {video}")
+    fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0) or 30.0
+    step = max(1, int(round(fps / max(0.1, float(scan_hz)))))
+
+    energy, idxs = [], []
+    prev = None
+    i = 0
+    try:
+        while True:
+            with instrument.span("scan_decode"):
+                ok = cap.grab()
+                bgr = cap.retrieve()[1] if ok and i % step == 0 else None
+            if not ok:
+                break
+            if bgr is not None:
+                h, w = bgr.shape[:2]
+                x1, y1, x2, y2 = int(w * roi[0]), int(h * roi[1]), int(w * roi[2]), int(h * roi[3])
+                sw = min(scan_w, x2 - x1)
+                sh = max(1, int(round((y2 - y1) * sw / float(x2 - x1))))
+                g = cv2.cvtColor(cv2.resize(bgr[y1:y2, x1:x2], (sw, sh), interpolation=cv2.INTER_AREA),
+                                 cv2.COLOR_BGR2GRAY)
+                g = cv2.GaussianBlur(g, (3, 3), 0)
+                if prev is not None:
+                    energy.append(float(np.count_nonzero(cv2.absdiff(g, prev) > pix_th)) / g.size)
+                    idxs.append(i)
+                prev = g
+            i += 1
+    finally:
+        cap.release()
+    return np.array(energy, dtype=np.float64), np.array(idxs, dtype=np.int64), fps, i
+
+def find_swings(energy, idxs, fps, frame_count, k=6.0, min_energy=MIN_ENERGY, smooth_sec=0.2, merge_sec=0.75,
+                min_swing_sec=0.3, max_swing_sec=3.0, pre_sec=2.5, post_sec=1.5, pad_sec=0.5):
+    """
+    Swing windows from a motion_energy() series -> (swings, rejected, threshold).
+    Each swing: {"start_frame", "end_frame" (exclusive), "peak_frame", "peak_energy", "motion": [a, b]}.
+    """
+    if len(energy) == 0:
+        return [], [], None
+    dt = float(np.median(np.diff(idxs))) / fps if len(idxs) > 1 else 1.0 / fps
+    win = max(1, int(round(smooth_sec / dt)))
+    e = np.convolve(energy, np.ones(win) / win, mode="same") if win > 1 else energy
+    med = float(np.median(e))
+    mad = float(np.median(np.abs(e - med)))
+    th = max(float(min_energy), med + k * 1.4826 * mad)
+
+    # runs of scan samples above threshold, joined across short dips
+    runs = []
+    above = np.flatnonzero(e > th)
+    merge = max(1, int(round(merge_sec / dt)))
+    for j in above:
+        if runs and j - runs[-1][1] <= merge:
+            runs[-1][1] = j
+        else:
+            runs.append([j, j])
+
+    swings, rejected = [], []
+    for a, b in runs:
+        dur = (idxs[b] - idxs[a]) / fps + dt
+        peak = a + int(np.argmax(e[a:b + 1]))
+        row = {"motion": [int(idxs[a]), int(idxs[b])], "peak_frame": int(idxs[peak]),
+               "peak_energy": round(float(e[peak]), 5), "motion_sec": round(dur, 3)}
+        if dur < min_swing_sec:
+            rejected.append(dict(row, reason="too short"))
+            continue
+        if dur > max_swing_sec:
+            rejected.append(dict(row, reason="too long"))
+            continue
+        p = idxs[peak]
+        row["start_frame"] = int(max(0, min(idxs[a] - pad_sec * fps, p - pre_sec * fps)))
+        row["end_frame"] = int(min(frame_count, max(idxs[b] + 1 + pad_sec * fps, p + post_sec * fps)))
+        swings.append(row)
+
+    # overlapping windows: split halfway between the peaks
+    for s0, s1 in zip(swings, swings[1:]):
+        if s0["end_frame"] > s1["start_frame"]:
+            cut = (s0["peak_frame"] + s1["peak_frame"]) // 2
+            s0["end_frame"] = cut
+            s1["start_frame"] = cut
+    return swings, rejected, th
+
+def segment(video, scan_hz=15.0, scan_w=160, roi=ROI, pix_th=PIX_TH, **kw):
+    """Scan + find_swings -> the segments.json dict."""
+    t0 = time.time()
+    with instrument.span("scan"):
+        energy, idxs, fps, frame_count = motion_energy(video, scan_hz, scan_w, roi, pix_th)
+    swings, rejected, th = find_swings(energy, idxs, fps, frame_count, **kw)
+    for n, s in enumerate(swings, 1):
+        s["index"] = n
+        s["start_sec"] = round(s["start_frame"] / fps, 3)
+        s["end_sec"] = round(s["end_frame"] / fps, 3)
+    kept = sum(s["end_frame"] - s["start_frame"] for s in swings)
+    return {
+        "video": os.path.abspath(video),
+        "meta": {
+            "fps": fps,
+            "frame_count": frame_count,
+            "scan_step": int(np.median(np.diff(idxs))) if len(idxs) > 1 else 1,
+            "scan_w": scan_w,
+            "roi": list(roi),
+            "pix_th": pix_th,
+            "threshold": None if th is None else round(th, 5),
+            "params": kw,
+            "swing_frames": kept,
+            "swing_fraction": round(kept / frame_count, 4) if frame_count else None,
+            "scan_sec": round(time.time() - t0, 3)
+        },
+        "swings": swings,
+        "rejected": rejected
+    }
+
+def analyze_swings(video, seg, model_task, out_dir, sample=1, alpha=0.45, max_gap=2, phase_frames=True):
+    """
+    Per-window pose -> smooth -> impact anchor -> P-frames, one result set per swing under
+    out_dir/swing_NN/. One landmarker serves every window. Returns the per-swing summaries.
+    """
+    from pose_runtime import WarmLandmarker, extract_video
+    from pose_smooth import smooth_data, SmoothError
+    from impact_anchor_ball_club import find_impact, ImpactAnchorError
+    if phase_frames:
+        if str(APP_DIR) not in sys.path:
+            sys.path.insert(0, str(APP_DIR))
+        import pose_engine
+        from pose_array import from_json
+
+    out = []
+    with WarmLandmarker(model_task) as landmarker, open_frames(video) as src:
+        for s in seg["swings"]:
+            d = os.path.join(out_dir, "swing_{0:02d}".format(s["index"]))
+            os.makedirs(d, exist_ok=True)
+            win = WindowFrames(src, s["start_frame"], s["end_frame"])
+            row = {"index": s["index"], "dir": d, "start_frame": s["start_frame"], "end_frame": s["end_frame"]}
+            with instrument.span("swing", index=s["index"]):
+                pose = extract_video(landmarker, video, sample, frames_src=win)
+                pose["meta"]["window"] = {"start_frame": s["start_frame"], "end_frame": s["end_frame"]}
+                row["pose"] = write_json(os.path.join(d, "pose.json"), pose, None)
+                try:
+                    smoothed, _, _ = smooth_data(pose, alpha, max_gap)
+                    row["smoothed"] = write_json(os.path.join(d, "pose_smoothed.json"), smoothed, None)
+                except SmoothError as e:
+                    smoothed = None
+                    row["smooth_error"] = str(e)
+
+                impact = None
+                try:
+                    anchor = find_impact(video, d, frames_src=win)
+                    write_json(os.path.join(d, "impact_anchor.json"), anchor)
+                    impact = anchor["impact"]["P7_frame"]
+                except ImpactAnchorError as e:
+                    row["impact_error"] = str(e)
+                row["impact_frame"] = impact
+                row["impact_frame_session"] = None if impact is None else s["start_frame"] + impact
+
+                if phase_frames and smoothed is not None:
+                    req = {"videoPath": video, "outDir": os.path.join(d, "frames"), "impactFrame": impact or 0}
+                    try:
+                        res = pose_engine.run(req, pose=from_json(smoothed, dtype=np.float64), frames_src=win)
+                        row["phase_frames"] = write_json(os.path.join(d, "phase_frames.json"), res)
+                    except pose_engine.PoseEngineError as e:
+                        row["phase_error"] = str(e)
+            write_json(os.path.join(d, "swing.json"), row)
+            print(f"swing {s['index']:02d}: frames {s['start_frame']}-{s['end_frame']} impact={row['impact_frame_session']} -> {d}")
+            out.append(row)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="in_video", required=True)
+    ap.add_argument("--out", default="", help="segments JSON (default <out_dir>/segments.json)")
+    ap.add_argument("--out_dir", default="", help="per-swing result sets (with --model)")
+    ap.add_argument("--model", dest="model_task", default="", help="pose .task model; without it only segments are written")
+    ap.add_argument("--scan_hz", type=float, default=15.0, help="motion scan rate")
+    ap.add_argument("--scan_w", type=int, default=160, help="scan ROI width in px")
+    ap.add_argument("--pix_th", type=int, default=PIX_TH, help="gray-level change that counts as motion")
+    ap.add_argument("--k", type=float, default=6.0, help="threshold = median + k * MAD of the energy")
+    ap.add_argument("--min_energy", type=float, default=MIN_ENERGY, help="threshold floor (changed-pixel fraction)")
+    ap.add_argument("--merge_sec", type=float, default=0.75)
+    ap.add_argument("--min_swing_sec", type=float, default=0.3)
+    ap.add_argument("--max_swing_sec", type=float, default=3.0)
+    ap.add_argument("--pre_sec", type=float, default=2.5, help="window start before the motion peak")
+    ap.add_argument("--post_sec", type=float, default=1.5, help="window end after the motion peak")
+    ap.add_argument("--pad_sec", type=float, default=0.5, help="window margin around the motion run")
+    ap.add_argument("--sample", type=int, default=1, help="pose: every Nth frame of each window")
+    ap.add_argument("--alpha", type=float, default=0.45)
+    ap.add_argument("--max_gap", type=int, default=2)
+    ap.add_argument("--no_phase_frames", action="store_true")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.in_video):
+        die(f"Missing input video: {args.in_video}")
+    if args.model_task and not os.path.exists(args.model_task):
+        die(f"Missing model task: {args.model_task}")
+    if args.model_task and not args.out_dir:
+        die("--model needs --out_dir")
+    if not (args.out or args.out_dir):
+        die("Need --out or --out_dir")
+
+    try:
+        seg = segment(args.in_video, args.scan_hz, args.scan_w, ROI, args.pix_th, k=args.k, min_energy=args.min_energy,
+                      merge_sec=args.merge_sec, min_swing_sec=args.min_swing_sec, max_swing_sec=args.max_swing_sec,
+                      pre_sec=args.pre_sec, post_sec=args.post_sec, pad_sec=args.pad_sec)
+    except RuntimeError as e:
+        die(str(e))
+
+    m = seg["meta"]
+    print(f"swings={len(seg['swings'])} rejected={len(seg['rejected'])} threshold={m['threshold']} "
+          f"kept {m['swing_frames']}/{m['frame_count']} frames ({m['swing_fraction']}) scan {m['scan_sec']}s")
+    for s in seg["swings"]:
+        print(f"  swing {s['index']:02d}: {s['start_sec']:>8.2f}s - {s['end_sec']:>8.2f}s  peak frame {s['peak_frame']}")
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+    seg_path = args.out or os.path.join(args.out_dir, "segments.json")
+    if args.model_task:
+        try:
+            seg["results"] = analyze_swings(args.in_video, seg, args.model_task, args.out_dir, args.sample,
+                                            args.alpha, args.max_gap, not args.no_phase_frames)
+        except RuntimeError as e:
+            die(str(e))
+    write_json(seg_path, seg)
+    print(f"OK wrote: {seg_path}")
+
+if __name__ == "__main__":
+    with instrument.run("swing_segment"):
+        main()